@@ -0,0 +1,50 @@
+"""Time a cold import of the mail forwarder's handler module
+
+Usage: python benchmarks/coldstart.py [runs]
+
+Each run is a fresh interpreter, as in a new Lambda execution
+environment. The module is imported once as it is locally, and once as
+it is in Lambda, where it also creates its AWS clients.
+"""
+
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import time
+
+FORWARDER = pathlib.Path(__file__).parents[1] / "exosphere" / "stacks"
+IMPORT = [
+    sys.executable,
+    "-c",
+    f"import sys; sys.path.insert(0, {str(FORWARDER)!r}); import forwarder",
+]
+
+
+def measure(command, runs, env=None):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, env=env)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main(runs=20):
+    lambda_env = {
+        **os.environ,
+        "AWS_LAMBDA_FUNCTION_NAME": "benchmark",
+        "AWS_DEFAULT_REGION": "eu-west-1",
+    }
+    baseline = measure([sys.executable, "-c", "pass"], runs)
+    module = measure(IMPORT, runs)
+    initialised = measure(IMPORT, runs, env=lambda_env)
+
+    print(f"python startup        {baseline * 1000:8.1f}ms")
+    print(f"import handler        {module * 1000:8.1f}ms (median)")
+    print(f"import and clients    {initialised * 1000:8.1f}ms (median)")
+
+
+if __name__ == "__main__":
+    main(runs=int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,139 @@
+"""Measure deploys of every stack type against a local CloudFormation
+
+Usage: python benchmarks/deploy.py [fleet-size] [latency-in-seconds]
+    [throttle-rate] [operation-time-in-seconds]
+
+CloudFormation is replaced by the stand-in from tests/standin.py, so this
+counts the API calls each deploy makes and times the orchestration around
+them, with the given latency added to every call and the given fraction
+of calls throttled.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tests"))
+
+import standin  # noqa: E402
+
+from exosphere import artifacts, clients, fleet, validate  # noqa: E402
+
+REGIONS = ("eu-west-1", "eu-west-2", "us-east-1")
+
+STACKS = {
+    "staticsite": {"type": "staticsite", "domain": "example.com"},
+    "staticsite (sharded)": {
+        "type": "staticsite",
+        "domain": "example.com",
+        "subdomain": [f"site-{n}" for n in range(600)],
+    },
+    "staticsitecdn": {
+        "type": "staticsitecdn",
+        "domain": "example.com",
+        "certificate_arn": "arn:aws:acm:us-east-1:123456789012:"
+        "certificate/benchmark",
+    },
+    "staticsitewithemail": {
+        "type": "staticsitewithemail",
+        "domain": "example.com",
+        "from_address": "forwarder@example.com",
+        "forwarding_addresses": "hello@example.net",
+        "region": "eu-west-1",
+    },
+}
+
+
+def fresh(**options):
+    # Every measurement starts from an empty account and cold clients.
+    clients._clients.clear()
+    cloudformation = standin.CloudFormation(**options)
+    cloudformation.install(*REGIONS)
+    artifacts.publish_template = cloudformation.publish_template
+    return cloudformation
+
+
+def measure(entry, **options):
+    cloudformation = fresh(**options)
+    results = {}
+    for phase in ("create", "unchanged"):
+        before = sum(cloudformation.calls.values())
+        _, status, elapsed = fleet.deploy_one(entry)
+        results[phase] = (
+            status,
+            sum(cloudformation.calls.values()) - before,
+            elapsed,
+        )
+    return results, cloudformation.throttled
+
+
+def throughput(entry, size, workers, **options):
+    fresh(**options)
+    entries = [
+        {**entry, "domain": f"site{n}.{entry['domain']}"} for n in range(size)
+    ]
+    start = time.perf_counter()
+    results = fleet.deploy(entries, workers=workers)
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for _, status, _ in results if status == "failed")
+    return elapsed, failed
+
+
+def main(size=50, latency=0.02, throttle_rate=0.0, operation_time=0.0):
+    os.environ["EXOSPHERE_CACHE_DIR"] = tempfile.mkdtemp()
+    validate._spec = {}
+    artifacts.publish = lambda name, sources, region: (
+        f"exosphere-artifacts-{standin.ACCOUNT}-{region}",
+        f"{name}/benchmark.zip",
+    )
+    options = {
+        "latency": latency,
+        "throttle_rate": throttle_rate,
+        "operation_time": operation_time,
+    }
+
+    # Stack events go to stderr, which would drown the results.
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    stderr = os.dup(2)
+    os.dup2(devnull, 2)
+    try:
+        rows = [
+            (name, *measure(entry, **options))
+            for name, entry in STACKS.items()
+        ]
+        fleets = [
+            (name, workers, *throughput(entry, size, workers, **options))
+            for name, entry in STACKS.items()
+            for workers in (1, 8, 32)
+        ]
+    finally:
+        os.dup2(stderr, 2)
+
+    print(f"latency {latency * 1000:.0f}ms, throttle rate {throttle_rate}")
+    print(
+        f"{'stack':<22} {'phase':<10} {'status':<10} {'calls':>6} {'time':>9}"
+    )
+    for name, results, throttled in rows:
+        for phase, (status, calls, elapsed) in results.items():
+            print(
+                f"{name:<22} {phase:<10} {status:<10} {calls:6d} "
+                f"{elapsed * 1000:7.1f}ms"
+            )
+        if throttled:
+            print(f"{'':<22} {throttled} calls throttled")
+
+    for name, workers, elapsed, failed in fleets:
+        print(
+            f"{name:<22} fleet of {size} x {workers:<2} workers "
+            f"{elapsed:7.2f}s {size / elapsed:7.1f} sites/s, {failed} failed"
+        )
+
+
+if __name__ == "__main__":
+    main(
+        size=int(sys.argv[1]) if len(sys.argv) > 1 else 50,
+        latency=float(sys.argv[2]) if len(sys.argv) > 2 else 0.02,
+        throttle_rate=float(sys.argv[3]) if len(sys.argv) > 3 else 0.0,
+        operation_time=float(sys.argv[4]) if len(sys.argv) > 4 else 0.0,
+    )
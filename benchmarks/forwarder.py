@@ -0,0 +1,72 @@
+"""Measure how many messages a warm mail forwarder handles per second
+
+Usage: python benchmarks/forwarder.py [messages] [message-size-in-bytes]
+
+S3 and SES are replaced by in-memory stand-ins, so this times the
+forwarder's own parsing and rewriting rather than the network.
+"""
+
+import contextlib
+import io
+import os
+import sys
+import time
+
+from exosphere.stacks import forwarder
+
+
+class S3:
+    def __init__(self, body):
+        self.body = body
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.body), "ContentLength": len(self.body)}
+
+
+class SES:
+    def send_raw_email(self, Destinations, RawMessage):
+        return {"MessageId": "benchmark"}
+
+
+def message(size):
+    header = (
+        "From: sender@example.org\r\n"
+        "Return-Path: <bounces@example.org>\r\n"
+        "To: hello@example.com\r\n"
+        "Subject: Benchmark\r\n"
+        "\r\n"
+    )
+    line = "x" * 76 + "\r\n"
+    return (header + line * max(size // len(line), 1)).encode("utf-8")
+
+
+def main(messages=1000, size=50 * 1024):
+    os.environ.setdefault("FromAddress", "forwarder@example.com")
+    os.environ.setdefault("ForwardingAddresses", "a@example.net")
+    forwarder.clients.update(s3=S3(message(size)), ses=SES())
+    forwarder.logger.disabled = True
+
+    event = {
+        "Records": [
+            {"s3": {"bucket": {"name": "mail"}, "object": {"key": str(n)}}}
+            for n in range(messages)
+        ]
+    }
+    # Metrics are written for every message, and the cost of writing them
+    # is part of what is measured.
+    with open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            forwarder.handler(event, None)
+            elapsed = time.perf_counter() - start
+
+    print(f"messages              {messages:8d} of {size} bytes")
+    print(f"elapsed               {elapsed * 1000:8.1f}ms")
+    print(f"throughput            {messages / elapsed:8.1f} messages/s")
+
+
+if __name__ == "__main__":
+    main(
+        messages=int(sys.argv[1]) if len(sys.argv) > 1 else 1000,
+        size=int(sys.argv[2]) if len(sys.argv) > 2 else 50 * 1024,
+    )
@@ -0,0 +1,45 @@
+"""Time how long the exosphere CLI takes to show its help
+
+Usage: python benchmarks/startup.py [runs] [budget-in-seconds]
+
+Exits non-zero when the median run exceeds the budget, so it can be used
+as a regression gate in CI.
+"""
+
+import statistics
+import subprocess
+import sys
+import time
+
+COMMAND = [sys.executable, "-m", "exosphere.cli", "--help"]
+
+
+def measure(command, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main(runs=20, budget=None):
+    # Interpreter startup on its own, to separate it from our import cost.
+    baseline = statistics.median(measure([sys.executable, "-c", "pass"], runs))
+    timings = measure(COMMAND, runs)
+    median = statistics.median(timings)
+
+    print(f"python startup        {baseline * 1000:8.1f}ms")
+    print(f"exosphere --help      {median * 1000:8.1f}ms (median)")
+    print(f"                      {min(timings) * 1000:8.1f}ms (best)")
+
+    if budget is not None and median > budget:
+        print(f"Over budget of {budget * 1000:.1f}ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(
+        runs=int(sys.argv[1]) if len(sys.argv) > 1 else 20,
+        budget=float(sys.argv[2]) if len(sys.argv) > 2 else None,
+    )
@@ -0,0 +1,21 @@
+import asyncio
+import functools
+
+
+async def call(function, *args, **kwargs):
+    # Only the call itself holds a thread, so waiting between calls costs
+    # nothing but a timer on the event loop.
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, functools.partial(function, *args, **kwargs)
+    )
+
+
+async def gather(*awaitables):
+    # Like the thread pools in the blocking API, let every stack finish
+    # before reporting the first failure.
+    results = await asyncio.gather(*awaitables, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
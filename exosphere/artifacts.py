@@ -0,0 +1,139 @@
+import hashlib
+import io
+import pathlib
+import threading
+import zipfile
+
+from exosphere import cache, clients, trace
+
+# Fixed timestamps and permissions make a zip's bytes depend only on what
+# is in it.
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+ZIP_MODE = 0o644 << 16
+
+_lock = threading.Lock()
+_buckets: dict = {}
+
+
+def digest(sources):
+    h = hashlib.sha256()
+    for name in sorted(sources):
+        h.update(name.encode("utf-8") + b"\0")
+        h.update(hashlib.sha256(sources[name].read_bytes()).digest())
+    return h.hexdigest()
+
+
+def build(sources):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name in sorted(sources):
+            info = zipfile.ZipInfo(name, date_time=ZIP_DATE)
+            info.external_attr = ZIP_MODE
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, sources[name].read_bytes())
+    return buffer.getvalue()
+
+
+def package(name, sources):
+    # Content addressed, so a cached zip is never stale.
+    key = f"{name}/{digest(sources)}.zip"
+    path = cache.directory("artifacts", name) / pathlib.PurePath(key).name
+    with trace.span("package", artifact=name) as span:
+        if path.exists():
+            span["cache"] = "hit"
+        else:
+            span["cache"] = "miss"
+            cache.write(path, build(sources))
+    return key, path
+
+
+def store(name, data, suffix=""):
+    key = f"{name}/{hashlib.sha256(data).hexdigest()}{suffix}"
+    path = cache.directory("artifacts", name) / pathlib.PurePath(key).name
+    if not path.exists():
+        cache.write(path, data)
+    return key, path
+
+
+def url(bucket, key, region):
+    return f"https://{bucket}.s3.{region}.amazonaws.com/{key}"
+
+
+def bucket(region):
+    # One private bucket per account and region, as Lambda only reads code
+    # from a bucket in the function's own region.
+    with _lock:
+        if region in _buckets:
+            return _buckets[region]
+
+    account = clients.client("sts", region).get_caller_identity()["Account"]
+    name = f"exosphere-artifacts-{account}-{region}"
+    marker = cache.directory("artifacts", "buckets") / name
+    if not marker.exists():
+        with trace.span("bucket", bucket=name):
+            create_bucket(clients.client("s3", region), name, region)
+        cache.write(marker, "")
+
+    with _lock:
+        _buckets[region] = name
+    return name
+
+
+def create_bucket(client, name, region):
+    from botocore.exceptions import ClientError
+
+    kwargs = {}
+    if region != "us-east-1":
+        kwargs["CreateBucketConfiguration"] = {"LocationConstraint": region}
+    try:
+        client.create_bucket(Bucket=name, **kwargs)
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "BucketAlreadyOwnedByYou":
+            raise
+    client.put_public_access_block(
+        Bucket=name,
+        PublicAccessBlockConfiguration={
+            "BlockPublicAcls": True,
+            "IgnorePublicAcls": True,
+            "BlockPublicPolicy": True,
+            "RestrictPublicBuckets": True,
+        },
+    )
+
+
+def upload(client, bucket, key, path):
+    # Keys never change content, so once an object is known to be in the
+    # bucket it is never checked again.
+    marker = cache.directory("artifacts", "uploaded", bucket) / key.replace(
+        "/", "-"
+    )
+    if marker.exists():
+        return False
+
+    from botocore.exceptions import ClientError
+
+    with trace.span("upload", bucket=bucket, key=key) as span:
+        try:
+            client.head_object(Bucket=bucket, Key=key)
+            span["uploaded"] = False
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in ("404", "NoSuchKey"):
+                raise
+            client.put_object(Bucket=bucket, Key=key, Body=path.read_bytes())
+            span["uploaded"] = True
+    cache.write(marker, "")
+    return span["uploaded"]
+
+
+def publish(name, sources, region):
+    key, path = package(name, sources)
+    destination = bucket(region)
+    upload(clients.client("s3", region), destination, key, path)
+    return destination, key
+
+
+def publish_template(body, region):
+    key, path = store("templates", body.encode("utf-8"), ".json")
+    destination = bucket(region)
+    upload(clients.client("s3", region), destination, key, path)
+    return url(destination, key, region)
@@ -0,0 +1,27 @@
+import os
+import pathlib
+import tempfile
+
+
+def directory(*parts):
+    root = os.environ.get("EXOSPHERE_CACHE_DIR") or os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+        "exosphere",
+    )
+    path = pathlib.Path(root, *parts)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def write(path, data):
+    # Write then rename, so concurrent readers never see a partial file.
+    path = pathlib.Path(path)
+    mode = "wb" if isinstance(data, bytes) else "w"
+    fd, temporary = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, mode) as f:
+            f.write(data)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
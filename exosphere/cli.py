@@ -1,14 +1,55 @@
+import sys
+
 import clize
 
-from . import stacks
+from . import destroy, drift, fleet, render, stacks, status, sync, trace
+
+COMMANDS = [
+    stacks.staticsite,
+    stacks.staticsitewithemail,
+    stacks.staticsitecdn,
+    fleet.fleet,
+    render.render,
+    sync.sync,
+    status.status,
+    status.outputs,
+    drift.drift,
+    destroy.destroy,
+]
+
+DESCRIPTION = """Pre-built CloudFormation stacks and commands to work with them
+
+Pass --profile FILE before the command to write a JSON trace of timed
+phases and API calls to FILE."""
 
 
 def update(stack_type, *args):
     stacks.get(stack_type).update(*args)
 
 
+def profile_option(args):
+    # --profile applies to every command, so it is taken off the command
+    # line before clize sees it.
+    if args and args[0].startswith("--profile"):
+        option = args.pop(0)
+        if "=" in option:
+            return option.split("=", 1)[1]
+        if args:
+            return args.pop(0)
+    return None
+
+
 def main():
-    clize.run([stacks.staticsite, stacks.staticsitewithemail])
+    args = sys.argv[1:]
+    profile = profile_option(args)
+    argv = [sys.argv[0], *args]
+
+    if profile is None:
+        clize.run(COMMANDS, args=argv, description=DESCRIPTION)
+        return
+
+    with trace.recording(profile, command=args):
+        clize.run(COMMANDS, args=argv, description=DESCRIPTION)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,50 @@
+import threading
+
+from exosphere import trace
+
+# Adaptive retries back off with jitter and rate limit every thread that
+# shares a client, so parallel deploys slow down together on throttling
+# instead of each failing once their own retries run out.
+RETRIES = {"mode": "adaptive", "max_attempts": 10}
+
+# Enough connections for a fleet's worth of threads sharing one client.
+MAX_POOL_CONNECTIONS = 50
+
+_lock = threading.Lock()
+_session = None
+_clients: dict = {}
+
+
+def session():
+    global _session
+    with _lock:
+        if _session is None:
+            import boto3.session
+
+            _session = boto3.session.Session()
+        return _session
+
+
+def config():
+    from botocore.config import Config
+
+    return Config(retries=RETRIES, max_pool_connections=MAX_POOL_CONNECTIONS)
+
+
+def client(service, region):
+    key = (service, region)
+    try:
+        return _clients[key]
+    except KeyError:
+        pass
+
+    with trace.span("client", service=service, region=region):
+        s = session()
+        # Sessions are not thread safe, but the clients they create are, so
+        # only client creation needs to happen under the lock.
+        with _lock:
+            if key not in _clients:
+                _clients[key] = trace.instrument(
+                    s.client(service, region_name=region, config=config())
+                )
+            return _clients[key]
@@ -0,0 +1,182 @@
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from exosphere import clients, status, sync, trace, tracker
+
+WORKERS = 16
+
+# Stacks holding a hosted zone go last, as the zone cannot be deleted while
+# other stacks still have records in it.
+ZONE = "AWS::Route53::HostedZone"
+
+
+def resources(target):
+    region, _, stack_id = target
+    paginator = clients.client("cloudformation", region).get_paginator(
+        "list_stack_resources"
+    )
+    return [
+        resource
+        for page in paginator.paginate(StackName=stack_id)
+        for resource in page["StackResourceSummaries"]
+    ]
+
+
+def versions(page):
+    # Unversioned buckets list every object with a "null" version, which
+    # deletes it like a plain key would.
+    return [
+        {"Key": version["Key"], "VersionId": version["VersionId"]}
+        for version in page.get("Versions", []) + page.get("DeleteMarkers", [])
+    ]
+
+
+def delete(client, bucket, objects):
+    errors = []
+    for batch in sync.batches(objects):
+        response = client.delete_objects(
+            Bucket=bucket, Delete={"Objects": batch, "Quiet": True}
+        )
+        errors.extend(response.get("Errors", []))
+    return errors
+
+
+def empty_prefix(client, bucket, prefix):
+    # A page holds no more versions than one batch delete takes.
+    deleted = 0
+    errors = []
+    paginator = client.get_paginator("list_object_versions")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        batch = versions(page)
+        errors.extend(delete(client, bucket, batch))
+        deleted += len(batch)
+    return deleted, errors
+
+
+def empty(client, bucket, pool):
+    # Top level prefixes are listed and emptied in parallel, and the objects
+    # at the top level as they are found.
+    from botocore.exceptions import ClientError
+
+    deleted = 0
+    errors = []
+    prefixes = []
+    paginator = client.get_paginator("list_object_versions")
+    try:
+        for page in paginator.paginate(Bucket=bucket, Delimiter="/"):
+            batch = versions(page)
+            errors.extend(delete(client, bucket, batch))
+            deleted += len(batch)
+            prefixes.extend(
+                p["Prefix"] for p in page.get("CommonPrefixes", [])
+            )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "NoSuchBucket":
+            raise
+        return 0, []
+
+    for count, failed in pool.map(
+        lambda prefix: empty_prefix(client, bucket, prefix), prefixes
+    ):
+        deleted += count
+        errors.extend(failed)
+    return deleted, errors
+
+
+def teardown(target, stack_resources, pool, out=sys.stderr):
+    region, name, stack_id = target
+    with trace.span("destroy", stack=name) as span:
+        for resource in stack_resources:
+            bucket = resource.get("PhysicalResourceId")
+            if resource["ResourceType"] != "AWS::S3::Bucket" or not bucket:
+                continue
+            with trace.span("empty", bucket=bucket) as emptied:
+                emptied["objects"], errors = empty(
+                    clients.client("s3", region), bucket, pool
+                )
+            if errors:
+                raise RuntimeError(
+                    f"Could not empty {bucket}: {errors[0]['Message']}"
+                )
+
+        client = clients.client("cloudformation", region)
+        request_token = tracker.token()
+        client.delete_stack(
+            StackName=stack_id, ClientRequestToken=request_token
+        )
+        # Once deleted, a stack can only be described by its id.
+        span["status"] = tracker.wait(client, stack_id, request_token, out=out)
+        return span["status"]
+
+
+def run(targets, workers=WORKERS, out=sys.stderr):
+    # Buckets are emptied on a pool of their own, so stacks waiting on them
+    # never hold the threads that emptying needs.
+    results = {}
+
+    def one(item):
+        target, stack_resources = item
+        try:
+            return teardown(target, stack_resources, buckets, out=out)
+        except Exception as e:
+            print(f"{target[1]}: {e}", file=sys.stderr)
+            return "failed"
+
+    with ThreadPoolExecutor(max_workers=workers) as buckets:
+        with ThreadPoolExecutor(max_workers=workers) as stacks:
+            listed = list(zip(targets, stacks.map(resources, targets)))
+            zones = [
+                item
+                for item in listed
+                if any(r["ResourceType"] == ZONE for r in item[1])
+            ]
+            rest = [item for item in listed if item not in zones]
+            for wave in (rest, zones):
+                for (target, _), result in zip(wave, stacks.map(one, wave)):
+                    results[target[:2]] = result
+    return results
+
+
+def targets(sites, regions):
+    return [
+        (region, name, stack["id"])
+        for (region, name), stack in status.find(regions, 0, sites).items()
+    ]
+
+
+def destroy(*sites, regions=",".join(status.REGIONS), yes=False):
+    """Empty the buckets of sites' stacks, then delete the stacks
+
+    Without --yes, only lists the stacks that would be deleted.
+
+    :param sites: Domains, or subdomains run together with their domain,
+        whose stacks are deleted
+    :param regions: Comma separated regions to look for stacks in
+    :param yes: Delete the stacks rather than only listing them
+    """
+    if not sites:
+        print("Name at least one site to destroy", file=sys.stderr)
+        sys.exit(2)
+
+    begun = time.monotonic()
+    region_list = status.region_list(regions)
+    found = targets(sites, region_list)
+    if not yes:
+        for region, name, _ in found:
+            print(f"{name:<40} {region:<15} would be deleted")
+        return
+
+    results = run(found)
+    for region in region_list:
+        status.forget(region)
+
+    for (region, name), result in results.items():
+        print(f"{name:<40} {region:<15} {result}")
+    failed = sum(1 for result in results.values() if result == "failed")
+    print(
+        f"{len(results)} stacks, {failed} failed, "
+        f"{time.monotonic() - begun:.1f}s"
+    )
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,144 @@
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from exosphere import clients, status, trace
+
+# Detection runs on CloudFormation's side, so threads only make the calls
+# that start and poll it; the shared clients' adaptive retries keep them
+# within the API's rate limits.
+WORKERS = 16
+
+MIN_DELAY = 2
+MAX_DELAY = 15
+BACKOFF = 1.5
+
+DRIFTED_STATUSES = ["MODIFIED", "DELETED"]
+
+
+def client(region):
+    return clients.client("cloudformation", region)
+
+
+def start(target):
+    from botocore.exceptions import ClientError
+
+    region, name = target
+    try:
+        detection = client(region).detect_stack_drift(StackName=name)
+    except ClientError as e:
+        # Stacks mid-update cannot be checked, which should not stop the
+        # rest of the fleet being checked.
+        return None, e.response["Error"]["Message"]
+    return detection["StackDriftDetectionId"], None
+
+
+def check(item):
+    detection_id, (region, _) = item
+    return client(region).describe_stack_drift_detection_status(
+        StackDriftDetectionId=detection_id
+    )
+
+
+def poll(pending, pool, sleep=time.sleep):
+    # Every outstanding detection is checked each round, so the whole
+    # fleet takes about as long as its slowest stack.
+    results = {}
+    delay = MIN_DELAY
+    while pending:
+        for detection in pool.map(check, list(pending.items())):
+            if detection["DetectionStatus"] != "DETECTION_IN_PROGRESS":
+                target = pending.pop(detection["StackDriftDetectionId"])
+                results[target] = detection
+        if pending:
+            sleep(delay)
+            delay = min(delay * BACKOFF, MAX_DELAY)
+    return results
+
+
+def resource_drifts(target):
+    # botocore has no paginator for this operation.
+    region, name = target
+    drifts = []
+    kwargs = {
+        "StackName": name,
+        "StackResourceDriftStatusFilters": DRIFTED_STATUSES,
+    }
+    while True:
+        page = client(region).describe_stack_resource_drifts(**kwargs)
+        drifts.extend(page["StackResourceDrifts"])
+        if "NextToken" not in page:
+            return drifts
+        kwargs["NextToken"] = page["NextToken"]
+
+
+def detect(targets, workers=WORKERS, sleep=time.sleep):
+    report = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        with trace.span("detect", "drift", stacks=len(targets)):
+            pending = {}
+            for target, (detection_id, reason) in zip(
+                targets, pool.map(start, targets)
+            ):
+                if detection_id is None:
+                    report[target] = {"status": "FAILED", "reason": reason}
+                else:
+                    pending[detection_id] = target
+            for target, detection in poll(pending, pool, sleep).items():
+                report[target] = {
+                    "status": detection.get("StackDriftStatus", "FAILED"),
+                    "reason": detection.get("DetectionStatusReason", ""),
+                }
+
+        drifted = [t for t in targets if report[t]["status"] == "DRIFTED"]
+        with trace.span("resources", "drift", stacks=len(drifted)):
+            for target, drifts in zip(
+                drifted, pool.map(resource_drifts, drifted)
+            ):
+                report[target]["resources"] = drifts
+    return {target: report[target] for target in targets}
+
+
+def describe(drift):
+    lines = [
+        f"  {drift['LogicalResourceId']} {drift['ResourceType']} "
+        f"{drift['StackResourceDriftStatus']}"
+    ]
+    for difference in drift.get("PropertyDifferences", []):
+        lines.append(
+            f"    {difference['PropertyPath']}: "
+            f"{difference['ExpectedValue']} -> {difference['ActualValue']}"
+        )
+    return lines
+
+
+def drift(site=None, *, regions=",".join(status.REGIONS), max_age=0):
+    """Check every stack deployed by exosphere for changes made outside it
+
+    Exits non-zero when any stack has drifted or could not be checked.
+
+    :param site: Only check the stacks of this site
+    :param regions: Comma separated regions to look for stacks in
+    :param max_age: Seconds a cached listing of stacks can be used for
+    """
+    begun = time.monotonic()
+    stacks = status.find(
+        status.region_list(regions), max_age, [site] if site else []
+    )
+    report = detect(list(stacks))
+
+    for (region, name), result in report.items():
+        line = f"{name:<40} {region:<15} {result['status']}"
+        if result["reason"]:
+            line += f" ({result['reason']})"
+        print(line)
+        for resource in result.get("resources", []):
+            print("\n".join(describe(resource)))
+
+    counts = [result["status"] for result in report.values()]
+    print(
+        f"{len(counts)} stacks, {counts.count('DRIFTED')} drifted, "
+        f"{counts.count('FAILED')} failed, {time.monotonic() - begun:.1f}s"
+    )
+    if counts.count("IN_SYNC") != len(counts):
+        sys.exit(1)
@@ -0,0 +1,77 @@
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from exosphere import stacks, trace
+
+
+def load(path):
+    with open(path) as f:
+        entries = json.load(f)
+
+    for entry in entries:
+        if entry.get("type") not in stacks.TYPES:
+            raise ValueError(
+                f"Unknown stack type {entry.get('type')!r} in {path}"
+            )
+        if "domain" not in entry:
+            raise ValueError(f"Missing domain for {entry!r} in {path}")
+    return entries
+
+
+def label(entry):
+    subdomain = entry.get("subdomain")
+    if isinstance(subdomain, list):
+        return f"{len(subdomain)} subdomains of {entry['domain']}"
+    if subdomain:
+        return f"{subdomain}.{entry['domain']}"
+    return entry["domain"]
+
+
+def deploy_one(entry, force=False):
+    arguments = {key: value for key, value in entry.items() if key != "type"}
+    start = time.monotonic()
+    with trace.span("stack", "fleet", site=label(entry)) as span:
+        try:
+            status = (
+                stacks.get(entry["type"])
+                .update(**arguments, force=force)
+                .status
+            )
+        except Exception as e:
+            print(f"{label(entry)}: {e}", file=sys.stderr)
+            status = "failed"
+        span["status"] = status
+    return entry, status, time.monotonic() - start
+
+
+def deploy(entries, workers=8, force=False):
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda e: deploy_one(e, force=force), entries))
+
+
+def fleet(manifest, *, workers=8, force=False):
+    """Deploy every stack listed in a manifest concurrently
+
+    :param manifest: Path to a JSON list of stacks, each with a type,
+        domain and the arguments of that stack type's command
+    :param workers: Maximum number of stacks deployed at once
+    :param force: Update stacks even when their fingerprint is unchanged
+    """
+    start = time.monotonic()
+    results = deploy(load(manifest), workers=workers, force=force)
+
+    for entry, status, elapsed in results:
+        print(
+            f"{label(entry):<40} {entry.get('region', 'eu-west-2'):<15} "
+            f"{status:<10} {elapsed:7.1f}s"
+        )
+
+    failed = sum(1 for _, status, _ in results if status == "failed")
+    print(
+        f"{len(results)} stacks, {failed} failed, "
+        f"{time.monotonic() - start:.1f}s"
+    )
+    if failed:
+        sys.exit(1)
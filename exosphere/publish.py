@@ -0,0 +1,124 @@
+import gzip
+import json
+import mimetypes
+import multiprocessing
+import os
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+# Files whose names carry a content hash, e.g. app.3f9a1c2e.js, never
+# change under the same name so can be cached for as long as possible.
+FINGERPRINTED = r"[.-][0-9a-f]{8,}\.[^/]+$"
+
+DEFAULT_RULES = [
+    (FINGERPRINTED, "public, max-age=31536000, immutable"),
+    (r"(^|/)[^/.]*$|\.html?$", "public, max-age=300, must-revalidate"),
+    (r".*", "public, max-age=3600"),
+]
+
+COMPRESSIBLE_TYPES = {
+    "application/javascript",
+    "application/json",
+    "application/manifest+json",
+    "application/xml",
+    "image/svg+xml",
+    "text/javascript",
+}
+
+# Below this the gzip framing eats most of the saving.
+MIN_COMPRESS_SIZE = 1024
+
+
+def content_type(key):
+    guessed, _ = mimetypes.guess_type(key)
+    return guessed or "application/octet-stream"
+
+
+def load_rules(path):
+    with open(path) as f:
+        custom = json.load(f)
+    return list(custom.items()) + DEFAULT_RULES
+
+
+def cache_control(key, rules=DEFAULT_RULES):
+    for pattern, value in rules:
+        if re.search(pattern, key):
+            return value
+    return None
+
+
+def compressible(key, size):
+    kind = content_type(key)
+    return size >= MIN_COMPRESS_SIZE and (
+        kind.startswith("text/") or kind in COMPRESSIBLE_TYPES
+    )
+
+
+def headers(key, size, rules=DEFAULT_RULES, compress=True):
+    result = {"ContentType": content_type(key)}
+    control = cache_control(key, rules)
+    if control:
+        result["CacheControl"] = control
+    if compress and compressible(key, size):
+        result["ContentEncoding"] = "gzip"
+    return result
+
+
+def gzip_file(source, destination):
+    # A fixed mtime and no file name keep the output, and so its ETag,
+    # identical for identical input.
+    temporary = f"{destination}.{os.getpid()}.tmp"
+    with open(source, "rb") as f_in, open(temporary, "wb") as raw:
+        with gzip.GzipFile(
+            filename="", mode="wb", fileobj=raw, compresslevel=9, mtime=0
+        ) as f_out:
+            shutil.copyfileobj(f_in, f_out)
+    os.replace(temporary, destination)
+    return destination
+
+
+def staged(staging, entry):
+    return staging / f"{entry['source']}.gz"
+
+
+def body(staging, path, entry):
+    if entry["headers"].get("ContentEncoding") != "gzip":
+        return path
+    destination = staged(staging, entry)
+    if not destination.exists():
+        gzip_file(path, destination)
+    return str(destination)
+
+
+def prepare(local, files, staging, etag, rules=DEFAULT_RULES, compress=True):
+    pending = []
+    for key, entry in local.items():
+        wanted = headers(key, entry["size"], rules, compress=compress)
+        if entry.get("headers") == wanted and "etag" in entry:
+            continue
+        entry["headers"] = wanted
+        if wanted.get("ContentEncoding") == "gzip":
+            pending.append(key)
+        else:
+            entry["etag"] = entry["source"]
+
+    missing = [
+        key for key in pending if not staged(staging, local[key]).exists()
+    ]
+    if missing:
+        # Sync's upload threads are already running, and forking a process
+        # with threads can leave a lock held forever in the child.
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(mp_context=context) as pool:
+            list(
+                pool.map(
+                    gzip_file,
+                    [files[key] for key in missing],
+                    [staged(staging, local[key]) for key in missing],
+                )
+            )
+
+    for key in pending:
+        local[key]["etag"] = etag(staged(staging, local[key]))
+    return local
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import pathlib
+import sys
+import threading
+
+from exosphere import cache, stacks, trace, validate
+
+FORMATS = ("json", "yaml")
+
+_lock = threading.Lock()
+_memory: dict = {}
+_source_digest = None
+
+
+def version():
+    from importlib import metadata
+
+    versions = []
+    for package in ("exosphere", "troposphere", "awacs"):
+        try:
+            versions.append(f"{package}=={metadata.version(package)}")
+        except metadata.PackageNotFoundError:
+            versions.append(f"{package}==0.0.0")
+    return versions
+
+
+def source_digest():
+    # Package versions do not change between edits in a checkout, so the
+    # stack source itself is part of the key too.
+    global _source_digest
+    if _source_digest is None:
+        digest = hashlib.sha256()
+        root = pathlib.Path(__file__).parent
+        for path in sorted(root.glob("**/*.py")):
+            digest.update(str(path.relative_to(root)).encode("utf-8"))
+            digest.update(path.read_bytes())
+        _source_digest = digest.hexdigest()
+    return _source_digest
+
+
+def key(stack_type, arguments, format="json"):
+    payload = json.dumps(
+        {
+            "type": stack_type,
+            "arguments": arguments,
+            "format": format,
+            "versions": version(),
+            "source": source_digest(),
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def build(stack_type, arguments, format="json"):
+    with trace.span("make", stack_type=stack_type):
+        template = stacks.get(stack_type).make(**arguments)
+    with trace.span("serialise", format=format):
+        if format == "yaml":
+            return template.to_yaml()
+        return template.to_json()
+
+
+def template(stack_type, arguments=None, format="json", use_cache=True):
+    arguments = {
+        name: value
+        for name, value in (arguments or {}).items()
+        if value is not None
+    }
+    if stack_type not in stacks.TYPES:
+        raise ValueError(f"Unknown stack type {stack_type!r}")
+    if format not in FORMATS:
+        raise ValueError(f"Unknown template format {format!r}")
+
+    with trace.span("render", stack_type=stack_type) as span:
+        if not use_cache:
+            span["cache"] = "disabled"
+            return build(stack_type, arguments, format)
+
+        digest = key(stack_type, arguments, format)
+        with _lock:
+            if digest in _memory:
+                span["cache"] = "memory"
+                return _memory[digest]
+
+        path = cache.directory("templates") / f"{digest}.{format}"
+        try:
+            body = path.read_text()
+            span["cache"] = "disk"
+        except FileNotFoundError:
+            span["cache"] = "miss"
+            body = build(stack_type, arguments, format)
+            cache.write(path, body)
+
+        with _lock:
+            _memory[digest] = body
+        return body
+
+
+def usage(message):
+    print(message, file=sys.stderr)
+    sys.exit(2)
+
+
+def render(
+    stack_type,
+    *arguments,
+    format="json",
+    output=None,
+    no_cache=False,
+    check=False,
+):
+    """Write a stack type's CloudFormation template
+
+    :param stack_type: The stack type, e.g. staticsite
+    :param arguments: Template arguments as name=value, e.g. subdomain=blog
+    :param format: json or yaml
+    :param output: File to write the template to instead of stdout
+    :param no_cache: Rebuild the template even when it is already cached
+    :param check: Validate the template and report its size against
+        CloudFormation's limits
+    """
+    if stack_type not in stacks.TYPES:
+        usage(
+            f"Unknown stack type {stack_type!r}, expected one of "
+            f"{', '.join(sorted(stacks.TYPES))}"
+        )
+
+    try:
+        parsed = dict(argument.split("=", 1) for argument in arguments)
+    except ValueError:
+        usage("Template arguments must be given as name=value")
+
+    try:
+        body = template(
+            stack_type, parsed, format=format, use_cache=not no_cache
+        )
+    except TypeError as e:
+        # An argument the stack type's make() does not take.
+        usage(f"Bad template arguments for {stack_type}: {e}")
+    except ValueError as e:
+        usage(str(e))
+
+    if check:
+        size = validate.check(
+            validate.compact(
+                template(stack_type, parsed, use_cache=not no_cache)
+            )
+        )
+        how = "inline" if size <= validate.MAX_TEMPLATE_BODY else "via S3"
+        print(
+            f"{size} bytes, deployed {how} (limits "
+            f"{validate.MAX_TEMPLATE_BODY} inline, "
+            f"{validate.MAX_TEMPLATE_URL_BODY} via S3)",
+            file=sys.stderr,
+        )
+
+    if output is None:
+        sys.stdout.write(body)
+        if not body.endswith("\n"):
+            sys.stdout.write("\n")
+    else:
+        pathlib.Path(output).write_text(body)
@@ -1,13 +1,171 @@
-from exosphere.stacks import static_site, static_site_with_email
+import importlib
 
+# Stack modules pull in boto3, troposphere and awacs, so they are only
+# imported once a command actually needs one.
+TYPES = {
+    "staticsite": "exosphere.stacks.static_site",
+    "staticsitewithemail": "exosphere.stacks.static_site_with_email",
+    "staticsitecdn": "exosphere.stacks.static_site_cdn",
+}
 
-def staticsite(domain, region="eu-west-2", subdomain=None):
-    static_site.update(domain, region=region, subdomain=subdomain)
+MODULES = {module.rsplit(".", 1)[1] for module in TYPES.values()}
+
+
+def __getattr__(name):
+    if name in MODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get(stack_type):
+    return importlib.import_module(TYPES[stack_type])
+
+
+def report(deployment):
+    print(f"{deployment.stack_name} {deployment.status}")
+    for key, value in sorted(deployment.outputs.items()):
+        print(f"{key}={value}")
+
+
+def staticsite(domain, region="eu-west-2", subdomain=None, *, force=False):
+    report(
+        get("staticsite").update(
+            domain, region=region, subdomain=subdomain, force=force
+        )
+    )
 
 
 def staticsitewithemail(
-    domain, from_address, forwarding_addresses, region="eu-west-2"
+    domain,
+    from_address,
+    forwarding_addresses,
+    region="eu-west-2",
+    *,
+    force=False,
+    memory_size=None,
+    timeout=None,
+    architecture=None,
+    ephemeral_storage=None,
+    buffered=False,
+    batch_size=None,
+    batching_window=None,
+    concurrency=None,
+    alarm_topic=None,
+):
+    """Deploy a static site that forwards the domain's email
+
+    :param domain: The domain, which has a Route 53 hosted zone
+    :param from_address: The verified SES address mail is forwarded from
+    :param forwarding_addresses: Comma separated addresses to forward to
+    :param region: The region to deploy to, which must receive SES mail
+    :param force: Update the stacks even when their fingerprint is unchanged
+    :param memory_size: Memory in MB for the forwarder, which CPU scales with
+    :param timeout: Seconds the forwarder may take to send a message
+    :param architecture: arm64 or x86_64, for the forwarder to run on
+    :param ephemeral_storage: Space in MB for the forwarder's /tmp
+    :param buffered: Queue mail in SQS and forward it in batches
+    :param batch_size: Most messages forwarded at once; needs --buffered
+    :param batching_window: Seconds to wait to fill a batch; needs
+        --buffered
+    :param concurrency: Most forwarders draining the queue at once; needs
+        --buffered
+    :param alarm_topic: SNS topic ARN told when a forwarder alarm changes
+        state
+    """
+    report(
+        get("staticsitewithemail").update(
+            domain,
+            from_address,
+            forwarding_addresses,
+            region=region,
+            force=force,
+            memory_size=memory_size,
+            timeout=timeout,
+            architecture=architecture,
+            ephemeral_storage=ephemeral_storage,
+            buffered=buffered,
+            batch_size=batch_size,
+            batching_window=batching_window,
+            concurrency=concurrency,
+            alarm_topic=alarm_topic,
+        )
+    )
+
+
+def staticsitecdn(
+    domain,
+    certificate_arn,
+    region="eu-west-2",
+    subdomain=None,
+    *,
+    force=False,
+):
+    report(
+        get("staticsitecdn").update(
+            domain,
+            certificate_arn,
+            region=region,
+            subdomain=subdomain,
+            force=force,
+        )
+    )
+
+
+# Coroutine versions of the commands for asyncio applications, which return
+# the deployment rather than printing it and hold no thread while waiting,
+# so many stacks can be deployed from one event loop.
+
+
+async def staticsite_async(
+    domain, region="eu-west-2", subdomain=None, *, force=False
+):
+    return await get("staticsite").update_async(
+        domain, region=region, subdomain=subdomain, force=force
+    )
+
+
+async def staticsitewithemail_async(
+    domain,
+    from_address,
+    forwarding_addresses,
+    region="eu-west-2",
+    *,
+    force=False,
+    memory_size=None,
+    timeout=None,
+    architecture=None,
+    ephemeral_storage=None,
+    buffered=False,
+    batch_size=None,
+    batching_window=None,
+    concurrency=None,
+    alarm_topic=None,
+):
+    return await get("staticsitewithemail").update_async(
+        domain,
+        from_address,
+        forwarding_addresses,
+        region=region,
+        force=force,
+        memory_size=memory_size,
+        timeout=timeout,
+        architecture=architecture,
+        ephemeral_storage=ephemeral_storage,
+        buffered=buffered,
+        batch_size=batch_size,
+        batching_window=batching_window,
+        concurrency=concurrency,
+        alarm_topic=alarm_topic,
+    )
+
+
+async def staticsitecdn_async(
+    domain, certificate_arn, region="eu-west-2", subdomain=None, *, force=False
 ):
-    static_site_with_email.update(
-        domain, from_address, forwarding_addresses, region=region
+    return await get("staticsitecdn").update_async(
+        domain,
+        certificate_arn,
+        region=region,
+        subdomain=subdomain,
+        force=force,
     )
@@ -0,0 +1,359 @@
+import asyncio
+import collections
+import time
+
+import botocore
+
+from exosphere import aio, artifacts, trace, tracker, validate
+from exosphere.stacks import fingerprint
+
+Deployment = collections.namedtuple(
+    "Deployment", ["stack_name", "status", "outputs"]
+)
+
+CAPABILITIES = ["CAPABILITY_IAM"]
+
+# Stacks in this state only exist because a CREATE change set was made for
+# them and never executed, so they still need creating.
+REVIEW_STATUS = "REVIEW_IN_PROGRESS"
+
+# Change sets normally take seconds; one still pending after this is given
+# up on rather than holding a worker forever.
+CHANGE_SET_TIMEOUT = 600
+
+NO_CHANGES = (
+    "The submitted information didn't contain changes",
+    "No updates are to be performed",
+)
+
+
+def parameters(**values):
+    return [
+        {"ParameterKey": key, "ParameterValue": value}
+        for key, value in values.items()
+    ]
+
+
+def outputs(stack):
+    return {
+        output["OutputKey"]: output["OutputValue"]
+        for output in stack.get("Outputs", [])
+    }
+
+
+def combine(stack_name, deployments):
+    statuses = {deployment.status for deployment in deployments}
+    if statuses == {"unchanged"}:
+        status = "unchanged"
+    elif statuses == {"created"}:
+        status = "created"
+    else:
+        status = "updated"
+
+    combined = {}
+    for deployment in deployments:
+        combined.update(deployment.outputs)
+    return Deployment(stack_name, status, combined)
+
+
+def describe(client, stack_name):
+    try:
+        return client.describe_stacks(StackName=stack_name)["Stacks"][0]
+    except botocore.exceptions.ClientError as e:
+        # Only a validation error means the stack is missing; throttling
+        # that outlasted the retries must not look like a stack to create.
+        error = e.response["Error"]
+        if error["Code"] == "ValidationError" and "does not exist" in (
+            error["Message"]
+        ):
+            return None
+        raise
+
+
+def wait_for_change_set(
+    client,
+    stack_name,
+    name,
+    timeout=CHANGE_SET_TIMEOUT,
+    sleep=time.sleep,
+    clock=time.monotonic,
+):
+    delay = 0.5
+    deadline = clock() + timeout
+    while True:
+        change_set = client.describe_change_set(
+            StackName=stack_name, ChangeSetName=name
+        )
+        if change_set["Status"] not in (
+            "CREATE_PENDING",
+            "CREATE_IN_PROGRESS",
+        ):
+            return change_set
+        if clock() >= deadline:
+            raise TimeoutError(
+                f"Timed out waiting for change set {name} of {stack_name}"
+            )
+        sleep(delay)
+        delay = min(delay * 1.5, 5)
+
+
+async def wait_for_change_set_async(
+    client, stack_name, name, timeout=CHANGE_SET_TIMEOUT, clock=time.monotonic
+):
+    delay = 0.5
+    deadline = clock() + timeout
+    while True:
+        change_set = await aio.call(
+            client.describe_change_set,
+            StackName=stack_name,
+            ChangeSetName=name,
+        )
+        if change_set["Status"] not in (
+            "CREATE_PENDING",
+            "CREATE_IN_PROGRESS",
+        ):
+            return change_set
+        if clock() >= deadline:
+            raise TimeoutError(
+                f"Timed out waiting for change set {name} of {stack_name}"
+            )
+        await asyncio.sleep(delay)
+        delay = min(delay * 1.5, 5)
+
+
+def body(template):
+    if not isinstance(template, str):
+        template = template.to_json()
+    return validate.compact(template)
+
+
+def change_set_type(stack):
+    if stack is None or stack["StackStatus"] == REVIEW_STATUS:
+        return "CREATE"
+    return "UPDATE"
+
+
+def template_source(client, template_body, size):
+    if size > validate.MAX_TEMPLATE_BODY:
+        return {
+            "TemplateURL": artifacts.publish_template(
+                template_body, client.meta.region_name
+            )
+        }
+    return {"TemplateBody": template_body}
+
+
+def outcome(change_set):
+    reason = change_set.get("StatusReason", "")
+    if change_set["Status"] == "FAILED" and not any(
+        message in reason for message in NO_CHANGES
+    ):
+        return "failed"
+    if change_set["Status"] == "FAILED" or not change_set.get("Changes"):
+        return "unchanged"
+    return "ready"
+
+
+def deploy(
+    client,
+    stack_name,
+    template,
+    parameters,
+    force=False,
+    capabilities=CAPABILITIES,
+    sleep=time.sleep,
+):
+    with trace.span("deploy", stack=stack_name) as span:
+        template_body = body(template)
+        # Problems with the template are found here rather than after
+        # waiting on CloudFormation.
+        span["size"] = validate.check(template_body)
+        digest = fingerprint.digest(template_body, parameters)
+
+        stack = describe(client, stack_name)
+        kind = change_set_type(stack)
+        if kind == "UPDATE" and not force:
+            if fingerprint.is_current(client, stack, digest):
+                span["status"] = "unchanged"
+                return Deployment(stack_name, "unchanged", outputs(stack))
+
+        source = template_source(client, template_body, span["size"])
+
+        request_token = tracker.token()
+        name = f"exosphere-{request_token}"
+        with trace.span("change_set", type=kind):
+            client.create_change_set(
+                StackName=stack_name,
+                ChangeSetName=name,
+                ChangeSetType=kind,
+                Parameters=parameters,
+                Capabilities=capabilities,
+                Tags=fingerprint.tags(digest),
+                **source,
+            )
+            try:
+                change_set = wait_for_change_set(
+                    client,
+                    stack_name,
+                    name,
+                    timeout=CHANGE_SET_TIMEOUT,
+                    sleep=sleep,
+                )
+            except TimeoutError:
+                client.delete_change_set(
+                    StackName=stack_name, ChangeSetName=name
+                )
+                if stack is None:
+                    client.delete_stack(StackName=stack_name)
+                raise
+
+        result = outcome(change_set)
+        if result != "ready":
+            client.delete_change_set(StackName=stack_name, ChangeSetName=name)
+        if result == "failed":
+            if stack is None:
+                client.delete_stack(StackName=stack_name)
+            raise tracker.StackFailed(
+                stack_name,
+                change_set["Status"],
+                change_set.get("StatusReason", ""),
+            )
+        if result == "unchanged":
+            span["status"] = "unchanged"
+            return Deployment(stack_name, "unchanged", outputs(stack or {}))
+
+        client.execute_change_set(
+            StackName=stack_name,
+            ChangeSetName=name,
+            ClientRequestToken=request_token,
+        )
+        tracker.wait(client, stack_name, request_token, sleep=sleep)
+
+        span["status"] = "created" if kind == "CREATE" else "updated"
+        return Deployment(
+            stack_name, span["status"], outputs(describe(client, stack_name))
+        )
+
+
+def delete(client, stack_name, stack_id):
+    with trace.span("delete", stack=stack_name) as span:
+        request_token = tracker.token()
+        client.delete_stack(
+            StackName=stack_id, ClientRequestToken=request_token
+        )
+        # Once deleted, a stack can only be described by its id.
+        tracker.wait(client, stack_id, request_token)
+        span["status"] = "deleted"
+        return Deployment(stack_name, "deleted", {})
+
+
+async def delete_async(client, stack_name, stack_id):
+    with trace.span("delete", stack=stack_name) as span:
+        request_token = tracker.token()
+        await aio.call(
+            client.delete_stack,
+            StackName=stack_id,
+            ClientRequestToken=request_token,
+        )
+        await tracker.wait_async(client, stack_id, request_token)
+        span["status"] = "deleted"
+        return Deployment(stack_name, "deleted", {})
+
+
+async def abandon(client, stack_name, name, stack):
+    await aio.call(
+        client.delete_change_set, StackName=stack_name, ChangeSetName=name
+    )
+    if stack is None:
+        await aio.call(client.delete_stack, StackName=stack_name)
+
+
+async def cancel_update(client, stack_name):
+    try:
+        await aio.call(client.cancel_update_stack, StackName=stack_name)
+    except botocore.exceptions.ClientError:
+        # The update finished before it could be cancelled.
+        pass
+
+
+async def deploy_async(
+    client,
+    stack_name,
+    template,
+    parameters,
+    force=False,
+    capabilities=CAPABILITIES,
+):
+    # The same steps as deploy(), but no thread is held between API calls.
+    # Cancelling abandons a change set that has not run yet, and rolls back
+    # an update that is in progress.
+    with trace.span("deploy", stack=stack_name) as span:
+        template_body = body(template)
+        span["size"] = validate.check(template_body)
+        digest = fingerprint.digest(template_body, parameters)
+
+        stack = await aio.call(describe, client, stack_name)
+        kind = change_set_type(stack)
+        if kind == "UPDATE" and not force:
+            if await aio.call(fingerprint.is_current, client, stack, digest):
+                span["status"] = "unchanged"
+                return Deployment(stack_name, "unchanged", outputs(stack))
+
+        source = await aio.call(
+            template_source, client, template_body, span["size"]
+        )
+
+        request_token = tracker.token()
+        name = f"exosphere-{request_token}"
+        with trace.span("change_set", type=kind):
+            await aio.call(
+                client.create_change_set,
+                StackName=stack_name,
+                ChangeSetName=name,
+                ChangeSetType=kind,
+                Parameters=parameters,
+                Capabilities=capabilities,
+                Tags=fingerprint.tags(digest),
+                **source,
+            )
+            try:
+                change_set = await wait_for_change_set_async(
+                    client, stack_name, name, timeout=CHANGE_SET_TIMEOUT
+                )
+            except (asyncio.CancelledError, TimeoutError):
+                await abandon(client, stack_name, name, stack)
+                raise
+
+        result = outcome(change_set)
+        if result == "failed":
+            await abandon(client, stack_name, name, stack)
+            raise tracker.StackFailed(
+                stack_name,
+                change_set["Status"],
+                change_set.get("StatusReason", ""),
+            )
+        if result == "unchanged":
+            await aio.call(
+                client.delete_change_set,
+                StackName=stack_name,
+                ChangeSetName=name,
+            )
+            span["status"] = "unchanged"
+            return Deployment(stack_name, "unchanged", outputs(stack or {}))
+
+        await aio.call(
+            client.execute_change_set,
+            StackName=stack_name,
+            ChangeSetName=name,
+            ClientRequestToken=request_token,
+        )
+        try:
+            await tracker.wait_async(client, stack_name, request_token)
+        except asyncio.CancelledError:
+            if kind == "UPDATE":
+                await cancel_update(client, stack_name)
+            raise
+
+        span["status"] = "created" if kind == "CREATE" else "updated"
+        stack = await aio.call(describe, client, stack_name)
+        return Deployment(stack_name, span["status"], outputs(stack))
@@ -0,0 +1,52 @@
+import hashlib
+import json
+
+TAG = "exosphere:fingerprint"
+
+STABLE_STATUSES = {
+    "CREATE_COMPLETE",
+    "UPDATE_COMPLETE",
+    "UPDATE_ROLLBACK_COMPLETE",
+    "IMPORT_COMPLETE",
+}
+
+
+def digest(template_body, parameters):
+    if isinstance(template_body, str):
+        template_body = json.loads(template_body)
+
+    payload = json.dumps(
+        {
+            "Template": template_body,
+            "Parameters": {
+                parameter["ParameterKey"]: parameter["ParameterValue"]
+                for parameter in parameters
+            },
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def tags(fingerprint):
+    return [{"Key": TAG, "Value": fingerprint}]
+
+
+def is_current(client, stack, fingerprint):
+    if stack["StackStatus"] not in STABLE_STATUSES:
+        return False
+
+    deployed_tags = {tag["Key"]: tag["Value"] for tag in stack.get("Tags", [])}
+    if TAG in deployed_tags:
+        return deployed_tags[TAG] == fingerprint
+
+    # Stacks created before fingerprinting carry no tag, so fall back to
+    # hashing what is actually deployed.
+    deployed = client.get_template(
+        StackName=stack["StackName"], TemplateStage="Original"
+    )
+    return (
+        digest(deployed["TemplateBody"], stack.get("Parameters", []))
+        == fingerprint
+    )
@@ -0,0 +1,215 @@
+# coding: utf-8
+import json
+import logging
+import os
+import re
+import sys
+import time
+from email.message import EmailMessage
+from email.parser import BytesHeaderParser
+from urllib.parse import unquote_plus
+
+import boto3
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+SES_REGION = "eu-west-1"
+
+# SES refuses raw messages over 10MB, less some room for the headers we add.
+MAX_MESSAGE_SIZE = 10 * 1024 * 1024 - 64 * 1024
+
+# Enough to hold the headers of any reasonable message.
+HEADER_BYTES = 64 * 1024
+
+HEADER_END = re.compile(rb"\r?\n\r?\n")
+
+# Metrics are written as embedded metric format log lines, which CloudWatch
+# turns into metrics without the function making any API calls.
+NAMESPACE = "Exosphere/Forwarder"
+UNITS = {
+    "FetchTime": "Milliseconds",
+    "ParseTime": "Milliseconds",
+    "SendTime": "Milliseconds",
+    "MessageSize": "Bytes",
+    "Failures": "Count",
+}
+
+# Clients are created once per execution environment and reused by every
+# warm invocation.
+clients: dict = {}
+
+
+def client(name, **kwargs):
+    if name not in clients:
+        clients[name] = boto3.client(name, **kwargs)
+    return clients[name]
+
+
+if "AWS_LAMBDA_FUNCTION_NAME" in os.environ:
+    # Initialisation gets a full CPU whatever the memory size, so create
+    # the clients then rather than in the first, throttled invocation.
+    client("s3")
+    client("ses", region_name=SES_REGION)
+
+
+def settings():
+    # We need to use a verified address rather than relying on the source.
+    return os.environ["FromAddress"], [
+        address.strip()
+        for address in os.environ["ForwardingAddresses"].split(",")
+    ]
+
+
+def rewrite(message, from_address):
+    if "From" in message:
+        message["X-Original-From"] = message["From"]
+        del message["From"]
+    if "Return-Path" in message:
+        message["X-Original-Return-Path"] = message["Return-Path"]
+        del message["Return-Path"]
+    message["From"] = from_address
+    return message
+
+
+def split(raw):
+    # Only the headers are parsed; the body is sent on byte for byte.
+    match = HEADER_END.search(raw)
+    end = match.end() if match else len(raw)
+    headers = BytesHeaderParser().parsebytes(raw[:end])
+    if b"\r\n" in raw[:end]:
+        headers.policy = headers.policy.clone(linesep="\r\n")
+    return headers, end
+
+
+def notice(headers, bucket, key, size, from_address):
+    message = EmailMessage()
+    message["From"] = from_address
+    message["Reply-To"] = str(headers.get("From", from_address))
+    message["Subject"] = "Too large to forward: {}".format(
+        headers.get("Subject", "(no subject)")
+    )
+    message.set_content(
+        "A {} byte message from {} was too large for SES to forward.\n"
+        "It is stored at s3://{}/{}\n".format(
+            size, headers.get("From", "an unknown sender"), bucket, key
+        )
+    )
+    return message.as_bytes()
+
+
+def metrics(values, function_name):
+    return json.dumps(
+        {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": NAMESPACE,
+                        "Dimensions": [["FunctionName"]],
+                        "Metrics": [
+                            {"Name": name, "Unit": UNITS[name]}
+                            for name in values
+                        ],
+                    }
+                ],
+            },
+            "FunctionName": function_name,
+            **values,
+        },
+        separators=(",", ":"),
+    )
+
+
+def emit(values):
+    function_name = os.environ.get("AWS_LAMBDA_FUNCTION_NAME", "local")
+    sys.stdout.write(metrics(values, function_name) + "\n")
+
+
+def forward(s3, ses, bucket, key, from_address, destinations):
+    started = time.perf_counter()
+    mail = s3.get_object(Bucket=bucket, Key=key)
+    size = mail["ContentLength"]
+    if size > MAX_MESSAGE_SIZE:
+        # Send a pointer to the message instead, reading only its headers.
+        raw = mail["Body"].read(HEADER_BYTES)
+        mail["Body"].close()
+        fetched = time.perf_counter()
+        headers, _ = split(raw)
+        data = notice(headers, bucket, key, size, from_address)
+        logger.warning("%s/%s is too large to forward", bucket, key)
+    else:
+        raw = mail["Body"].read()
+        fetched = time.perf_counter()
+        headers, end = split(raw)
+        rewrite(headers, from_address)
+        data = b"".join([headers.as_bytes(), memoryview(raw)[end:]])
+    del raw
+    parsed = time.perf_counter()
+    ses.send_raw_email(Destinations=destinations, RawMessage={"Data": data})
+    sent = time.perf_counter()
+    logger.info("Forwarded %s/%s (%d bytes)", bucket, key, len(data))
+    return {
+        "FetchTime": round((fetched - started) * 1000, 3),
+        "ParseTime": round((parsed - fetched) * 1000, 3),
+        "SendTime": round((sent - parsed) * 1000, 3),
+        "MessageSize": size,
+        # Counted for every message, so its average is the failure rate.
+        "Failures": 0,
+    }
+
+
+def objects(event):
+    for record in event.get("Records", []):
+        try:
+            bucket = record["s3"]["bucket"]["name"]
+            key = unquote_plus(record["s3"]["object"]["key"])
+        except KeyError:
+            # Retrying cannot fix a malformed record, so just report it.
+            logger.critical("No S3 object in event record %s", record)
+            continue
+        yield bucket, key
+
+
+def notification(record):
+    # Queued S3 notifications, including the test event S3 sends when the
+    # queue is configured, which has no records.
+    try:
+        return json.loads(record["body"])
+    except ValueError:
+        logger.critical("Unreadable queue message %s", record["messageId"])
+        return {}
+
+
+def handler(event, context):
+    from_address, destinations = settings()
+    s3 = client("s3")
+    ses = client("ses", region_name=SES_REGION)
+
+    def send(event):
+        failed = []
+        for bucket, key in objects(event):
+            try:
+                emit(forward(s3, ses, bucket, key, from_address, destinations))
+            except Exception:
+                logger.exception("Failed to forward %s/%s", bucket, key)
+                emit({"Failures": 1})
+                failed.append(key)
+        return failed
+
+    records = event.get("Records", [])
+    if records and records[0].get("eventSource") == "aws:sqs":
+        # Only the messages that failed go back on the queue.
+        return {
+            "batchItemFailures": [
+                {"itemIdentifier": record["messageId"]}
+                for record in records
+                if send(notification(record))
+            ]
+        }
+
+    failed = send(event)
+    if failed:
+        # Let Lambda retry the event rather than silently dropping mail.
+        raise RuntimeError("Failed to forward {}".format(failed))
+    return "CONTINUE"
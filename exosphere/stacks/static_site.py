@@ -1,7 +1,9 @@
-import sys
+import asyncio
+import hashlib
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
 
-import boto3
-import botocore
 from troposphere import FindInMap, Join, Parameter, Ref, Template
 from troposphere.route53 import (
     AliasTarget,
@@ -16,54 +18,273 @@ from troposphere.s3 import (
     WebsiteConfiguration,
 )
 
+from exosphere import aio, clients, render, status, validate
+from exosphere.stacks import deploy
 
-def update(domain, region="eu-west-2", subdomain=None):
-    t = make(subdomain=subdomain)
+# CloudFormation limits on a single stack, and Route 53's limit on the
+# records sent in one change batch, kept clear of with some headroom.
+# Shards past the inline body limit are deployed from S3, so in practice
+# the resource limit is the one they fill.
+MAX_RESOURCES = validate.LIMITS["Resources"]
+MAX_TEMPLATE_SIZE = validate.MAX_TEMPLATE_URL_BODY
+RECORDS_PER_GROUP = 100
+SHARD_WORKERS = 4
 
+# Shard stacks in these states hold no subdomains.
+EMPTY_STATUSES = (
+    deploy.REVIEW_STATUS,
+    "DELETE_IN_PROGRESS",
+    "DELETE_COMPLETE",
+)
+
+
+def subdomains(subdomain):
+    if isinstance(subdomain, str) and "," in subdomain:
+        return [name.strip() for name in subdomain.split(",") if name.strip()]
+    return subdomain
+
+
+def update(domain, region="eu-west-2", subdomain=None, force=False):
+    subdomain = subdomains(subdomain)
+    client = clients.client("cloudformation", region)
     stack_name = domain.replace(".", "")
+
+    if isinstance(subdomain, (list, tuple)):
+        work, stale = plan_shards(
+            stack_name, subdomain, deployed_shards(client, stack_name)
+        )
+
+        def shard(named):
+            name, names = named
+            return deploy.deploy(
+                client,
+                name,
+                render.template("staticsite", {"subdomain": names}),
+                deploy.parameters(HostedZoneName=domain),
+                force=force,
+            )
+
+        with ThreadPoolExecutor(max_workers=SHARD_WORKERS) as pool:
+            deployments = list(pool.map(shard, work))
+            deployments += pool.map(
+                lambda named: deploy.delete(client, *named), stale
+            )
+        return deploy.combine(stack_name, deployments)
+
     if subdomain:
         stack_name = subdomain + stack_name
 
-    client = boto3.client("cloudformation", region_name=region)
+    return deploy.deploy(
+        client,
+        stack_name,
+        render.template("staticsite", {"subdomain": subdomain}),
+        deploy.parameters(HostedZoneName=domain),
+        force=force,
+    )
+
+
+async def update_async(
+    domain, region="eu-west-2", subdomain=None, force=False
+):
+    subdomain = subdomains(subdomain)
+    client = await aio.call(clients.client, "cloudformation", region)
+    stack_name = domain.replace(".", "")
 
-    try:
-        client.describe_stacks(
-            StackName=stack_name,
+    async def stack(name, subdomain):
+        template = await aio.call(
+            render.template, "staticsite", {"subdomain": subdomain}
         )
-    except botocore.exceptions.ClientError:
-        client.create_stack(
-            StackName=stack_name,
-            TemplateBody=t.to_json(),
-            Parameters=[
-                {"ParameterKey": "HostedZoneName", "ParameterValue": domain},
-            ],
-            Capabilities=["CAPABILITY_IAM"],
+        return await deploy.deploy_async(
+            client,
+            name,
+            template,
+            deploy.parameters(HostedZoneName=domain),
+            force=force,
+        )
+
+    if isinstance(subdomain, (list, tuple)):
+        limit = asyncio.Semaphore(SHARD_WORKERS)
+
+        async def shard(name, names):
+            async with limit:
+                return await stack(name, names)
+
+        async def remove(name, stack_id):
+            async with limit:
+                return await deploy.delete_async(client, name, stack_id)
+
+        deployed = await aio.call(deployed_shards, client, stack_name)
+        work, stale = await aio.call(
+            plan_shards, stack_name, subdomain, deployed
         )
-        waiter = client.get_waiter("stack_create_complete")
-        waiter.wait(StackName=stack_name)
-        client.describe_stacks(
-            StackName=stack_name,
+        deployments = await aio.gather(
+            *(shard(name, names) for name, names in work)
         )
+        deployments += await aio.gather(
+            *(remove(name, stack_id) for name, stack_id in stale)
+        )
+        return deploy.combine(stack_name, deployments)
+
+    if subdomain:
+        stack_name = subdomain + stack_name
+    return await stack(stack_name, subdomain)
+
+
+def resource_count(count):
+    return count + -(-count // RECORDS_PER_GROUP)
+
+
+def template_size(names):
+    return validate.size(deploy.body(make(names)))
+
+
+def shards(names, deployed=()):
+    # Subdomains already deployed stay in their shard, so a bucket never
+    # moves between stacks that are deployed at the same time. New ones go
+    # to the first shard with room, and past the last shard to new ones.
+    # Sizes are of the compact body that deploy sends.
+    base = template_size([])
+    one = template_size(["a"])
+    # The cost of a record set group itself, beyond the records inside it.
+    group = 2 * one - base - template_size(["a", "b"])
 
-    try:
-        client.update_stack(
-            StackName=stack_name,
-            TemplateBody=t.to_json(),
-            Parameters=[
-                {"ParameterKey": "HostedZoneName", "ParameterValue": domain},
-            ],
-            Capabilities=["CAPABILITY_IAM"],
+    # A subdomain's share of the template only depends on the length of
+    # its name and logical id, so each shape is only rendered once.
+    costs = {}
+
+    def cost(name, count):
+        shape = (len(name), len(bucket_id(name)))
+        if shape not in costs:
+            costs[shape] = template_size([name]) - base - group
+        # Every RECORDS_PER_GROUP subdomains starts another group.
+        return costs[shape] + (group if count % RECORDS_PER_GROUP == 0 else 0)
+
+    wanted = dict.fromkeys(names)
+    result = [[name for name in shard if name in wanted] for shard in deployed]
+    placed = {name for shard in result for name in shard}
+    sizes = [
+        base + sum(cost(name, count) for count, name in enumerate(shard))
+        for shard in result
+    ]
+
+    for name in wanted:
+        if name in placed:
+            continue
+        for number, shard in enumerate(result):
+            if (
+                sizes[number] + cost(name, len(shard)) <= MAX_TEMPLATE_SIZE
+                and resource_count(len(shard) + 1) <= MAX_RESOURCES
+            ):
+                break
+        else:
+            result.append([])
+            sizes.append(base)
+            number, shard = len(result) - 1, result[-1]
+        sizes[number] += cost(name, len(shard))
+        shard.append(name)
+    return result
+
+
+def deployed_shards(client, stack_name):
+    # Each shard's template records the subdomains it holds.
+    pattern = re.compile(re.escape(stack_name) + r"subdomains(\d+)")
+    found = {}
+    for name, summary in status.summaries(client).items():
+        match = pattern.fullmatch(name)
+        if match is None or summary["StackStatus"] in EMPTY_STATUSES:
+            continue
+        body = client.get_template(
+            StackName=summary["StackId"], TemplateStage="Original"
+        )["TemplateBody"]
+        if isinstance(body, str):
+            body = json.loads(body)
+        found[int(match.group(1))] = (
+            summary["StackId"],
+            body.get("Metadata", {}).get("Subdomains", []),
         )
-        waiter = client.get_waiter("stack_update_complete")
-        waiter.wait(StackName=stack_name)
-        client.describe_stacks(
-            StackName=stack_name,
+    return found
+
+
+def plan_shards(stack_name, names, deployed):
+    # Shards numbered past a gap keep their numbers, and shards left with
+    # no subdomains are deleted rather than deployed empty.
+    numbers = range(1, max(deployed, default=0) + 1)
+    planned = shards(
+        names, [deployed[n][1] if n in deployed else [] for n in numbers]
+    )
+    work = [
+        (f"{stack_name}subdomains{number}", shard)
+        for number, shard in enumerate(planned, start=1)
+        if shard
+    ]
+    stale = [
+        (f"{stack_name}subdomains{number}", deployed[number][0])
+        for number, shard in enumerate(planned, start=1)
+        if not shard and number in deployed
+    ]
+    return work, stale
+
+
+def bucket_id(subdomain):
+    title = re.sub("[^A-Za-z0-9]", "", subdomain.title())
+    if title != subdomain.title():
+        # Keep ids distinct for names that only differ in punctuation.
+        title += hashlib.sha256(subdomain.encode("utf-8")).hexdigest()[:8]
+    return f"Bucket{title}"
+
+
+def subdomain_bucket(title, subdomain, hostedzone):
+    return Bucket(
+        title,
+        BucketName=Join(".", [subdomain, Ref(hostedzone)]),
+        AccessControl=PublicRead,
+        WebsiteConfiguration=WebsiteConfiguration(
+            IndexDocument="index.html",
+            ErrorDocument="error.html",
+        ),
+    )
+
+
+def subdomain_record(subdomain, hostedzone):
+    return RecordSet(
+        Name=Join(".", [subdomain, Ref(hostedzone)]),
+        Type="A",
+        AliasTarget=AliasTarget(
+            hostedzoneid=FindInMap(
+                "RegionMap",
+                Ref("AWS::Region"),
+                "S3hostedzoneID",
+            ),
+            dnsname=FindInMap(
+                "RegionMap",
+                Ref("AWS::Region"),
+                "websiteendpoint",
+            ),
+        ),
+    )
+
+
+def add_subdomains(t, hostedzone, names):
+    # Read back by deployed_shards, to keep each subdomain in its shard.
+    t.set_metadata({"Subdomains": list(names)})
+    records = []
+    for name in names:
+        t.add_resource(subdomain_bucket(bucket_id(name), name, hostedzone))
+        records.append(subdomain_record(name, hostedzone))
+
+    for start in range(0, len(records), RECORDS_PER_GROUP):
+        number = start // RECORDS_PER_GROUP + 1
+        t.add_resource(
+            RecordSetGroup(
+                "RecordSetGroup" if number == 1 else f"RecordSetGroup{number}",
+                HostedZoneName=Join("", [Ref(hostedzone), "."]),
+                RecordSets=records[start : start + RECORDS_PER_GROUP],
+            )
         )
-    except Exception as e:
-        print(e, file=sys.stderr)
 
 
 def make(subdomain=None):
+    subdomain = subdomains(subdomain)
     t = Template()
     t.add_mapping(
         "RegionMap",
@@ -114,41 +335,16 @@ def make(subdomain=None):
         )
     )
 
-    if subdomain:
-        t.add_resource(
-            Bucket(
-                "Bucket",
-                BucketName=Join(".", [subdomain, Ref(hostedzone)]),
-                AccessControl=PublicRead,
-                WebsiteConfiguration=WebsiteConfiguration(
-                    IndexDocument="index.html",
-                    ErrorDocument="error.html",
-                ),
-            )
-        )
+    if isinstance(subdomain, (list, tuple)):
+        add_subdomains(t, hostedzone, subdomain)
+    elif subdomain:
+        t.add_resource(subdomain_bucket("Bucket", subdomain, hostedzone))
 
         t.add_resource(
             RecordSetGroup(
                 "RecordSetGroup",
                 HostedZoneName=Join("", [Ref(hostedzone), "."]),
-                RecordSets=[
-                    RecordSet(
-                        Name=Join(".", [subdomain, Ref(hostedzone)]),
-                        Type="A",
-                        AliasTarget=AliasTarget(
-                            hostedzoneid=FindInMap(
-                                "RegionMap",
-                                Ref("AWS::Region"),
-                                "S3hostedzoneID",
-                            ),
-                            dnsname=FindInMap(
-                                "RegionMap",
-                                Ref("AWS::Region"),
-                                "websiteendpoint",
-                            ),
-                        ),
-                    ),
-                ],
+                RecordSets=[subdomain_record(subdomain, hostedzone)],
             )
         )
     else:
@@ -0,0 +1,201 @@
+from troposphere import (
+    GetAtt,
+    Join,
+    Output,
+    Parameter,
+    Ref,
+    Select,
+    Split,
+    cloudfront,
+)
+from troposphere.route53 import AliasTarget, RecordSet, RecordSetGroup
+
+from exosphere import aio, clients, render
+from exosphere.stacks import deploy, static_site
+
+# The fixed hosted zone that every CloudFront distribution lives in.
+CLOUDFRONT_HOSTED_ZONE_ID = "Z2FDTNDATAQYW2"
+
+# AWS managed "CachingOptimized" policy: honours the origin's
+# Cache-Control and caches gzip and brotli variants separately.
+CACHING_OPTIMIZED = "658327ea-f89d-4fab-a63d-7e88639e58f6"
+
+
+def check_subdomain(subdomain):
+    # The sharded stacks that take a list of subdomains have no
+    # distributions, so a CDN site is one subdomain per stack.
+    if isinstance(static_site.subdomains(subdomain), (list, tuple)):
+        raise ValueError(
+            f"staticsitecdn takes a single subdomain, not {subdomain!r}"
+        )
+
+
+def update(
+    domain, certificate_arn, region="eu-west-2", subdomain=None, force=False
+):
+    check_subdomain(subdomain)
+    # Same stack name as staticsite, so an existing site can be moved behind
+    # CloudFront in place and keep its buckets.
+    stack_name = domain.replace(".", "")
+    if subdomain:
+        stack_name = subdomain + stack_name
+
+    return deploy.deploy(
+        clients.client("cloudformation", region),
+        stack_name,
+        render.template("staticsitecdn", {"subdomain": subdomain}),
+        deploy.parameters(
+            HostedZoneName=domain, CertificateArn=certificate_arn
+        ),
+        force=force,
+    )
+
+
+async def update_async(
+    domain, certificate_arn, region="eu-west-2", subdomain=None, force=False
+):
+    check_subdomain(subdomain)
+    stack_name = domain.replace(".", "")
+    if subdomain:
+        stack_name = subdomain + stack_name
+
+    client = await aio.call(clients.client, "cloudformation", region)
+    template = await aio.call(
+        render.template, "staticsitecdn", {"subdomain": subdomain}
+    )
+    return await deploy.deploy_async(
+        client,
+        stack_name,
+        template,
+        deploy.parameters(
+            HostedZoneName=domain, CertificateArn=certificate_arn
+        ),
+        force=force,
+    )
+
+
+def distribution(title, bucket, alias):
+    origin_id = f"{title}Origin"
+    return cloudfront.Distribution(
+        title,
+        DistributionConfig=cloudfront.DistributionConfig(
+            Aliases=[alias],
+            Enabled=True,
+            HttpVersion="http2and3",
+            IPV6Enabled=True,
+            PriceClass=Ref("PriceClass"),
+            Origins=[
+                cloudfront.Origin(
+                    Id=origin_id,
+                    # The website endpoint, rather than the bucket itself,
+                    # keeps index documents and redirects working.
+                    DomainName=Select(
+                        1, Split("://", GetAtt(bucket, "WebsiteURL"))
+                    ),
+                    CustomOriginConfig=cloudfront.CustomOriginConfig(
+                        OriginProtocolPolicy="http-only",
+                    ),
+                )
+            ],
+            DefaultCacheBehavior=cloudfront.DefaultCacheBehavior(
+                TargetOriginId=origin_id,
+                ViewerProtocolPolicy="redirect-to-https",
+                AllowedMethods=["GET", "HEAD"],
+                CachedMethods=["GET", "HEAD"],
+                CachePolicyId=CACHING_OPTIMIZED,
+                Compress=True,
+            ),
+            ViewerCertificate=cloudfront.ViewerCertificate(
+                AcmCertificateArn=Ref("CertificateArn"),
+                SslSupportMethod="sni-only",
+                MinimumProtocolVersion="TLSv1.2_2021",
+            ),
+        ),
+    )
+
+
+def alias_records(name, target):
+    return [
+        RecordSet(
+            Name=name,
+            Type=record_type,
+            AliasTarget=AliasTarget(
+                hostedzoneid=CLOUDFRONT_HOSTED_ZONE_ID,
+                dnsname=GetAtt(target, "DomainName"),
+            ),
+        )
+        for record_type in ("A", "AAAA")
+    ]
+
+
+def make(subdomain=None):
+    check_subdomain(subdomain)
+    # Start from the plain static site so the buckets are identical, and
+    # point DNS at CloudFront instead of the S3 website endpoints.
+    t = static_site.make(subdomain=subdomain)
+    del t.resources["RecordSetGroup"]
+    del t.mappings["RegionMap"]
+
+    t.add_parameter(
+        Parameter(
+            "CertificateArn",
+            Description="ARN of an ACM certificate in us-east-1 covering "
+            "the site's names",
+            Type="String",
+        )
+    )
+    t.add_parameter(
+        Parameter(
+            "PriceClass",
+            Description="Which CloudFront edge locations to serve from",
+            Type="String",
+            Default="PriceClass_100",
+            AllowedValues=[
+                "PriceClass_100",
+                "PriceClass_200",
+                "PriceClass_All",
+            ],
+        )
+    )
+    hostedzone = Ref("HostedZoneName")
+
+    if subdomain:
+        name = Join(".", [subdomain, hostedzone])
+        site = t.add_resource(distribution("Distribution", "Bucket", name))
+        record_sets = alias_records(name, site)
+    else:
+        www = Join(".", ["www", hostedzone])
+        site = t.add_resource(
+            distribution("Distribution", "RootBucket", hostedzone)
+        )
+        redirect = t.add_resource(
+            distribution("WWWDistribution", "WWWBucket", www)
+        )
+        record_sets = alias_records(hostedzone, site) + alias_records(
+            www, redirect
+        )
+
+    t.add_resource(
+        RecordSetGroup(
+            "RecordSetGroup",
+            HostedZoneName=Join("", [hostedzone, "."]),
+            RecordSets=record_sets,
+        )
+    )
+
+    t.add_output(
+        Output(
+            "DistributionId",
+            Description="The distribution serving the site",
+            Value=Ref(site),
+        )
+    )
+    t.add_output(
+        Output(
+            "DistributionDomainName",
+            Description="The CloudFront domain name of the site",
+            Value=GetAtt(site, "DomainName"),
+        )
+    )
+
+    return t
@@ -1,24 +1,448 @@
-import sys
+import json
+import pathlib
+from concurrent.futures import ThreadPoolExecutor
 
-import boto3
-import botocore
 from awacs import aws
 from troposphere import (
+    Equals,
     GetAtt,
+    If,
     Join,
+    Not,
     Output,
     Parameter,
     Ref,
+    Sub,
+    Template,
     awslambda,
+    cloudwatch,
     iam,
     s3,
+    sqs,
 )
 
-from exosphere.stacks import static_site
+from exosphere import aio, artifacts, clients, render
+from exosphere.stacks import deploy, static_site
+
+# The forwarder is packaged from its source rather than imported, which
+# keeps boto3 out of the CLI's imports.
+FORWARDER = {"index.py": pathlib.Path(__file__).with_name("forwarder.py")}
+
+# Each component is its own stack, so changing the forwarder only updates
+# the mail stack and leaves the site and its DNS untouched.
+COMPONENTS = ("dns", "site", "mail")
+
+DNS_RESOURCES = ("HostedZone", "RecordSetGroup")
+
+# How new mail reaches the forwarder: invoked by the bucket for every
+# message, or through a queue it drains in batches.
+DELIVERIES = ("direct", "queue")
+
+# Matches forwarder.NAMESPACE, which is packaged on its own rather than
+# imported here.
+METRICS_NAMESPACE = "Exosphere/Forwarder"
+
+
+def subset(source, resources):
+    t = Template()
+    t.add_parameter(source.parameters["HostedZoneName"])
+    for resource in resources:
+        t.add_resource(source.resources[resource])
+    return t
+
+
+def make_dns():
+    source = static_site.make()
+    t = subset(source, DNS_RESOURCES)
+    t.add_mapping("RegionMap", source.mappings["RegionMap"])
+    t.add_output(
+        Output(
+            "HostedZoneId",
+            Description="The hosted zone for the domain",
+            Value=Ref("HostedZone"),
+        )
+    )
+    t.add_output(
+        Output(
+            "HostedZoneName",
+            Description="The DNS name of the hosted zone",
+            Value=Ref("HostedZoneName"),
+        )
+    )
+    return t
+
+
+def make_site():
+    source = static_site.make()
+    t = subset(
+        source,
+        [name for name in source.resources if name not in DNS_RESOURCES],
+    )
+    t.add_output(
+        Output(
+            "SiteBucketName",
+            Description="The bucket that holds the site content",
+            Value=Ref("RootBucket"),
+        )
+    )
+    t.add_output(
+        Output(
+            "WebsiteURL",
+            Description="The S3 website endpoint of the site",
+            Value=GetAtt("RootBucket", "WebsiteURL"),
+        )
+    )
+    return t
+
+
+def make_mail(delivery="direct"):
+    t = Template()
+    t.add_parameter(static_site.make().parameters["HostedZoneName"])
+    return add_mail(t, delivery)
+
+
+def make_single(delivery="direct"):
+    # The whole site in one stack, as sites deployed before the split still
+    # are: deleting that stack would take the hosted zone and the mail
+    # bucket with it, so it is kept up to date until moved over by hand.
+    return add_mail(static_site.make(), delivery)
+
+
+def make(component=None, delivery="direct"):
+    if component is None:
+        return make_single(delivery)
+    if component == "dns":
+        return make_dns()
+    if component == "site":
+        return make_site()
+    if component == "mail":
+        return make_mail(delivery)
+    raise ValueError(
+        f"Unknown component {component!r}, expected dns, site or mail"
+    )
+
+
+def mail_bucket_arn(*suffix):
+    return Join(
+        "",
+        ["arn:aws:s3:::", Join(".", ["mail", Ref("HostedZoneName")]), *suffix],
+    )
+
+
+def add_queue(t, function):
+    batch_size = t.add_parameter(
+        Parameter(
+            "ForwarderBatchSize",
+            Description="Most messages the forwarder is given at once; over "
+            "10 needs a batching window of at least a second",
+            Type="Number",
+            Default=10,
+            MinValue=1,
+            MaxValue=10000,
+        )
+    )
+    batching_window = t.add_parameter(
+        Parameter(
+            "ForwarderBatchingWindow",
+            Description="Seconds to wait to fill a batch",
+            Type="Number",
+            Default=5,
+            MinValue=0,
+            MaxValue=300,
+        )
+    )
+    concurrency = t.add_parameter(
+        Parameter(
+            "ForwarderConcurrency",
+            Description="Most forwarders draining the queue at once",
+            Type="Number",
+            Default=2,
+            MinValue=2,
+            MaxValue=1000,
+        )
+    )
+    visibility_timeout = t.add_parameter(
+        Parameter(
+            "ForwarderVisibilityTimeout",
+            Description="Seconds a batch is hidden while being forwarded, "
+            "at least six times ForwarderTimeout",
+            Type="Number",
+            Default=360,
+            MinValue=0,
+            MaxValue=43200,
+        )
+    )
+
+    dead_letters = t.add_resource(
+        sqs.Queue(
+            "ForwarderDeadLetterQueue",
+            MessageRetentionPeriod=14 * 24 * 60 * 60,
+        )
+    )
+    queue = t.add_resource(
+        sqs.Queue(
+            "ForwarderQueue",
+            VisibilityTimeout=Ref(visibility_timeout),
+            RedrivePolicy=sqs.RedrivePolicy(
+                deadLetterTargetArn=GetAtt(dead_letters, "Arn"),
+                maxReceiveCount=5,
+            ),
+        )
+    )
+    t.add_resource(
+        sqs.QueuePolicy(
+            "ForwarderQueuePolicy",
+            Queues=[Ref(queue)],
+            PolicyDocument=aws.Policy(
+                Statement=[
+                    aws.Statement(
+                        Effect="Allow",
+                        Principal=aws.Principal(
+                            "Service", resources="s3.amazonaws.com"
+                        ),
+                        Action=[aws.Action("sqs", action="SendMessage")],
+                        Resource=[GetAtt(queue, "Arn")],
+                        Condition=aws.Condition(
+                            [
+                                aws.ArnLike(
+                                    {"aws:SourceArn": mail_bucket_arn()}
+                                ),
+                                aws.StringEquals(
+                                    {
+                                        "aws:SourceAccount": Ref(
+                                            "AWS::AccountId"
+                                        )
+                                    }
+                                ),
+                            ]
+                        ),
+                    )
+                ]
+            ),
+        )
+    )
+    access = t.add_resource(
+        iam.PolicyType(
+            "ForwarderQueueAccess",
+            PolicyName="sqs-receive",
+            Roles=[Ref("LambdaSESACMForwarderRole")],
+            PolicyDocument=aws.PolicyDocument(
+                Version="2012-10-17",
+                Statement=[
+                    aws.Statement(
+                        Effect="Allow",
+                        Action=[
+                            aws.Action("sqs", action="ReceiveMessage"),
+                            aws.Action("sqs", action="DeleteMessage"),
+                            aws.Action("sqs", action="GetQueueAttributes"),
+                        ],
+                        Resource=[GetAtt(queue, "Arn")],
+                    )
+                ],
+            ),
+        )
+    )
+    t.add_resource(
+        awslambda.EventSourceMapping(
+            "ForwarderQueueMapping",
+            DependsOn=access.title,
+            EventSourceArn=GetAtt(queue, "Arn"),
+            FunctionName=Ref(function),
+            BatchSize=Ref(batch_size),
+            MaximumBatchingWindowInSeconds=Ref(batching_window),
+            # Caps the pollers rather than reserving function concurrency,
+            # so a busy queue waits instead of throttling into the DLQ.
+            ScalingConfig=awslambda.ScalingConfig(
+                MaximumConcurrency=Ref(concurrency)
+            ),
+            FunctionResponseTypes=["ReportBatchItemFailures"],
+        )
+    )
+
+    t.add_output(
+        Output(
+            "ForwarderDeadLetterQueueURL",
+            Description="Where mail that could not be forwarded is kept",
+            Value=Ref(dead_letters),
+        )
+    )
+    return queue
+
+
+def forwarder_metric(namespace, name, stat, **options):
+    return [
+        namespace,
+        name,
+        "FunctionName",
+        "${SESACMForwarderLambda}",
+        {"stat": stat, **options},
+    ]
+
+
+def dashboard_body():
+    # Placeholders are filled in by Fn::Sub once the function has a name.
+    def widget(title, metrics, x, y):
+        return {
+            "type": "metric",
+            "x": x,
+            "y": y,
+            "width": 12,
+            "height": 6,
+            "properties": {
+                "title": title,
+                "region": "${AWS::Region}",
+                "view": "timeSeries",
+                "period": 300,
+                "metrics": metrics,
+            },
+        }
+
+    return json.dumps(
+        {
+            "widgets": [
+                widget(
+                    "Invocations, errors and throttles",
+                    [
+                        forwarder_metric("AWS/Lambda", name, "Sum")
+                        for name in ("Invocations", "Errors", "Throttles")
+                    ],
+                    0,
+                    0,
+                ),
+                widget(
+                    "Duration (ms)",
+                    [
+                        forwarder_metric("AWS/Lambda", "Duration", stat)
+                        for stat in ("p50", "p95", "Maximum")
+                    ],
+                    12,
+                    0,
+                ),
+                widget(
+                    "Time per message, p95 (ms)",
+                    [
+                        forwarder_metric(METRICS_NAMESPACE, name, "p95")
+                        for name in ("FetchTime", "ParseTime", "SendTime")
+                    ],
+                    0,
+                    6,
+                ),
+                widget(
+                    "Message size (bytes) and failures",
+                    [
+                        forwarder_metric(
+                            METRICS_NAMESPACE, "MessageSize", "Average"
+                        ),
+                        forwarder_metric(
+                            METRICS_NAMESPACE, "MessageSize", "Maximum"
+                        ),
+                        forwarder_metric(
+                            METRICS_NAMESPACE,
+                            "Failures",
+                            "Sum",
+                            yAxis="right",
+                        ),
+                    ],
+                    12,
+                    6,
+                ),
+            ]
+        },
+        sort_keys=True,
+    )
+
+
+def add_monitoring(t, function):
+    alarm_topic = t.add_parameter(
+        Parameter(
+            "ForwarderAlarmTopic",
+            Description="SNS topic ARN told when a forwarder alarm changes "
+            "state, or empty for none",
+            Type="String",
+            Default="",
+        )
+    )
+    duration_threshold = t.add_parameter(
+        Parameter(
+            "ForwarderDurationThreshold",
+            Description="Milliseconds of p95 duration to alarm at, best "
+            "kept under ForwarderTimeout",
+            Type="Number",
+            Default=48000,
+            MinValue=1,
+        )
+    )
+    t.add_condition(
+        "HasForwarderAlarmTopic", Not(Equals(Ref(alarm_topic), ""))
+    )
+    actions = If(
+        "HasForwarderAlarmTopic", [Ref(alarm_topic)], Ref("AWS::NoValue")
+    )
+
+    def alarm(title, description, **properties):
+        t.add_resource(
+            cloudwatch.Alarm(
+                title,
+                AlarmDescription=description,
+                Dimensions=[
+                    cloudwatch.MetricDimension(
+                        Name="FunctionName", Value=Ref(function)
+                    )
+                ],
+                Period=300,
+                EvaluationPeriods=1,
+                TreatMissingData="notBreaching",
+                AlarmActions=actions,
+                OKActions=actions,
+                **properties,
+            )
+        )
+
+    alarm(
+        "ForwarderDurationAlarm",
+        "The forwarder is close to timing out",
+        Namespace="AWS/Lambda",
+        MetricName="Duration",
+        ExtendedStatistic="p95",
+        Threshold=Ref(duration_threshold),
+        ComparisonOperator="GreaterThanThreshold",
+    )
+    alarm(
+        "ForwarderThrottlesAlarm",
+        "Invocations of the forwarder are being throttled",
+        Namespace="AWS/Lambda",
+        MetricName="Throttles",
+        Statistic="Sum",
+        Threshold=0,
+        ComparisonOperator="GreaterThanThreshold",
+    )
+    alarm(
+        "ForwarderErrorRateAlarm",
+        "Over 5% of messages could not be forwarded",
+        Namespace=METRICS_NAMESPACE,
+        MetricName="Failures",
+        Statistic="Average",
+        Threshold=0.05,
+        ComparisonOperator="GreaterThanThreshold",
+    )
+
+    dashboard = t.add_resource(
+        cloudwatch.Dashboard(
+            "ForwarderDashboard", DashboardBody=Sub(dashboard_body())
+        )
+    )
+    t.add_output(
+        Output(
+            "ForwarderDashboardName",
+            Description="The dashboard of the forwarder's performance",
+            Value=Ref(dashboard),
+        )
+    )
 
 
-def make():
-    t = static_site.make()
+def add_mail(t, delivery="direct"):
+    if delivery not in DELIVERIES:
+        raise ValueError(f"Unknown mail delivery {delivery!r}")
 
     from_address = t.add_parameter(
         Parameter(
@@ -34,16 +458,75 @@ def make():
             Type="CommaDelimitedList",
         )
     )
+    memory_size = t.add_parameter(
+        Parameter(
+            "ForwarderMemorySize",
+            Description="Memory in MB for the forwarder, which holds a whole "
+            "message of up to 10MB in memory; CPU scales with it",
+            Type="Number",
+            Default=256,
+            MinValue=128,
+            MaxValue=10240,
+        )
+    )
+    timeout = t.add_parameter(
+        Parameter(
+            "ForwarderTimeout",
+            Description="Seconds the forwarder may take to send a message",
+            Type="Number",
+            Default=60,
+            MinValue=1,
+            MaxValue=900,
+        )
+    )
+    architecture = t.add_parameter(
+        Parameter(
+            "ForwarderArchitecture",
+            Description="Instruction set the forwarder runs on",
+            Type="String",
+            Default="arm64",
+            AllowedValues=["arm64", "x86_64"],
+        )
+    )
+    ephemeral_storage = t.add_parameter(
+        Parameter(
+            "ForwarderEphemeralStorage",
+            Description="Space in MB for the forwarder's /tmp, which it "
+            "does not use",
+            Type="Number",
+            Default=512,
+            MinValue=512,
+            MaxValue=10240,
+        )
+    )
+    code_bucket = t.add_parameter(
+        Parameter(
+            "ForwarderCodeBucket",
+            Description="The bucket holding the forwarder's code",
+            Type="String",
+        )
+    )
+    code_key = t.add_parameter(
+        Parameter(
+            "ForwarderCodeKey",
+            Description="The forwarder's zip, named by its content hash",
+            Type="String",
+        )
+    )
 
     function = t.add_resource(
         awslambda.Function(
             "SESACMForwarderLambda",
             Description="Function for forwarding mail from S3 buckets",
             Handler="index.handler",
-            Timeout=60,
-            MemorySize=128,
+            Timeout=Ref(timeout),
+            MemorySize=Ref(memory_size),
             Role=GetAtt("LambdaSESACMForwarderRole", "Arn"),
-            Runtime="python2.7",
+            Runtime="python3.13",
+            Architectures=[Ref(architecture)],
+            EphemeralStorage=awslambda.EphemeralStorage(
+                Size=Ref(ephemeral_storage)
+            ),
             Environment=awslambda.Environment(
                 Variables={
                     "FromAddress": Ref(from_address),
@@ -53,109 +536,57 @@ def make():
                 }
             ),
             Code=awslambda.Code(
-                ZipFile=r'''# coding: utf-8
-import boto3
-import email
-import json
-import logging
-import os
-logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
-
-def handler(event, context):
-    logger.info("Collecting event record data...")
-    record = event["Records"][0]
-    try:
-        logger.info("Looking for SES event...")
-        bucket_name =  record["s3"]["bucket"]["name"]
-        message_id =  record["s3"]["object"]["key"]
-    except KeyError:
-        logger.critical("There was a problem retrieving data "
-                        "from the event record, {}".format(record))
-        return("FAIL")
-
-    s3_client = boto3.client('s3')
-    logger.info("Fetching s3 object: {}/{}".format(bucket_name, message_id))
-    mail_object = s3_client.get_object(Bucket = bucket_name, Key = message_id)
-    logger.info("Decoding mail body...")
-    email_data = mail_object["Body"].read().decode('utf-8')
-    email_object = email.message_from_string(email_data)
-
-    # Get env variables
-    # We need to use a verified email address rather than relying on the source
-    logger.info("Retrieving environment settings...")
-    email_from = os.environ['FromAddress']
-    forwarding_addresses = [
-        address.strip()
-        for address in os.environ['ForwardingAddresses'].split(",")
-    ]
-
-    if 'From' in email_object:
-        email_object['X-Original-From'] = email_object['From']
-        del email_object['From']
-
-    if 'Return-Path' in email_object:
-        email_object['X-Original-Return-Path'] = email_object['Return-Path']
-        del email_object['Return-Path']
-
-    email_object['From'] = email_from
-
-    logger.info("Connecting to SES client")
-    ses_client = boto3.client('ses', region_name='eu-west-1')
-    logger.debug('Destinations:' + '; '.join([
-            'To: ' + address for address in forwarding_addresses
-        ]))
-    logger.debug('Message: ' + email_object.as_string())
-    response = ses_client.send_raw_email(
-        Destinations=forwarding_addresses,
-        #Source=email_from,
-        RawMessage={
-            'Data': email_object.as_string()
-        },
-    )
-    logger.info(
-        "Sent verification email successfully to {}".format(
-            ','.join(forwarding_addresses)
+                S3Bucket=Ref(code_bucket), S3Key=Ref(code_key)
+            ),
         )
     )
 
-    return "CONTINUE"'''
-            ),
+    if delivery == "queue":
+        queue = add_queue(t, function)
+        # S3 checks it may send to the queue when the bucket is created.
+        depends_on = "ForwarderQueuePolicy"
+        notifications = s3.NotificationConfiguration(
+            QueueConfigurations=[
+                s3.QueueConfigurations(
+                    Event="s3:ObjectCreated:*",
+                    Queue=GetAtt(queue, "Arn"),
+                )
+            ],
+        )
+    else:
+        depends_on = "InvokePermission"
+        notifications = s3.NotificationConfiguration(
+            LambdaConfigurations=[
+                s3.LambdaConfigurations(
+                    Event="s3:ObjectCreated:*",
+                    Function=GetAtt("SESACMForwarderLambda", "Arn"),
+                )
+            ],
         )
-    )
 
     bucket = t.add_resource(
         s3.Bucket(
             "SESACMS3Bucket",
-            DependsOn="InvokePermission",
+            DependsOn=depends_on,
             BucketName=Join(".", ["mail", Ref("HostedZoneName")]),
             LifecycleConfiguration=s3.LifecycleConfiguration(
                 Rules=[s3.LifecycleRule(ExpirationInDays=3, Status="Enabled")]
             ),
-            NotificationConfiguration=s3.NotificationConfiguration(
-                LambdaConfigurations=[
-                    s3.LambdaConfigurations(
-                        Event="s3:ObjectCreated:*",
-                        Function=GetAtt("SESACMForwarderLambda", "Arn"),
-                    )
-                ],
-            ),
+            NotificationConfiguration=notifications,
         )
     )
 
-    t.add_resource(
-        awslambda.Permission(
-            "InvokePermission",
-            Action="lambda:InvokeFunction",
-            FunctionName=GetAtt(function, "Arn"),
-            Principal="s3.amazonaws.com",
-            SourceAccount=Ref("AWS::AccountId"),
-            SourceArn=Join(
-                "",
-                ["arn:aws:s3:::", Join(".", ["mail", Ref("HostedZoneName")])],
-            ),
+    if delivery == "direct":
+        t.add_resource(
+            awslambda.Permission(
+                "InvokePermission",
+                Action="lambda:InvokeFunction",
+                FunctionName=GetAtt(function, "Arn"),
+                Principal="s3.amazonaws.com",
+                SourceAccount=Ref("AWS::AccountId"),
+                SourceArn=mail_bucket_arn(),
+            )
         )
-    )
 
     t.add_resource(
         s3.BucketPolicy(
@@ -243,22 +674,7 @@ def handler(event, context):
                             aws.Statement(
                                 Effect="Allow",
                                 Action=[aws.Action("s3", action="GetObject")],
-                                Resource=[
-                                    Join(
-                                        "",
-                                        [
-                                            "arn:aws:s3:::",
-                                            Join(
-                                                ".",
-                                                [
-                                                    "mail",
-                                                    Ref("HostedZoneName"),
-                                                ],
-                                            ),
-                                            "/*",
-                                        ],
-                                    )
-                                ],
+                                Resource=[mail_bucket_arn("/*")],
                             )
                         ],
                     ),
@@ -267,6 +683,8 @@ def handler(event, context):
         )
     )
 
+    add_monitoring(t, function)
+
     t.add_output(
         Output(
             "SESACMS3BucketName",
@@ -288,55 +706,217 @@ def handler(event, context):
     return t
 
 
-def update(domain, from_address, forwarding_addresses, region="eu-west-2"):
-    t = make()
+def forwarder_parameters(
+    memory_size=None,
+    timeout=None,
+    architecture=None,
+    ephemeral_storage=None,
+    buffered=False,
+    batch_size=None,
+    batching_window=None,
+    concurrency=None,
+    alarm_topic=None,
+):
+    # Left out, the forwarder settings fall back to the template defaults.
+    settings = {
+        "ForwarderMemorySize": memory_size,
+        "ForwarderTimeout": timeout,
+        "ForwarderArchitecture": architecture,
+        "ForwarderEphemeralStorage": ephemeral_storage,
+        "ForwarderAlarmTopic": alarm_topic,
+    }
+    queue_only = {
+        "batch_size": batch_size,
+        "batching_window": batching_window,
+        "concurrency": concurrency,
+    }
+    given = [name for name, value in queue_only.items() if value is not None]
+    if given and not buffered:
+        raise ValueError(
+            f"{', '.join(given)} only apply to buffered mail, so need "
+            "buffered as well"
+        )
+    if buffered:
+        settings.update(
+            ForwarderBatchSize=batch_size,
+            ForwarderBatchingWindow=batching_window,
+            ForwarderConcurrency=concurrency,
+            ForwarderVisibilityTimeout=(
+                None if timeout is None else 6 * int(timeout)
+            ),
+        )
+    if timeout is not None:
+        # Alarm before the forwarder actually times out.
+        settings["ForwarderDurationThreshold"] = 800 * int(timeout)
+    return {
+        name: str(value)
+        for name, value in settings.items()
+        if value is not None
+    }
+
+
+def is_single(stack):
+    return stack is not None and stack["StackStatus"] != deploy.REVIEW_STATUS
+
 
+def update(
+    domain,
+    from_address,
+    forwarding_addresses,
+    region="eu-west-2",
+    force=False,
+    memory_size=None,
+    timeout=None,
+    architecture=None,
+    ephemeral_storage=None,
+    buffered=False,
+    batch_size=None,
+    batching_window=None,
+    concurrency=None,
+    alarm_topic=None,
+):
+    client = clients.client("cloudformation", region)
     stack_name = domain.replace(".", "")
 
-    client = boto3.client("cloudformation", region_name=region)
-
-    try:
-        client.describe_stacks(StackName=stack_name)
-    except botocore.exceptions.ClientError:
-        client.create_stack(
-            StackName=stack_name,
-            TemplateBody=t.to_json(),
-            Parameters=[
-                {"ParameterKey": "HostedZoneName", "ParameterValue": domain},
-                {
-                    "ParameterKey": "FromAddress",
-                    "ParameterValue": from_address,
-                },
-                {
-                    "ParameterKey": "ForwardingAddresses",
-                    "ParameterValue": forwarding_addresses,
-                },
-            ],
-            Capabilities=["CAPABILITY_IAM"],
-        )
-        waiter = client.get_waiter("stack_create_complete")
-        waiter.wait(StackName=stack_name)
-        client.describe_stacks(StackName=stack_name)
-
-    try:
-        client.update_stack(
-            StackName=stack_name,
-            TemplateBody=t.to_json(),
-            Parameters=[
-                {"ParameterKey": "HostedZoneName", "ParameterValue": domain},
-                {
-                    "ParameterKey": "FromAddress",
-                    "ParameterValue": from_address,
-                },
-                {
-                    "ParameterKey": "ForwardingAddresses",
-                    "ParameterValue": forwarding_addresses,
-                },
-            ],
-            Capabilities=["CAPABILITY_IAM"],
+    def component(name, arguments=None, **parameters):
+        return deploy.deploy(
+            client,
+            f"{stack_name}{name or ''}",
+            render.template(
+                "staticsitewithemail", {"component": name, **(arguments or {})}
+            ),
+            deploy.parameters(**parameters),
+            force=force,
+        )
+
+    forwarder = forwarder_parameters(
+        memory_size,
+        timeout,
+        architecture,
+        ephemeral_storage,
+        buffered,
+        batch_size,
+        batching_window,
+        concurrency,
+        alarm_topic,
+    )
+    delivery = {"delivery": "queue" if buffered else None}
+
+    if is_single(deploy.describe(client, stack_name)):
+        code_bucket, code_key = artifacts.publish(
+            "forwarder", FORWARDER, region
+        )
+        return component(
+            None,
+            delivery,
+            HostedZoneName=domain,
+            FromAddress=from_address,
+            ForwardingAddresses=forwarding_addresses,
+            ForwarderCodeBucket=code_bucket,
+            ForwarderCodeKey=code_key,
+            **forwarder,
+        )
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        code = pool.submit(artifacts.publish, "forwarder", FORWARDER, region)
+        dns = component("dns", HostedZoneName=domain)
+        code_bucket, code_key = code.result()
+
+        # The site and mail stacks only depend on the DNS stack, so they are
+        # deployed side by side.
+        site = pool.submit(component, "site", HostedZoneName=domain)
+        mail = pool.submit(
+            component,
+            "mail",
+            delivery,
+            HostedZoneName=dns.outputs["HostedZoneName"],
+            FromAddress=from_address,
+            ForwardingAddresses=forwarding_addresses,
+            ForwarderCodeBucket=code_bucket,
+            ForwarderCodeKey=code_key,
+            **forwarder,
+        )
+        deployments = [dns, site.result(), mail.result()]
+
+    return deploy.combine(stack_name, deployments)
+
+
+async def update_async(
+    domain,
+    from_address,
+    forwarding_addresses,
+    region="eu-west-2",
+    force=False,
+    memory_size=None,
+    timeout=None,
+    architecture=None,
+    ephemeral_storage=None,
+    buffered=False,
+    batch_size=None,
+    batching_window=None,
+    concurrency=None,
+    alarm_topic=None,
+):
+    client = await aio.call(clients.client, "cloudformation", region)
+    stack_name = domain.replace(".", "")
+
+    async def component(name, arguments=None, **parameters):
+        template = await aio.call(
+            render.template,
+            "staticsitewithemail",
+            {"component": name, **(arguments or {})},
         )
-        waiter = client.get_waiter("stack_update_complete")
-        waiter.wait(StackName=stack_name)
-        client.describe_stacks(StackName=stack_name)
-    except Exception as e:
-        print(e, file=sys.stderr)
+        return await deploy.deploy_async(
+            client,
+            f"{stack_name}{name or ''}",
+            template,
+            deploy.parameters(**parameters),
+            force=force,
+        )
+
+    forwarder = forwarder_parameters(
+        memory_size,
+        timeout,
+        architecture,
+        ephemeral_storage,
+        buffered,
+        batch_size,
+        batching_window,
+        concurrency,
+        alarm_topic,
+    )
+    delivery = {"delivery": "queue" if buffered else None}
+
+    if is_single(await aio.call(deploy.describe, client, stack_name)):
+        code_bucket, code_key = await aio.call(
+            artifacts.publish, "forwarder", FORWARDER, region
+        )
+        return await component(
+            None,
+            delivery,
+            HostedZoneName=domain,
+            FromAddress=from_address,
+            ForwardingAddresses=forwarding_addresses,
+            ForwarderCodeBucket=code_bucket,
+            ForwarderCodeKey=code_key,
+            **forwarder,
+        )
+
+    dns, (code_bucket, code_key) = await aio.gather(
+        component("dns", HostedZoneName=domain),
+        aio.call(artifacts.publish, "forwarder", FORWARDER, region),
+    )
+    site, mail = await aio.gather(
+        component("site", HostedZoneName=domain),
+        component(
+            "mail",
+            delivery,
+            HostedZoneName=dns.outputs["HostedZoneName"],
+            FromAddress=from_address,
+            ForwardingAddresses=forwarding_addresses,
+            ForwarderCodeBucket=code_bucket,
+            ForwarderCodeKey=code_key,
+            **forwarder,
+        ),
+    )
+    return deploy.combine(stack_name, [dns, site, mail])
@@ -0,0 +1,251 @@
+import json
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from exosphere import cache, clients, trace
+
+# The regions our stacks go to: sites default to eu-west-2, mail needs an
+# SES region and CloudFront certificates live in us-east-1.
+REGIONS = ("eu-west-2", "eu-west-1", "us-east-1")
+
+MAX_AGE = 300
+
+# Bumped whenever what is cached about a stack changes.
+CACHE_VERSION = 2
+
+# Past this many changed stacks, one bulk describe is cheaper than a
+# describe per stack.
+BULK_THRESHOLD = 10
+
+ACTIVE_STATUSES = [
+    "CREATE_IN_PROGRESS",
+    "CREATE_FAILED",
+    "CREATE_COMPLETE",
+    "ROLLBACK_IN_PROGRESS",
+    "ROLLBACK_FAILED",
+    "ROLLBACK_COMPLETE",
+    "DELETE_IN_PROGRESS",
+    "DELETE_FAILED",
+    "UPDATE_IN_PROGRESS",
+    "UPDATE_COMPLETE_CLEANUP_IN_PROGRESS",
+    "UPDATE_COMPLETE",
+    "UPDATE_FAILED",
+    "UPDATE_ROLLBACK_IN_PROGRESS",
+    "UPDATE_ROLLBACK_FAILED",
+    "UPDATE_ROLLBACK_COMPLETE_CLEANUP_IN_PROGRESS",
+    "UPDATE_ROLLBACK_COMPLETE",
+    "REVIEW_IN_PROGRESS",
+    "IMPORT_IN_PROGRESS",
+    "IMPORT_COMPLETE",
+    "IMPORT_ROLLBACK_IN_PROGRESS",
+    "IMPORT_ROLLBACK_FAILED",
+    "IMPORT_ROLLBACK_COMPLETE",
+]
+
+# Every stack a site is deployed as: the site's own, the parts of a site
+# with email, and the shards of a long subdomain list.
+PARTS = re.compile(r"(dns|site|mail|subdomains\d+)?")
+
+# Matches fingerprint.TAG, without importing the stack modules.
+TAG = "exosphere:fingerprint"
+
+
+def stamp(stack):
+    # A stack's summary and its full description agree on these, and any
+    # operation on the stack changes at least one of them.
+    updated = stack.get("LastUpdatedTime") or stack["CreationTime"]
+    return f"{updated.isoformat()} {stack['StackStatus']}"
+
+
+def entry(stack):
+    tags = {tag["Key"]: tag["Value"] for tag in stack.get("Tags", [])}
+    return {
+        "id": stack["StackId"],
+        "status": stack["StackStatus"],
+        "stamp": stamp(stack),
+        "managed": TAG in tags,
+        "outputs": {
+            output["OutputKey"]: output["OutputValue"]
+            for output in stack.get("Outputs", [])
+        },
+    }
+
+
+def summaries(client):
+    paginator = client.get_paginator("list_stacks")
+    return {
+        summary["StackName"]: summary
+        for page in paginator.paginate(StackStatusFilter=ACTIVE_STATUSES)
+        for summary in page["StackSummaries"]
+    }
+
+
+def describe_all(client):
+    paginator = client.get_paginator("describe_stacks")
+    return {
+        stack["StackName"]: entry(stack)
+        for page in paginator.paginate()
+        for stack in page["Stacks"]
+        if stack["StackStatus"] != "DELETE_COMPLETE"
+    }
+
+
+def describe_each(client, names, workers=8):
+    from exosphere.stacks import deploy
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        stacks = pool.map(lambda name: deploy.describe(client, name), names)
+        # A stack deleted since it was listed describes as None.
+        return {
+            stack["StackName"]: entry(stack)
+            for stack in stacks
+            if stack is not None
+        }
+
+
+def refresh(client, known):
+    # Listing is cheap and says which stacks changed, so only those are
+    # described again.
+    if not known:
+        return describe_all(client)
+
+    current = summaries(client)
+    stale = [
+        name
+        for name, summary in current.items()
+        if name not in known or known[name]["stamp"] != stamp(summary)
+    ]
+    if len(stale) > BULK_THRESHOLD:
+        return describe_all(client)
+
+    stacks = {name: known[name] for name in current if name not in stale}
+    stacks.update(describe_each(client, stale))
+    return stacks
+
+
+def cache_path(region):
+    return cache.directory("status") / f"{region}.json"
+
+
+def forget(region):
+    cache_path(region).unlink(missing_ok=True)
+
+
+def load(region):
+    try:
+        with open(cache_path(region)) as f:
+            cached = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return cached if cached.get("version") == CACHE_VERSION else None
+
+
+def region_stacks(region, max_age=MAX_AGE, clock=time.time):
+    cached = load(region)
+    if cached is not None and clock() - cached["fetched"] < max_age:
+        return cached["stacks"]
+
+    with trace.span("status", region=region) as span:
+        client = clients.client("cloudformation", region)
+        stacks = refresh(client, cached["stacks"] if cached else {})
+        span["stacks"] = len(stacks)
+    cache.write(
+        cache_path(region),
+        json.dumps(
+            {"version": CACHE_VERSION, "fetched": clock(), "stacks": stacks}
+        ),
+    )
+    return stacks
+
+
+def listed(regions=REGIONS, max_age=MAX_AGE):
+    with ThreadPoolExecutor(max_workers=len(regions)) as pool:
+        found = pool.map(
+            lambda region: region_stacks(region, max_age=max_age), regions
+        )
+        return {
+            (region, name): stack
+            for region, stacks in zip(regions, found)
+            for name, stack in sorted(stacks.items())
+        }
+
+
+def managed(regions=REGIONS, max_age=MAX_AGE):
+    return {
+        key: stack
+        for key, stack in listed(regions, max_age).items()
+        if stack["managed"]
+    }
+
+
+def matching(stacks, site):
+    if site is None:
+        return stacks
+    prefix = site.replace(".", "")
+    return {
+        (region, name): stack
+        for (region, name), stack in stacks.items()
+        if name.startswith(prefix) and PARTS.fullmatch(name[len(prefix) :])
+    }
+
+
+def find(regions=REGIONS, max_age=MAX_AGE, sites=()):
+    # Stacks deployed before fingerprinting carry no tag, so a site that is
+    # named has its stacks found by name, tagged or not.
+    if not sites:
+        return managed(regions, max_age)
+    stacks = listed(regions, max_age)
+    found = {}
+    for site in sites:
+        found.update(matching(stacks, site))
+    return found
+
+
+def region_list(regions):
+    return [region.strip() for region in regions.split(",") if region.strip()]
+
+
+def status(site=None, *, regions=",".join(REGIONS), max_age=MAX_AGE):
+    """List the state of every stack deployed by exosphere
+
+    :param site: Only list the stacks of this domain, or subdomain and
+        domain run together as the stack name is, such as blog.example.com
+    :param regions: Comma separated regions to look for stacks in
+    :param max_age: Seconds a cached listing is used for before asking
+        CloudFormation what has changed
+    """
+    stacks = find(region_list(regions), max_age, [site] if site else [])
+    for (region, name), stack in stacks.items():
+        print(f"{name:<40} {region:<15} {stack['status']}")
+
+
+def outputs(
+    site=None, key=None, *, regions=",".join(REGIONS), max_age=MAX_AGE
+):
+    """Print the outputs of stacks deployed by exosphere
+
+    :param site: Only print the outputs of this site's stacks
+    :param key: Only print the value of this output, such as
+        SESACMS3BucketName
+    :param regions: Comma separated regions to look for stacks in
+    :param max_age: Seconds a cached listing is used for before asking
+        CloudFormation what has changed
+    """
+    stacks = find(region_list(regions), max_age, [site] if site else [])
+    values = [
+        (name, output, value)
+        for (_, name), stack in stacks.items()
+        for output, value in sorted(stack["outputs"].items())
+        if key is None or output == key
+    ]
+    if key is not None:
+        if not values:
+            print(f"No output {key}", file=sys.stderr)
+            sys.exit(1)
+        for _, _, value in values:
+            print(value)
+        return
+    for name, output, value in values:
+        print(f"{name} {output}={value}")
@@ -0,0 +1,294 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from exosphere import cache, clients, publish, trace
+
+PART_SIZE = 8 * 1024 * 1024
+DELETE_BATCH = 1000
+
+
+def etag(path, part_size=PART_SIZE):
+    # Matches the ETag S3 gives objects uploaded with our transfer config:
+    # the MD5 for a plain upload, or the MD5 of the part MD5s for anything
+    # at or over the threshold, even a file that fits in exactly one part.
+    parts = []
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(part_size), b""):
+            parts.append(hashlib.md5(chunk))
+            size += len(chunk)
+    if not (len(parts) > 1 or size >= part_size):
+        return parts[0].hexdigest() if parts else hashlib.md5(b"").hexdigest()
+    combined = hashlib.md5(b"".join(part.digest() for part in parts))
+    return f"{combined.hexdigest()}-{len(parts)}"
+
+
+def local_files(directory):
+    files = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            key = os.path.relpath(path, directory).replace(os.sep, "/")
+            files[key] = path
+    return files
+
+
+def scan(files, previous, pool):
+    # Only rehash files whose size or modification time has changed since
+    # the last sync.
+    def entry(item):
+        key, path = item
+        stat = os.stat(path)
+        known = previous.get(key)
+        if (
+            known is not None
+            and "source" in known
+            and known.get("size") == stat.st_size
+            and known.get("mtime") == stat.st_mtime_ns
+        ):
+            return key, dict(known)
+        return key, {
+            "source": etag(path),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+        }
+
+    return dict(pool.map(entry, files.items()))
+
+
+def remote(client, bucket):
+    objects = {}
+    paginator = client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket):
+        for obj in page.get("Contents", []):
+            objects[obj["Key"]] = {
+                "etag": obj["ETag"].strip('"'),
+                "size": obj["Size"],
+            }
+    return objects
+
+
+def changed(entry, deployed):
+    if deployed is None or deployed["etag"] != entry["etag"]:
+        return True
+    # A bucket listing has no headers, so they can only be compared against
+    # the manifest.
+    return "headers" in deployed and deployed["headers"] != entry["headers"]
+
+
+def plan(local, deployed):
+    uploads = sorted(
+        key
+        for key, entry in local.items()
+        if changed(entry, deployed.get(key))
+    )
+    deletes = sorted(set(deployed) - set(local))
+    return uploads, deletes
+
+
+def batches(keys, size=DELETE_BATCH):
+    for start in range(0, len(keys), size):
+        yield keys[start : start + size]
+
+
+def manifest_path(bucket):
+    return cache.directory("sync") / f"{bucket}.json"
+
+
+def load_manifest(bucket):
+    try:
+        with open(manifest_path(bucket)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def transfer_config(workers):
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(
+        multipart_threshold=PART_SIZE,
+        multipart_chunksize=PART_SIZE,
+        max_concurrency=workers,
+    )
+
+
+def upload(client, bucket, path, key, headers, config):
+    client.upload_file(
+        path,
+        bucket,
+        key,
+        ExtraArgs={**headers, "ACL": "public-read"},
+        Config=config,
+    )
+
+
+def delete(client, bucket, keys):
+    errors = []
+    for batch in batches(keys):
+        response = client.delete_objects(
+            Bucket=bucket,
+            Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+        )
+        errors.extend(response.get("Errors", []))
+    return errors
+
+
+def checked_files(directory, bucket, refuse_empty):
+    # A mistyped path walks as an empty tree, which would otherwise plan
+    # every object in the bucket for deletion.
+    if not os.path.isdir(directory):
+        raise ValueError(f"{directory} is not a directory")
+    files = local_files(directory)
+    if not files and refuse_empty:
+        raise ValueError(
+            f"{directory} is empty, so every object in {bucket} would be "
+            "deleted (see --allow-empty)"
+        )
+    return files
+
+
+def run(
+    client,
+    directory,
+    bucket,
+    workers=16,
+    delete_stale=True,
+    full=False,
+    rules=publish.DEFAULT_RULES,
+    compress=True,
+    uploader=upload,
+    allow_empty=False,
+):
+    files = checked_files(directory, bucket, delete_stale and not allow_empty)
+
+    manifest = None if full else load_manifest(bucket)
+    if manifest is None:
+        with trace.span("list", bucket=bucket):
+            deployed = remote(client, bucket)
+        previous = {}
+    else:
+        deployed = manifest
+        previous = manifest
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        staging = cache.directory("publish")
+        with trace.span("scan", files=len(files)):
+            local = scan(files, previous, pool)
+        with trace.span("prepare"):
+            local = publish.prepare(
+                local, files, staging, etag, rules=rules, compress=compress
+            )
+        uploads, deletes = plan(local, deployed)
+        if not delete_stale:
+            deletes = []
+
+        config = transfer_config(workers)
+        lock = threading.Lock()
+        failed = []
+
+        def send(key):
+            try:
+                uploader(
+                    client,
+                    bucket,
+                    publish.body(staging, files[key], local[key]),
+                    key,
+                    local[key]["headers"],
+                    config,
+                )
+            except Exception as e:
+                print(f"{key}: {e}", file=sys.stderr)
+                with lock:
+                    failed.append(key)
+                return
+            with lock:
+                deployed[key] = local[key]
+
+        try:
+            with trace.span("upload", objects=len(uploads)):
+                list(pool.map(send, uploads))
+            with trace.span("delete", objects=len(deletes)):
+                errors = delete(client, bucket, deletes)
+            undeleted = {error["Key"] for error in errors}
+            for key in deletes:
+                if key not in undeleted:
+                    deployed.pop(key, None)
+        finally:
+            # Record what we know to be in the bucket, including local
+            # stats so unchanged files are not rehashed next time.
+            for key, entry in deployed.items():
+                if local.get(key, {}).get("etag") == entry["etag"]:
+                    deployed[key] = local[key]
+            cache.write(manifest_path(bucket), json.dumps(deployed))
+
+    for error in errors:
+        print(f"{error['Key']}: {error['Message']}", file=sys.stderr)
+
+    return {
+        "uploaded": len(uploads) - len(failed),
+        "deleted": len(deletes) - len(errors),
+        "unchanged": len(local) - len(uploads),
+        "failed": len(failed) + len(errors),
+    }
+
+
+def sync(
+    directory,
+    domain,
+    *,
+    subdomain=None,
+    region="eu-west-2",
+    workers=16,
+    no_delete=False,
+    full=False,
+    cache_rules=None,
+    no_compress=False,
+    allow_empty=False,
+):
+    """Upload a directory's changed files to a static site's bucket
+
+    :param directory: Local directory holding the site content
+    :param domain: The site's domain
+    :param subdomain: Sync the bucket of this subdomain of the domain
+    :param region: The region the site's stack is deployed in
+    :param workers: Maximum number of concurrent uploads
+    :param no_delete: Keep objects that no longer exist locally
+    :param full: List the whole bucket instead of trusting the local
+        manifest of what was last uploaded
+    :param cache_rules: JSON file mapping regular expressions on keys to
+        Cache-Control values, checked in order before the defaults
+    :param no_compress: Upload text assets as they are instead of gzipped
+    :param allow_empty: Sync an empty directory, deleting every object in
+        the bucket
+    """
+    bucket = f"{subdomain}.{domain}" if subdomain else domain
+    rules = (
+        publish.load_rules(cache_rules)
+        if cache_rules
+        else publish.DEFAULT_RULES
+    )
+    try:
+        result = run(
+            clients.client("s3", region),
+            directory,
+            bucket,
+            workers=workers,
+            delete_stale=not no_delete,
+            full=full,
+            rules=rules,
+            compress=not no_compress,
+            allow_empty=allow_empty,
+        )
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(2)
+    print(
+        " ".join(f"{name}={count}" for name, count in result.items()),
+    )
+    if result["failed"]:
+        sys.exit(1)
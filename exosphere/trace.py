@@ -0,0 +1,137 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+# Spans are written in the Chrome trace event format, so a trace opens
+# directly in Perfetto or chrome://tracing and is a flat list of timed
+# events that is easy to aggregate across runs.
+
+_lock = threading.Lock()
+_events = None
+_origin = 0.0
+
+
+def enabled():
+    return _events is not None
+
+
+def now():
+    return (time.perf_counter() - _origin) * 1e6
+
+
+def record(name, category, start, end, **args):
+    if _events is None:
+        return
+    event = {
+        "name": name,
+        "cat": category,
+        "ph": "X",
+        "ts": round(start, 1),
+        "dur": round(end - start, 1),
+        "pid": os.getpid(),
+        "tid": threading.get_ident(),
+        "args": args,
+    }
+    with _lock:
+        if _events is not None:
+            _events.append(event)
+
+
+@contextlib.contextmanager
+def span(name, category="phase", **args):
+    if _events is None:
+        yield args
+        return
+
+    start = now()
+    try:
+        yield args
+    except BaseException as e:
+        args["error"] = repr(e)
+        raise
+    finally:
+        record(name, category, start, now(), **args)
+
+
+@contextlib.contextmanager
+def recording(path, **metadata):
+    global _events, _origin
+    with _lock:
+        _events = []
+        _origin = time.perf_counter()
+    started = time.time()
+    try:
+        yield
+    finally:
+        with _lock:
+            events, _events = _events, None
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "traceEvents": events,
+                    "displayTimeUnit": "ms",
+                    "otherData": {"started": started, **metadata},
+                },
+                f,
+            )
+
+
+def _before_call(context, event_name, **kwargs):
+    if _events is not None:
+        context["exosphere_trace"] = {
+            "operation": event_name.split(".", 2)[2],
+            "start": now(),
+            "attempts": [],
+        }
+
+
+def _request_created(request, **kwargs):
+    state = getattr(request, "context", {}).get("exosphere_trace")
+    if state is not None:
+        state["attempt_start"] = now()
+
+
+def _response_received(context, response_dict, exception, **kwargs):
+    state = context.get("exosphere_trace")
+    if state is None or "attempt_start" not in state:
+        return
+    outcome = {"attempt": len(state["attempts"]) + 1}
+    if exception is not None:
+        outcome["error"] = repr(exception)
+    elif response_dict is not None:
+        outcome["status"] = response_dict["status_code"]
+    state["attempts"].append(outcome)
+    record(
+        state["operation"],
+        "attempt",
+        state.pop("attempt_start"),
+        now(),
+        **outcome,
+    )
+
+
+def _after_call(context, event_name, http_response=None, **kwargs):
+    state = context.pop("exosphere_trace", None)
+    if state is None:
+        return
+    service = event_name.split(".", 2)[1]
+    args = {"service": service, "attempts": max(len(state["attempts"]), 1)}
+    if http_response is not None:
+        args["status"] = http_response.status_code
+    if "exception" in kwargs:
+        args["error"] = repr(kwargs["exception"])
+    record(state["operation"], "api", state["start"], now(), **args)
+
+
+def instrument(client):
+    # The handlers do nothing unless a recording is in progress, so pooled
+    # clients can be instrumented once when they are created.
+    events = client.meta.events
+    events.register("before-call.*.*", _before_call)
+    events.register("request-created.*.*", _request_created)
+    events.register("response-received.*.*", _response_received)
+    events.register("after-call.*.*", _after_call)
+    events.register("after-call-error.*.*", _after_call)
+    return client
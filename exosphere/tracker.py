@@ -0,0 +1,152 @@
+import asyncio
+import sys
+import time
+import uuid
+
+from exosphere import aio, trace
+
+COMPLETE_STATUSES = {
+    "CREATE_COMPLETE",
+    "UPDATE_COMPLETE",
+    "DELETE_COMPLETE",
+    "IMPORT_COMPLETE",
+}
+
+FAILED_STATUSES = {
+    "CREATE_FAILED",
+    "ROLLBACK_IN_PROGRESS",
+    "ROLLBACK_COMPLETE",
+    "ROLLBACK_FAILED",
+    "DELETE_FAILED",
+    "UPDATE_FAILED",
+    "UPDATE_ROLLBACK_IN_PROGRESS",
+    "UPDATE_ROLLBACK_COMPLETE",
+    "UPDATE_ROLLBACK_FAILED",
+    "IMPORT_ROLLBACK_IN_PROGRESS",
+    "IMPORT_ROLLBACK_COMPLETE",
+    "IMPORT_ROLLBACK_FAILED",
+}
+
+MIN_DELAY = 1
+MAX_DELAY = 15
+BACKOFF = 1.5
+
+
+class StackFailed(Exception):
+    def __init__(self, stack_name, status, reason):
+        super().__init__(f"{stack_name} {status}: {reason}")
+        self.stack_name = stack_name
+        self.status = status
+        self.reason = reason
+
+
+def token():
+    return str(uuid.uuid4())
+
+
+def new_events(client, stack_name, request_token, seen):
+    # Events come newest first, and everything older than the first event
+    # from another operation belongs to history we do not need to page.
+    events = []
+    kwargs = {"StackName": stack_name}
+    while True:
+        page = client.describe_stack_events(**kwargs)
+        for event in page["StackEvents"]:
+            if event["EventId"] in seen:
+                return list(reversed(events))
+            if event.get("ClientRequestToken") != request_token:
+                seen.add(event["EventId"])
+                return list(reversed(events))
+            events.append(event)
+        if "NextToken" not in page:
+            return list(reversed(events))
+        kwargs["NextToken"] = page["NextToken"]
+
+
+def describe(event):
+    line = (
+        f"{event['Timestamp']:%H:%M:%S} {event['StackName']} "
+        f"{event['LogicalResourceId']} {event['ResourceStatus']}"
+    )
+    if event.get("ResourceStatusReason"):
+        line += f" ({event['ResourceStatusReason']})"
+    return line
+
+
+def progress(stack_name, events, seen, failures, out):
+    for event in events:
+        seen.add(event["EventId"])
+        if out is not None:
+            print(describe(event), file=out)
+
+        status = event["ResourceStatus"]
+        if status.endswith("_FAILED"):
+            failures.append(event.get("ResourceStatusReason", status))
+
+        if event.get("PhysicalResourceId") != event["StackId"]:
+            continue
+        if status in COMPLETE_STATUSES:
+            return status
+        if status in FAILED_STATUSES:
+            reason = failures[0] if failures else status
+            raise StackFailed(stack_name, status, reason)
+    return None
+
+
+def wait(
+    client,
+    stack_name,
+    request_token,
+    timeout=3600,
+    out=sys.stderr,
+    sleep=time.sleep,
+    clock=time.monotonic,
+):
+    with trace.span("wait", stack=stack_name) as span:
+        seen = set()
+        failures = []
+        delay = MIN_DELAY
+        deadline = clock() + timeout
+
+        while True:
+            events = new_events(client, stack_name, request_token, seen)
+            status = progress(stack_name, events, seen, failures, out)
+            if status is not None:
+                span["status"] = status
+                return status
+
+            if clock() >= deadline:
+                raise TimeoutError(f"Timed out waiting for {stack_name}")
+
+            delay = MIN_DELAY if events else min(delay * BACKOFF, MAX_DELAY)
+            sleep(delay)
+
+
+async def wait_async(
+    client,
+    stack_name,
+    request_token,
+    timeout=3600,
+    out=sys.stderr,
+    clock=time.monotonic,
+):
+    with trace.span("wait", stack=stack_name) as span:
+        seen = set()
+        failures = []
+        delay = MIN_DELAY
+        deadline = clock() + timeout
+
+        while True:
+            events = await aio.call(
+                new_events, client, stack_name, request_token, seen
+            )
+            status = progress(stack_name, events, seen, failures, out)
+            if status is not None:
+                span["status"] = status
+                return status
+
+            if clock() >= deadline:
+                raise TimeoutError(f"Timed out waiting for {stack_name}")
+
+            delay = MIN_DELAY if events else min(delay * BACKOFF, MAX_DELAY)
+            await asyncio.sleep(delay)
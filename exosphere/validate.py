@@ -0,0 +1,256 @@
+import hashlib
+import json
+import sys
+import threading
+import time
+
+from exosphere import cache, trace
+
+# CloudFormation's own limits, checked before anything is sent.
+MAX_TEMPLATE_BODY = 51200
+MAX_TEMPLATE_URL_BODY = 1024 * 1024
+LIMITS = {"Resources": 500, "Parameters": 200, "Outputs": 200}
+
+SECTIONS = {
+    "AWSTemplateFormatVersion",
+    "Conditions",
+    "Description",
+    "Mappings",
+    "Metadata",
+    "Outputs",
+    "Parameters",
+    "Resources",
+    "Rules",
+    "Transform",
+}
+
+SPEC_URL = (
+    "https://d1uauaxba7bl29.cloudfront.net/latest/gzip/"
+    "CloudFormationResourceSpecification.json"
+)
+SPEC_MAX_AGE = 7 * 24 * 60 * 60
+# After a failed fetch, how long every process waits before trying again.
+SPEC_RETRY_AFTER = 60 * 60
+
+_lock = threading.Lock()
+_spec = None
+_valid: set = set()
+
+
+class InvalidTemplate(Exception):
+    def __init__(self, problems):
+        super().__init__("; ".join(problems))
+        self.problems = problems
+
+
+def size(body):
+    return len(body.encode("utf-8"))
+
+
+def compact(body):
+    # Indentation counts against CloudFormation's size limits like anything
+    # else, so what is sent has none.
+    try:
+        return json.dumps(json.loads(body), separators=(",", ":"))
+    except ValueError as e:
+        raise InvalidTemplate([f"Template is not JSON: {e}"])
+
+
+def trim(full):
+    # Only what the checks need, which loads far faster than the full
+    # specification.
+    return {
+        name: {
+            "properties": {
+                prop: details.get("Required", False)
+                for prop, details in resource.get("Properties", {}).items()
+            },
+            "attributes": sorted(resource.get("Attributes", {})),
+        }
+        for name, resource in full["ResourceTypes"].items()
+    }
+
+
+def fetch():
+    import gzip
+    import urllib.request
+
+    with urllib.request.urlopen(SPEC_URL, timeout=10) as response:
+        data = response.read()
+    if data[:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    return trim(json.loads(data))
+
+
+def age(path, clock):
+    try:
+        return clock() - path.stat().st_mtime
+    except FileNotFoundError:
+        return float("inf")
+
+
+def spec(fetcher=fetch, clock=time.time):
+    # A stale copy is better than none when offline, and with no copy at
+    # all only the checks that need no specification are made.
+    global _spec
+    with _lock:
+        if _spec is not None:
+            return _spec
+
+    path = cache.directory("spec") / "resources.json"
+    failed = path.with_name("failed")
+    fresh = age(path, clock) < SPEC_MAX_AGE
+    # A failed fetch is remembered, so being offline costs one timeout
+    # every SPEC_RETRY_AFTER rather than one in every process.
+    backing_off = age(failed, clock) < SPEC_RETRY_AFTER
+
+    loaded = None
+    if not fresh and not backing_off:
+        with trace.span("spec"):
+            try:
+                loaded = fetcher()
+                cache.write(path, json.dumps(loaded))
+                failed.unlink(missing_ok=True)
+            except (OSError, ValueError):
+                cache.write(failed, "")
+    if loaded is None:
+        try:
+            loaded = json.loads(path.read_text())
+        except (FileNotFoundError, ValueError):
+            print(
+                "No CloudFormation resource specification available, so "
+                "resource types and properties are not checked",
+                file=sys.stderr,
+            )
+            loaded = {}
+
+    with _lock:
+        _spec = loaded
+    return loaded
+
+
+def intrinsics(value, name):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key == name:
+                yield item
+            yield from intrinsics(item, name)
+    elif isinstance(value, list):
+        for item in value:
+            yield from intrinsics(item, name)
+
+
+def section_problems(template):
+    found = []
+    for section in template:
+        if section not in SECTIONS:
+            found.append(f"Unknown template section {section}")
+    for section, limit in LIMITS.items():
+        if len(template.get(section, {})) > limit:
+            found.append(
+                f"{len(template[section])} {section.lower()} is over the "
+                f"limit of {limit}"
+            )
+    if not template.get("Resources"):
+        found.append("Template has no resources")
+    return found
+
+
+def resource_problems(title, resource, resources, resource_spec):
+    kind = resource.get("Type")
+    if kind is None:
+        return [f"{title} has no Type"]
+
+    depends_on = resource.get("DependsOn", [])
+    if isinstance(depends_on, str):
+        depends_on = [depends_on]
+    found = [
+        f"{title} depends on unknown {dependency}"
+        for dependency in depends_on
+        if dependency not in resources
+    ]
+
+    if not resource_spec or kind.startswith("Custom::"):
+        return found
+    known = resource_spec.get(kind)
+    if known is None:
+        return found + [f"{title} has unknown type {kind}"]
+    properties = resource.get("Properties", {})
+    for prop in properties:
+        if prop not in known["properties"]:
+            found.append(f"{title} has unknown property {prop}")
+    for prop, required in known["properties"].items():
+        if required and prop not in properties:
+            found.append(f"{title} is missing property {prop}")
+    return found
+
+
+def reference_problems(template, resource_spec):
+    resources = template.get("Resources", {})
+    names = set(template.get("Parameters", {})) | set(resources)
+    found = [
+        f"Ref to unknown {ref}"
+        for ref in intrinsics(template, "Ref")
+        if isinstance(ref, str)
+        and ref not in names
+        and not ref.startswith("AWS::")
+    ]
+
+    for target in intrinsics(template, "Fn::GetAtt"):
+        if isinstance(target, str):
+            target = target.split(".", 1)
+        title, attribute = target
+        if not isinstance(title, str):
+            continue
+        if title not in resources:
+            found.append(f"GetAtt of unknown {title}")
+            continue
+        known = resource_spec.get(resources[title].get("Type"))
+        if (
+            known is not None
+            and isinstance(attribute, str)
+            and attribute.split(".", 1)[0] not in known["attributes"]
+            and attribute not in known["attributes"]
+        ):
+            found.append(f"GetAtt of unknown {title}.{attribute}")
+    return found
+
+
+def problems(template, resource_spec):
+    resources = template.get("Resources", {})
+    found = section_problems(template)
+    for title, resource in resources.items():
+        found.extend(
+            resource_problems(title, resource, resources, resource_spec)
+        )
+    return found + reference_problems(template, resource_spec)
+
+
+def check(body, resource_spec=None):
+    # Rendered templates are reused across a fleet, so each distinct body
+    # only needs checking once.
+    digest = hashlib.sha256(body.encode("utf-8")).hexdigest()
+    with _lock:
+        if digest in _valid:
+            return size(body)
+
+    with trace.span("validate") as span:
+        span["size"] = size(body)
+        try:
+            template = json.loads(body)
+        except ValueError as e:
+            raise InvalidTemplate([f"Template is not JSON: {e}"])
+        found = problems(
+            template, spec() if resource_spec is None else resource_spec
+        )
+        if span["size"] > MAX_TEMPLATE_URL_BODY:
+            found.append(
+                f"Template is {span['size']} bytes, over the limit of "
+                f"{MAX_TEMPLATE_URL_BODY}"
+            )
+        if found:
+            raise InvalidTemplate(found)
+
+    with _lock:
+        _valid.add(digest)
+    return span["size"]
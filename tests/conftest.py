@@ -0,0 +1,21 @@
+import pytest
+import standin
+
+from exosphere import clients, validate
+
+
+@pytest.fixture
+def isolated(tmp_path, monkeypatch):
+    # Nothing cached by one test is seen by the next, and no specification
+    # is downloaded.
+    monkeypatch.setenv("EXOSPHERE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(validate, "_spec", {})
+    monkeypatch.setattr(clients, "_clients", {})
+    return tmp_path
+
+
+@pytest.fixture
+def cloudformation(isolated):
+    cloudformation = standin.CloudFormation()
+    cloudformation.install("eu-west-2")
+    return cloudformation
@@ -0,0 +1,637 @@
+import collections
+import datetime
+import json
+import random
+import threading
+import time
+import uuid
+from urllib.parse import parse_qsl
+from xml.sax.saxutils import escape
+
+from exosphere import clients, trace
+
+# An in-process CloudFormation for tests and benchmarks. It answers the
+# client's HTTP requests with the XML CloudFormation would send, so
+# parsing, retries and adaptive rate limiting all behave as they do
+# against the real service.
+
+NAMESPACE = "http://cloudformation.amazonaws.com/doc/2010-05-15/"
+ACCOUNT = "123456789012"
+EVENTS_PER_PAGE = 100
+
+NO_CHANGES = (
+    "The submitted information didn't contain changes. Submit different "
+    "information to create a change set."
+)
+
+
+class Failure(Exception):
+    def __init__(self, code, message, status=400):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+
+
+class Raw:
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+def decode(body):
+    if isinstance(body, bytes):
+        body = body.decode("utf-8")
+    root = {}
+    for key, value in parse_qsl(body or "", keep_blank_values=True):
+        node = root
+        *path, name = key.split(".")
+        for part in path:
+            node = node.setdefault(part, {})
+        node[name] = value
+    return listify(root)
+
+
+def listify(node):
+    if not isinstance(node, dict):
+        return node
+    if list(node) == ["member"]:
+        members = sorted(node["member"].items(), key=lambda m: int(m[0]))
+        return [listify(value) for _, value in members]
+    return {key: listify(value) for key, value in node.items()}
+
+
+def encode(shape, value):
+    if shape.type_name == "structure":
+        return "".join(
+            f"<{name}>{encode(member, value[name])}</{name}>"
+            for name, member in shape.members.items()
+            if value.get(name) is not None
+        )
+    if shape.type_name == "list":
+        return "".join(
+            f"<member>{encode(shape.member, item)}</member>" for item in value
+        )
+    if shape.type_name == "map":
+        return "".join(
+            f"<entry><key>{escape(key)}</key>"
+            f"<value>{encode(shape.value, item)}</value></entry>"
+            for key, item in value.items()
+        )
+    if shape.type_name == "timestamp":
+        return value.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    if shape.type_name == "boolean":
+        return "true" if value else "false"
+    return escape(str(value))
+
+
+def response(url, status, body):
+    return _response_class()(
+        url, status, {"Content-Type": "text/xml"}, Raw(body.encode("utf-8"))
+    )
+
+
+def _response_class():
+    from botocore.awsrequest import AWSResponse
+
+    return AWSResponse
+
+
+def resolve(value, parameters):
+    # Just enough of the intrinsic functions to give outputs plausible
+    # values, such as a hosted zone name passed on to another stack.
+    if isinstance(value, dict) and len(value) == 1:
+        ((function, argument),) = value.items()
+        if function == "Ref":
+            return parameters.get(argument, f"{argument}-physical-id")
+        if function == "Fn::GetAtt":
+            if isinstance(argument, str):
+                argument = argument.split(".", 1)
+            return ".".join(str(part) for part in argument)
+        if function == "Fn::Join":
+            separator, items = argument
+            if not isinstance(items, list):
+                # A comma delimited list parameter joins back to itself.
+                return resolve(items, parameters)
+            return separator.join(resolve(item, parameters) for item in items)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+class CloudFormation:
+    def __init__(
+        self,
+        latency=0.0,
+        operation_time=0.0,
+        throttle_rate=0.0,
+        seed=0,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        self.latency = latency
+        self.operation_time = operation_time
+        self.throttle_rate = throttle_rate
+        self.clock = clock
+        self.sleep = sleep
+        # Keyed by region and name, as the same name can be used in each
+        # region.
+        self.stacks = {}
+        self.templates = {}
+        self.calls = collections.Counter()
+        self.detections = {}
+        self.throttled = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def client(self, region):
+        session = clients.session()
+        client = session.client(
+            "cloudformation",
+            region_name=region,
+            aws_access_key_id="standin",
+            aws_secret_access_key="standin",
+            config=clients.config(),
+        )
+        return self.attach(trace.instrument(client))
+
+    def attach(self, client):
+        model = client.meta.service_model
+        region = client.meta.region_name
+
+        def handle(request, **kwargs):
+            return self.handle(model, region, request)
+
+        client.meta.events.register("before-send.cloudformation.*", handle)
+        return client
+
+    def install(self, *regions):
+        # Stands in for the pooled client every stack module uses.
+        for region in regions:
+            clients._clients[("cloudformation", region)] = self.client(region)
+
+    def handle(self, model, region, request):
+        params = decode(request.body)
+        action = params.pop("Action")
+        params.pop("Version", None)
+        if self.latency:
+            self.sleep(self.latency)
+
+        request_id = str(uuid.uuid4())
+        with self._lock:
+            self.calls[action] += 1
+            try:
+                if self._random.random() < self.throttle_rate:
+                    self.throttled += 1
+                    raise Failure("Throttling", "Rate exceeded")
+                self.advance()
+                result = getattr(self, action)(region=region, **params)
+            except Failure as e:
+                return response(
+                    request.url,
+                    e.status,
+                    f'<ErrorResponse xmlns="{NAMESPACE}"><Error>'
+                    f"<Type>Sender</Type><Code>{e.code}</Code>"
+                    f"<Message>{escape(e.message)}</Message></Error>"
+                    f"<RequestId>{request_id}</RequestId></ErrorResponse>",
+                )
+
+        shape = model.operation_model(action).output_shape
+        body = encode(shape, result) if shape is not None else ""
+        return response(
+            request.url,
+            200,
+            f'<{action}Response xmlns="{NAMESPACE}">'
+            f"<{action}Result>{body}</{action}Result>"
+            f"<ResponseMetadata><RequestId>{request_id}</RequestId>"
+            f"</ResponseMetadata></{action}Response>",
+        )
+
+    def now(self):
+        return datetime.datetime.now(datetime.timezone.utc)
+
+    def region_stacks(self, region):
+        return [
+            stack
+            for (stack_region, _), stack in self.stacks.items()
+            if stack_region == region
+        ]
+
+    def stack(self, region, name):
+        # Deleted stacks can still be found by id, as in CloudFormation.
+        for stack in self.region_stacks(region):
+            if stack["StackId"] == name:
+                return stack
+        stack = self.stacks.get((region, name))
+        if stack is None or stack["StackStatus"] == "DELETE_COMPLETE":
+            raise Failure(
+                "ValidationError", f"Stack with id {name} does not exist"
+            )
+        return stack
+
+    def event(self, stack, logical_id, status, resource_type=None):
+        stack["events"].append(
+            {
+                "EventId": str(uuid.uuid4()),
+                "StackId": stack["StackId"],
+                "StackName": stack["StackName"],
+                "LogicalResourceId": logical_id,
+                "PhysicalResourceId": (
+                    stack["StackId"]
+                    if logical_id == stack["StackName"]
+                    else f"{logical_id}-physical-id"
+                ),
+                "ResourceType": resource_type or "AWS::CloudFormation::Stack",
+                "ResourceStatus": status,
+                "Timestamp": self.now(),
+                "ClientRequestToken": stack.get("token"),
+            }
+        )
+
+    def begin(self, stack, status, final, resources, token=None):
+        stack["StackStatus"] = status
+        stack["LastUpdatedTime"] = self.now()
+        stack["token"] = token
+        self.event(stack, stack["StackName"], status)
+        for title, resource in resources.items():
+            self.event(stack, title, status, resource.get("Type"))
+        stack["pending"] = {
+            "at": self.clock() + self.operation_time,
+            "status": final,
+            "resources": resources,
+        }
+
+    def advance(self):
+        # Operations finish lazily, the next time anything is asked of the
+        # stand-in after they are due.
+        for stack in self.stacks.values():
+            pending = stack.get("pending")
+            if pending is None or self.clock() < pending["at"]:
+                continue
+            for title, resource in pending["resources"].items():
+                status = pending["status"].replace("ROLLBACK_", "")
+                self.event(stack, title, status, resource.get("Type"))
+            stack["StackStatus"] = pending["status"]
+            self.event(stack, stack["StackName"], pending["status"])
+            stack["pending"] = None
+
+    def view(self, stack):
+        template = json.loads(stack["template"] or "{}")
+        parameters = {
+            p["ParameterKey"]: p["ParameterValue"] for p in stack["Parameters"]
+        }
+        return {
+            "StackId": stack["StackId"],
+            "StackName": stack["StackName"],
+            "StackStatus": stack["StackStatus"],
+            "CreationTime": stack["CreationTime"],
+            "LastUpdatedTime": stack.get("LastUpdatedTime"),
+            "Parameters": stack["Parameters"],
+            "Tags": stack["Tags"],
+            "Outputs": [
+                {
+                    "OutputKey": key,
+                    "OutputValue": resolve(output["Value"], parameters),
+                }
+                for key, output in template.get("Outputs", {}).items()
+            ],
+        }
+
+    def DescribeStacks(self, region, StackName=None, NextToken=None):
+        if StackName:
+            return {"Stacks": [self.view(self.stack(region, StackName))]}
+        return {
+            "Stacks": [
+                self.view(stack)
+                for stack in self.region_stacks(region)
+                if stack["StackStatus"] != "DELETE_COMPLETE"
+            ]
+        }
+
+    def drift(self, region, stack_name, logical_id, path, expected, actual):
+        # What a hand edit in the console would leave for drift detection
+        # to find.
+        self.stacks[region, stack_name]["drifts"].setdefault(
+            logical_id, []
+        ).append(
+            {
+                "PropertyPath": path,
+                "ExpectedValue": json.dumps(expected),
+                "ActualValue": json.dumps(actual),
+                "DifferenceType": "NOT_EQUAL",
+            }
+        )
+
+    def ListStacks(self, region, StackStatusFilter=(), NextToken=None):
+        return {
+            "StackSummaries": [
+                {
+                    key: stack.get(key)
+                    for key in (
+                        "StackId",
+                        "StackName",
+                        "StackStatus",
+                        "CreationTime",
+                        "LastUpdatedTime",
+                    )
+                }
+                for stack in self.region_stacks(region)
+                if not StackStatusFilter
+                or stack["StackStatus"] in StackStatusFilter
+            ]
+        }
+
+    def CreateChangeSet(
+        self,
+        region,
+        StackName,
+        ChangeSetName,
+        ChangeSetType="UPDATE",
+        TemplateBody=None,
+        TemplateURL=None,
+        Parameters=(),
+        Tags=(),
+        **kwargs,
+    ):
+        if TemplateBody is None:
+            TemplateBody = self.template(TemplateURL)
+        stack = self.stacks.get((region, StackName))
+        if stack is not None and stack["StackStatus"] == "DELETE_COMPLETE":
+            stack = None
+
+        if ChangeSetType == "CREATE":
+            if stack is not None and stack["StackStatus"] != (
+                "REVIEW_IN_PROGRESS"
+            ):
+                raise Failure(
+                    "AlreadyExistsException", f"Stack [{StackName}] exists"
+                )
+            stack = self.stacks[region, StackName] = {
+                "StackId": f"arn:aws:cloudformation:{region}:{ACCOUNT}:"
+                f"stack/{StackName}/{uuid.uuid4()}",
+                "StackName": StackName,
+                "StackStatus": "REVIEW_IN_PROGRESS",
+                "CreationTime": self.now(),
+                "Parameters": [],
+                "Tags": [],
+                "template": None,
+                "events": [],
+                "change_sets": {},
+                "pending": None,
+                "drifts": {},
+            }
+        elif stack is None:
+            raise Failure(
+                "ValidationError", f"Stack with id {StackName} does not exist"
+            )
+
+        resources = json.loads(TemplateBody).get("Resources", {})
+        current = json.loads(stack["template"] or "{}").get("Resources", {})
+        changes = [
+            {
+                "Type": "Resource",
+                "ResourceChange": {
+                    "Action": "Add" if title not in current else "Modify",
+                    "LogicalResourceId": title,
+                    "ResourceType": resource.get("Type"),
+                },
+            }
+            for title, resource in resources.items()
+            if current.get(title) != resource
+            or list(Parameters) != stack["Parameters"]
+        ] + [
+            {
+                "Type": "Resource",
+                "ResourceChange": {
+                    "Action": "Remove",
+                    "LogicalResourceId": title,
+                    "ResourceType": resource.get("Type"),
+                },
+            }
+            for title, resource in current.items()
+            if title not in resources
+        ]
+
+        stack["change_sets"][ChangeSetName] = {
+            "ChangeSetName": ChangeSetName,
+            "StackName": StackName,
+            "Status": "CREATE_COMPLETE" if changes else "FAILED",
+            "StatusReason": None if changes else NO_CHANGES,
+            "ExecutionStatus": "AVAILABLE" if changes else "UNAVAILABLE",
+            "Changes": changes,
+            "template": TemplateBody,
+            "parameters": list(Parameters),
+            "tags": list(Tags),
+            "type": ChangeSetType,
+        }
+        return {
+            "Id": f"{stack['StackId']}/changeSet/{ChangeSetName}",
+            "StackId": stack["StackId"],
+        }
+
+    def publish_template(self, body, region):
+        # Stands in for artifacts.publish_template, for templates too big
+        # to send inline.
+        url = f"https://standin.s3.{region}.amazonaws.com/{uuid.uuid4()}"
+        with self._lock:
+            self.templates[url] = body
+        return url
+
+    def template(self, url):
+        if url not in self.templates:
+            raise Failure(
+                "ValidationError", "TemplateURL must be a supported URL."
+            )
+        return self.templates[url]
+
+    def change_set(self, region, StackName, ChangeSetName):
+        change_sets = self.stack(region, StackName)["change_sets"]
+        if ChangeSetName not in change_sets:
+            raise Failure(
+                "ChangeSetNotFound", f"ChangeSet [{ChangeSetName}] not found"
+            )
+        return change_sets[ChangeSetName]
+
+    def DescribeChangeSet(self, region, StackName, ChangeSetName, **kwargs):
+        change_set = self.change_set(region, StackName, ChangeSetName)
+        return {
+            key: value for key, value in change_set.items() if key[0].isupper()
+        }
+
+    def DeleteChangeSet(self, region, StackName, ChangeSetName):
+        self.change_set(region, StackName, ChangeSetName)
+        del self.stack(region, StackName)["change_sets"][ChangeSetName]
+        return {}
+
+    def ExecuteChangeSet(
+        self, region, StackName, ChangeSetName, ClientRequestToken=None
+    ):
+        stack = self.stack(region, StackName)
+        change_set = self.change_set(region, StackName, ChangeSetName)
+        if change_set["ExecutionStatus"] != "AVAILABLE":
+            raise Failure(
+                "InvalidChangeSetStatus", f"{ChangeSetName} is not available"
+            )
+        if stack["pending"] is not None:
+            raise Failure(
+                "ValidationError",
+                f"Stack:{stack['StackId']} is in "
+                f"{stack['StackStatus']} state",
+            )
+
+        action = change_set["type"]
+        stack["previous"] = (
+            stack["template"],
+            stack["Parameters"],
+            stack["Tags"],
+        )
+        stack["template"] = change_set["template"]
+        stack["Parameters"] = change_set["parameters"]
+        stack["Tags"] = change_set["tags"]
+        stack["change_sets"] = {}
+        resources = {
+            change["ResourceChange"]["LogicalResourceId"]: {
+                "Type": change["ResourceChange"]["ResourceType"]
+            }
+            for change in change_set["Changes"]
+        }
+        self.begin(
+            stack,
+            f"{action}_IN_PROGRESS",
+            f"{action}_COMPLETE",
+            resources,
+            ClientRequestToken,
+        )
+        return {}
+
+    def CancelUpdateStack(self, region, StackName, ClientRequestToken=None):
+        stack = self.stack(region, StackName)
+        if stack["StackStatus"] != "UPDATE_IN_PROGRESS":
+            raise Failure(
+                "ValidationError",
+                "CancelUpdateStack cannot be called from current stack "
+                f"status {stack['StackStatus']}",
+            )
+        stack["template"], stack["Parameters"], stack["Tags"] = stack[
+            "previous"
+        ]
+        self.begin(
+            stack,
+            "UPDATE_ROLLBACK_IN_PROGRESS",
+            "UPDATE_ROLLBACK_COMPLETE",
+            stack["pending"]["resources"],
+            stack["token"],
+        )
+        return {}
+
+    def DeleteStack(self, region, StackName, ClientRequestToken=None, **kw):
+        try:
+            stack = self.stack(region, StackName)
+        except Failure:
+            return {}
+        if stack["StackStatus"] == "DELETE_COMPLETE":
+            return {}
+        resources = json.loads(stack["template"] or "{}").get("Resources", {})
+        self.begin(
+            stack,
+            "DELETE_IN_PROGRESS",
+            "DELETE_COMPLETE",
+            resources,
+            ClientRequestToken,
+        )
+        return {}
+
+    def ListStackResources(self, region, StackName, NextToken=None):
+        stack = self.stack(region, StackName)
+        resources = json.loads(stack["template"] or "{}").get("Resources", {})
+        parameters = {
+            p["ParameterKey"]: p["ParameterValue"] for p in stack["Parameters"]
+        }
+        return {
+            "StackResourceSummaries": [
+                {
+                    "LogicalResourceId": title,
+                    "PhysicalResourceId": (
+                        resolve(properties["BucketName"], parameters)
+                        if "BucketName" in properties
+                        else f"{title}-physical-id"
+                    ),
+                    "ResourceType": resource.get("Type"),
+                    "ResourceStatus": stack["StackStatus"],
+                    "LastUpdatedTimestamp": stack.get("LastUpdatedTime")
+                    or stack["CreationTime"],
+                }
+                for title, resource in resources.items()
+                for properties in [resource.get("Properties", {})]
+            ]
+        }
+
+    def DescribeStackEvents(self, region, StackName, NextToken=None):
+        events = list(reversed(self.stack(region, StackName)["events"]))
+        start = int(NextToken or 0)
+        page = events[start : start + EVENTS_PER_PAGE]
+        result = {"StackEvents": page}
+        if start + EVENTS_PER_PAGE < len(events):
+            result["NextToken"] = str(start + EVENTS_PER_PAGE)
+        return result
+
+    def GetTemplate(self, region, StackName, TemplateStage=None, **kwargs):
+        return {
+            "TemplateBody": self.stack(region, StackName)["template"] or "{}"
+        }
+
+    def DetectStackDrift(self, region, StackName, **kwargs):
+        stack = self.stack(region, StackName)
+        if stack["pending"] is not None:
+            raise Failure(
+                "ValidationError",
+                f"Stack {StackName} is in {stack['StackStatus']} state",
+            )
+        detection_id = str(uuid.uuid4())
+        self.detections[region, detection_id] = {
+            "stack": stack,
+            "at": self.clock() + self.operation_time,
+        }
+        return {"StackDriftDetectionId": detection_id}
+
+    def DescribeStackDriftDetectionStatus(self, region, StackDriftDetectionId):
+        detection = self.detections.get((region, StackDriftDetectionId))
+        if detection is None:
+            raise Failure(
+                "ValidationError",
+                f"Drift detection {StackDriftDetectionId} does not exist",
+            )
+        stack = detection["stack"]
+        result = {
+            "StackId": stack["StackId"],
+            "StackDriftDetectionId": StackDriftDetectionId,
+            "DetectionStatus": "DETECTION_IN_PROGRESS",
+            "Timestamp": self.now(),
+        }
+        if self.clock() >= detection["at"]:
+            result["DetectionStatus"] = "DETECTION_COMPLETE"
+            result["StackDriftStatus"] = (
+                "DRIFTED" if stack["drifts"] else "IN_SYNC"
+            )
+            result["DriftedStackResourceCount"] = len(stack["drifts"])
+        return result
+
+    def DescribeStackResourceDrifts(self, region, StackName, **kwargs):
+        stack = self.stack(region, StackName)
+        resources = json.loads(stack["template"] or "{}").get("Resources", {})
+        return {
+            "StackResourceDrifts": [
+                {
+                    "StackId": stack["StackId"],
+                    "LogicalResourceId": title,
+                    "PhysicalResourceId": f"{title}-physical-id",
+                    "ResourceType": resources.get(title, {}).get("Type"),
+                    "StackResourceDriftStatus": "MODIFIED",
+                    "PropertyDifferences": differences,
+                    "Timestamp": self.now(),
+                }
+                for title, differences in stack["drifts"].items()
+            ]
+        }
@@ -0,0 +1,77 @@
+import zipfile
+
+import pytest
+from botocore.exceptions import ClientError
+
+from exosphere import artifacts
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("EXOSPHERE_CACHE_DIR", str(tmp_path / "cache"))
+    return tmp_path
+
+
+@pytest.fixture
+def sources(tmp_path):
+    path = tmp_path / "forwarder.py"
+    path.write_text("def handler(event, context):\n    pass\n")
+    return {"index.py": path}
+
+
+class S3:
+    def __init__(self, objects=()):
+        self.objects = set(objects)
+        self.heads = 0
+        self.puts = []
+
+    def head_object(self, Bucket, Key):
+        self.heads += 1
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects.add(Key)
+        self.puts.append(Key)
+
+
+def test_builds_identical_zips_for_identical_sources(sources):
+    first = artifacts.build(sources)
+    sources["index.py"].touch()
+
+    assert artifacts.build(sources) == first
+
+
+def test_names_packages_by_content(sources):
+    key, path = artifacts.package("forwarder", sources)
+
+    assert key == f"forwarder/{artifacts.digest(sources)}.zip"
+    assert zipfile.ZipFile(path).namelist() == ["index.py"]
+
+    sources["index.py"].write_text("changed = True\n")
+    assert artifacts.package("forwarder", sources)[0] != key
+
+
+def test_reuses_cached_package(sources, monkeypatch):
+    artifacts.package("forwarder", sources)
+    monkeypatch.setattr(artifacts, "build", pytest.fail)
+
+    artifacts.package("forwarder", sources)
+
+
+def test_uploads_only_new_artifacts(sources):
+    key, path = artifacts.package("forwarder", sources)
+    client = S3()
+
+    assert artifacts.upload(client, "bucket", key, path)
+    assert not artifacts.upload(client, "bucket", key, path)
+    assert client.puts == [key]
+    assert client.heads == 1
+
+
+def test_does_not_reupload_objects_already_in_bucket(sources):
+    key, path = artifacts.package("forwarder", sources)
+    client = S3([key])
+
+    assert not artifacts.upload(client, "bucket", key, path)
+    assert client.puts == []
@@ -0,0 +1,42 @@
+import subprocess
+import sys
+
+HEAVY = ("boto3", "botocore", "troposphere", "awacs")
+
+
+def imported_after(code):
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"import sys\n{code}\n"
+            "print(' '.join(sorted({m.split('.')[0] for m in sys.modules})))",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return set(output.splitlines()[-1].split())
+
+
+def test_cli_import_does_not_load_aws_libraries():
+    assert not imported_after("import exosphere.cli") & set(HEAVY)
+
+
+def test_help_does_not_load_aws_libraries():
+    modules = imported_after(
+        "import exosphere.cli\n"
+        "sys.argv = ['exosphere', '--help']\n"
+        "try:\n"
+        "    exosphere.cli.main()\n"
+        "except SystemExit:\n"
+        "    pass"
+    )
+
+    assert not modules & set(HEAVY)
+
+
+def test_stack_modules_load_on_demand():
+    assert {"botocore", "troposphere"} <= imported_after(
+        "from exosphere import stacks\nstacks.get('staticsite')"
+    )
@@ -0,0 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from exosphere import clients
+
+
+def test_threads_share_one_client_per_region(monkeypatch):
+    monkeypatch.setattr(clients, "_clients", {})
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        created = set(
+            pool.map(
+                lambda region: id(clients.client("cloudformation", region)),
+                ["eu-west-1", "eu-west-2"] * 8,
+            )
+        )
+
+    assert len(created) == 2
+
+
+def test_clients_retry_adaptively(monkeypatch):
+    monkeypatch.setattr(clients, "_clients", {})
+
+    config = clients.client("cloudformation", "eu-west-2").meta.config
+
+    assert config.retries["mode"] == "adaptive"
+    assert config.max_pool_connections == clients.MAX_POOL_CONNECTIONS
@@ -0,0 +1,278 @@
+import asyncio
+import datetime
+import json
+
+import botocore.exceptions
+import pytest
+
+from exosphere import tracker, validate
+from exosphere.stacks import deploy, fingerprint, static_site
+
+STACK_ID = "arn:aws:cloudformation:eu-west-2:123:stack/acom/1"
+PARAMETERS = deploy.parameters(HostedZoneName="a.com")
+
+
+@pytest.fixture(autouse=True)
+def no_spec(monkeypatch):
+    monkeypatch.setattr(validate, "_spec", {})
+
+
+class Client:
+    def __init__(self, stack=None, changes=("Bucket",)):
+        self.stack = stack
+        self.changes = list(changes)
+        self.calls = []
+        self.token = None
+
+    def describe_stacks(self, StackName):
+        self.calls.append("describe_stacks")
+        if self.stack is None:
+            raise botocore.exceptions.ClientError(
+                {
+                    "Error": {
+                        "Code": "ValidationError",
+                        "Message": f"Stack with id {StackName} does not exist",
+                    }
+                },
+                "DescribeStacks",
+            )
+        return {"Stacks": [self.stack]}
+
+    def create_change_set(self, **kwargs):
+        self.calls.append(f"create_change_set {kwargs['ChangeSetType']}")
+        self.tags = kwargs["Tags"]
+        self.source = "TemplateURL" if "TemplateURL" in kwargs else "body"
+
+    def describe_change_set(self, StackName, ChangeSetName):
+        self.calls.append("describe_change_set")
+        if not self.changes:
+            return {
+                "Status": "FAILED",
+                "StatusReason": "The submitted information didn't contain "
+                "changes. Submit different information to create a change "
+                "set.",
+            }
+        return {"Status": "CREATE_COMPLETE", "Changes": self.changes}
+
+    def delete_change_set(self, StackName, ChangeSetName):
+        self.calls.append("delete_change_set")
+
+    def execute_change_set(self, StackName, ChangeSetName, ClientRequestToken):
+        self.calls.append("execute_change_set")
+        self.token = ClientRequestToken
+        self.stack = {
+            "StackName": StackName,
+            "StackStatus": "CREATE_COMPLETE",
+            "Outputs": [{"OutputKey": "Key", "OutputValue": "Value"}],
+        }
+
+    def describe_stack_events(self, StackName):
+        self.calls.append("describe_stack_events")
+        return {
+            "StackEvents": [
+                {
+                    "EventId": "1",
+                    "StackId": STACK_ID,
+                    "StackName": StackName,
+                    "LogicalResourceId": StackName,
+                    "PhysicalResourceId": STACK_ID,
+                    "ResourceStatus": "CREATE_COMPLETE",
+                    "Timestamp": datetime.datetime(2020, 1, 1),
+                    "ClientRequestToken": self.token,
+                }
+            ]
+        }
+
+
+def run_template(client, template, force=False):
+    return deploy.deploy(
+        client,
+        "acom",
+        template,
+        PARAMETERS,
+        force=force,
+        sleep=lambda delay: None,
+    )
+
+
+def run(client, force=False):
+    return run_template(client, static_site.make(), force=force)
+
+
+def test_creates_missing_stack_through_change_set():
+    client = Client()
+
+    deployment = run(client)
+
+    assert deployment == deploy.Deployment("acom", "created", {"Key": "Value"})
+    assert client.calls == [
+        "describe_stacks",
+        "create_change_set CREATE",
+        "describe_change_set",
+        "execute_change_set",
+        "describe_stack_events",
+        "describe_stacks",
+    ]
+
+
+def test_empty_change_set_is_not_executed():
+    client = Client(
+        stack={"StackName": "acom", "StackStatus": "UPDATE_COMPLETE"},
+        changes=[],
+    )
+
+    deployment = run(client, force=True)
+
+    assert deployment.status == "unchanged"
+    assert client.calls == [
+        "describe_stacks",
+        "create_change_set UPDATE",
+        "describe_change_set",
+        "delete_change_set",
+    ]
+
+
+def test_matching_fingerprint_skips_change_set():
+    digest = fingerprint.digest(static_site.make().to_json(), PARAMETERS)
+    client = Client(
+        stack={
+            "StackName": "acom",
+            "StackStatus": "UPDATE_COMPLETE",
+            "Tags": fingerprint.tags(digest),
+        }
+    )
+
+    assert run(client).status == "unchanged"
+    assert client.calls == ["describe_stacks"]
+
+
+def test_invalid_template_fails_before_any_call():
+    client = Client()
+    template = static_site.make()
+    template.resources["RootBucket"].DependsOn = "Missing"
+
+    with pytest.raises(validate.InvalidTemplate, match="Missing"):
+        run_template(client, template)
+
+    assert client.calls == []
+
+
+def test_oversized_template_is_deployed_from_s3(monkeypatch):
+    client = Client()
+    uploaded = []
+    monkeypatch.setattr(validate, "MAX_TEMPLATE_BODY", 100)
+    monkeypatch.setattr(
+        deploy.artifacts,
+        "publish_template",
+        lambda body, region: uploaded.append(body) or "https://t",
+    )
+    client.meta = type("Meta", (), {"region_name": "eu-west-2"})
+
+    run(client)
+
+    assert client.source == "TemplateURL"
+    assert uploaded == [deploy.body(static_site.make())]
+
+
+def test_async_deploy_makes_the_same_calls():
+    client = Client()
+
+    deployment = asyncio.run(
+        deploy.deploy_async(client, "acom", static_site.make(), PARAMETERS)
+    )
+
+    assert deployment == deploy.Deployment("acom", "created", {"Key": "Value"})
+    assert client.calls == [
+        "describe_stacks",
+        "create_change_set CREATE",
+        "describe_change_set",
+        "execute_change_set",
+        "describe_stack_events",
+        "describe_stacks",
+    ]
+
+
+class StuckClient(Client):
+    def describe_stack_events(self, StackName):
+        self.calls.append("describe_stack_events")
+        return {"StackEvents": []}
+
+    def cancel_update_stack(self, StackName):
+        self.calls.append("cancel_update_stack")
+
+
+def test_cancelling_async_deploy_cancels_the_update(monkeypatch):
+    monkeypatch.setattr(tracker, "MIN_DELAY", 0.01)
+    monkeypatch.setattr(tracker, "MAX_DELAY", 0.01)
+    client = StuckClient(
+        stack={
+            "StackName": "acom",
+            "StackStatus": "UPDATE_COMPLETE",
+            "Tags": fingerprint.tags("old"),
+        }
+    )
+
+    async def deploy_then_cancel():
+        task = asyncio.ensure_future(
+            deploy.deploy_async(client, "acom", static_site.make(), PARAMETERS)
+        )
+        while client.calls.count("describe_stack_events") < 3:
+            assert not task.done()
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(deploy_then_cancel())
+
+    assert client.calls[-1] == "cancel_update_stack"
+
+
+def test_throttling_is_not_mistaken_for_a_missing_stack():
+    class ThrottledClient(Client):
+        def describe_stacks(self, StackName):
+            raise botocore.exceptions.ClientError(
+                {"Error": {"Code": "Throttling", "Message": "Rate exceeded"}},
+                "DescribeStacks",
+            )
+
+    with pytest.raises(botocore.exceptions.ClientError, match="Rate"):
+        run(ThrottledClient())
+
+
+def test_sends_templates_without_indentation():
+    body = deploy.body(static_site.make())
+
+    assert "\n" not in body
+    assert json.loads(body) == static_site.make().to_dict()
+
+
+class PendingClient(Client):
+    def describe_change_set(self, StackName, ChangeSetName):
+        self.calls.append("describe_change_set")
+        return {"Status": "CREATE_PENDING"}
+
+    def delete_stack(self, StackName):
+        self.calls.append("delete_stack")
+
+
+def test_gives_up_on_a_change_set_stuck_pending(monkeypatch):
+    monkeypatch.setattr(deploy, "CHANGE_SET_TIMEOUT", 0)
+    client = PendingClient()
+
+    with pytest.raises(TimeoutError):
+        run(client)
+
+    assert client.calls[-2:] == ["delete_change_set", "delete_stack"]
+
+
+def test_async_deploy_gives_up_on_a_pending_change_set(monkeypatch):
+    monkeypatch.setattr(deploy, "CHANGE_SET_TIMEOUT", 0)
+    client = PendingClient()
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(
+            deploy.deploy_async(client, "acom", static_site.make(), PARAMETERS)
+        )
+
+    assert client.calls[-2:] == ["delete_change_set", "delete_stack"]
@@ -0,0 +1,132 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from exosphere import clients, destroy
+from exosphere.stacks import static_site
+
+
+class S3:
+    # Keys with a "/" are listed under their top level prefix, as S3 does
+    # when asked for a delimiter.
+    def __init__(self, buckets):
+        self.buckets = {
+            bucket: {(key, f"v{n}") for key in keys for n in range(2)}
+            for bucket, keys in buckets.items()
+        }
+        self.batches = []
+        self.listed = []
+        self.lock = threading.Lock()
+
+    def get_paginator(self, operation):
+        assert operation == "list_object_versions"
+        return self
+
+    def paginate(self, Bucket, Prefix="", Delimiter=None):
+        with self.lock:
+            self.listed.append((Bucket, Prefix))
+        versions = sorted(
+            (key, version)
+            for key, version in self.buckets[Bucket]
+            if key.startswith(Prefix)
+        )
+        prefixes = set()
+        if Delimiter:
+            prefixes = {k.split("/")[0] + "/" for k, _ in versions if "/" in k}
+            versions = [(k, v) for k, v in versions if "/" not in k]
+        for start in range(0, max(len(versions), 1), 1000):
+            yield {
+                "Versions": [
+                    {"Key": key, "VersionId": version}
+                    for key, version in versions[start : start + 1000]
+                ],
+                "CommonPrefixes": (
+                    [{"Prefix": prefix} for prefix in sorted(prefixes)]
+                    if start == 0
+                    else []
+                ),
+            }
+
+    def delete_objects(self, Bucket, Delete):
+        assert len(Delete["Objects"]) <= 1000
+        with self.lock:
+            self.batches.append(len(Delete["Objects"]))
+            for obj in Delete["Objects"]:
+                self.buckets[Bucket].discard((obj["Key"], obj["VersionId"]))
+        return {}
+
+
+def test_empties_every_version_in_batches():
+    keys = [f"{n}.html" for n in range(600)] + [
+        f"{section}/{n}.html" for section in ("a", "b") for n in range(700)
+    ]
+    s3 = S3({"example.com": keys})
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        deleted, errors = destroy.empty(s3, "example.com", pool)
+
+    assert (deleted, errors) == (2 * len(keys), [])
+    assert s3.buckets["example.com"] == set()
+    assert max(s3.batches) == 1000
+    assert sorted(s3.listed) == [
+        ("example.com", ""),
+        ("example.com", "a/"),
+        ("example.com", "b/"),
+    ]
+
+
+def test_deletes_stacks_after_emptying_and_hosted_zones_last(cloudformation):
+    static_site.update("example.com")
+    static_site.update("example.com", subdomain="blog")
+    s3 = S3(
+        {
+            "example.com": ["index.html", "css/site.css"],
+            "www.example.com": [],
+            "blog.example.com": ["index.html"],
+        }
+    )
+    clients._clients[("s3", "eu-west-2")] = s3
+    deleted = []
+    delete_stack = cloudformation.DeleteStack
+
+    def record(region, StackName, **kwargs):
+        deleted.append(cloudformation.stack(region, StackName)["StackName"])
+        return delete_stack(region, StackName, **kwargs)
+
+    cloudformation.DeleteStack = record
+
+    results = destroy.run(
+        destroy.targets(["example.com", "blog.example.com"], ["eu-west-2"]),
+        out=None,
+    )
+
+    assert results == {
+        ("eu-west-2", "examplecom"): "DELETE_COMPLETE",
+        ("eu-west-2", "blogexamplecom"): "DELETE_COMPLETE",
+    }
+    assert deleted == ["blogexamplecom", "examplecom"]
+    assert all(not versions for versions in s3.buckets.values())
+
+
+def test_finds_stacks_deployed_before_fingerprinting(cloudformation):
+    client = clients.client("cloudformation", "eu-west-2")
+    client.create_change_set(
+        StackName="examplecom",
+        ChangeSetName="c",
+        ChangeSetType="CREATE",
+        TemplateBody=static_site.make().to_json(),
+    )
+    client.execute_change_set(StackName="examplecom", ChangeSetName="c")
+
+    assert [
+        (region, name)
+        for region, name, _ in destroy.targets(["example.com"], ["eu-west-2"])
+    ] == [("eu-west-2", "examplecom")]
+
+
+def test_only_lists_stacks_without_yes(cloudformation, capsys):
+    static_site.update("example.com")
+
+    destroy.destroy("example.com", regions="eu-west-2")
+
+    assert "examplecom" in capsys.readouterr().out
+    assert cloudformation.calls["DeleteStack"] == 0
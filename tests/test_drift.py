@@ -0,0 +1,82 @@
+import pytest
+
+from exosphere import drift
+from exosphere.stacks import static_site
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_detections_run_at_once_and_report_drifted_resources(
+    cloudformation, clock
+):
+    for domain in ("a.com", "b.com", "c.com"):
+        static_site.update(domain)
+    cloudformation.drift(
+        "eu-west-2",
+        "bcom",
+        "RootBucket",
+        "WebsiteConfiguration.IndexDocument",
+        "a",
+        "b",
+    )
+    cloudformation.operation_time = 10
+    cloudformation.clock = clock
+
+    report = drift.detect(
+        [("eu-west-2", name) for name in ("acom", "bcom", "ccom")],
+        sleep=clock.sleep,
+    )
+
+    assert [result["status"] for result in report.values()] == [
+        "IN_SYNC",
+        "DRIFTED",
+        "IN_SYNC",
+    ]
+    assert cloudformation.calls["DescribeStackDriftDetectionStatus"] == (
+        3 * (len(clock.sleeps) + 1)
+    )
+    assert sum(clock.sleeps) < 20
+    (resource,) = report[("eu-west-2", "bcom")]["resources"]
+    assert drift.describe(resource) == [
+        "  RootBucket AWS::S3::Bucket MODIFIED",
+        '    WebsiteConfiguration.IndexDocument: "a" -> "b"',
+    ]
+
+
+def test_stacks_that_cannot_be_checked_are_reported(cloudformation):
+    report = drift.detect([("eu-west-2", "missing")])
+
+    assert report[("eu-west-2", "missing")] == {
+        "status": "FAILED",
+        "reason": "Stack with id missing does not exist",
+    }
+
+
+def test_command_fails_when_anything_drifted(cloudformation, capsys):
+    static_site.update("a.com")
+    cloudformation.drift(
+        "eu-west-2", "acom", "HostedZone", "Name", "a.com.", "b.com."
+    )
+
+    with pytest.raises(SystemExit):
+        drift.drift(regions="eu-west-2")
+
+    out = capsys.readouterr().out
+    assert "acom" in out and "DRIFTED" in out
+    assert "1 stacks, 1 drifted, 0 failed" in out
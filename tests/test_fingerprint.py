@@ -0,0 +1,74 @@
+from exosphere.stacks import fingerprint, static_site
+
+PARAMETERS = [{"ParameterKey": "HostedZoneName", "ParameterValue": "a.com"}]
+
+
+class Client:
+    def __init__(self, template_body):
+        self.template_body = template_body
+        self.calls = 0
+
+    def get_template(self, StackName, TemplateStage):
+        self.calls += 1
+        return {"TemplateBody": self.template_body}
+
+
+def stack(tags=(), status="UPDATE_COMPLETE"):
+    return {
+        "StackName": "acom",
+        "StackStatus": status,
+        "Parameters": PARAMETERS,
+        "Tags": list(tags),
+    }
+
+
+def test_digest_ignores_formatting_and_parameter_order():
+    t = static_site.make()
+    parameters = [
+        {"ParameterKey": "A", "ParameterValue": "1"},
+        {"ParameterKey": "B", "ParameterValue": "2"},
+    ]
+
+    assert fingerprint.digest(t.to_json(), parameters) == fingerprint.digest(
+        t.to_dict(), list(reversed(parameters))
+    )
+
+
+def test_digest_changes_with_parameters():
+    body = static_site.make().to_json()
+
+    assert fingerprint.digest(body, PARAMETERS) != fingerprint.digest(
+        body, [{"ParameterKey": "HostedZoneName", "ParameterValue": "b.com"}]
+    )
+
+
+def test_is_current_uses_tag_without_fetching_template():
+    client = Client(template_body=None)
+    digest = fingerprint.digest(static_site.make().to_json(), PARAMETERS)
+
+    assert fingerprint.is_current(
+        client, stack(fingerprint.tags(digest)), digest
+    )
+    assert not fingerprint.is_current(
+        client, stack(fingerprint.tags("stale")), digest
+    )
+    assert client.calls == 0
+
+
+def test_is_current_falls_back_to_deployed_template():
+    t = static_site.make()
+    client = Client(template_body=t.to_dict())
+    digest = fingerprint.digest(t.to_json(), PARAMETERS)
+
+    assert fingerprint.is_current(client, stack(), digest)
+    assert client.calls == 1
+
+
+def test_is_current_never_skips_unstable_stacks():
+    digest = fingerprint.digest(static_site.make().to_json(), PARAMETERS)
+
+    assert not fingerprint.is_current(
+        Client(template_body=None),
+        stack(fingerprint.tags(digest), status="UPDATE_IN_PROGRESS"),
+        digest,
+    )
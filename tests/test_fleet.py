@@ -0,0 +1,61 @@
+import json
+import threading
+
+import pytest
+
+from exosphere import fleet, stacks
+from exosphere.stacks import deploy
+
+
+class Stack:
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def update(self, domain, region="eu-west-2", subdomain=None, force=False):
+        if domain == "broken.com":
+            raise RuntimeError("boom")
+        with self.lock:
+            self.calls.append((domain, region, subdomain, force))
+        return deploy.Deployment(domain, "updated", {})
+
+
+@pytest.fixture
+def stack(monkeypatch):
+    stack = Stack()
+    monkeypatch.setattr(stacks, "get", lambda stack_type: stack)
+    return stack
+
+
+def test_load_rejects_unknown_stack_types(tmp_path):
+    manifest = tmp_path / "fleet.json"
+    manifest.write_text(json.dumps([{"type": "nope", "domain": "a.com"}]))
+
+    with pytest.raises(ValueError):
+        fleet.load(str(manifest))
+
+
+def test_deploy_runs_every_entry(stack):
+    entries = [
+        {"type": "staticsite", "domain": f"{i}.com", "region": "eu-west-1"}
+        for i in range(10)
+    ] + [{"type": "staticsite", "domain": "a.com", "subdomain": "blog"}]
+
+    results = fleet.deploy(entries, workers=4, force=True)
+
+    assert [status for _, status, _ in results] == ["updated"] * 11
+    assert sorted(stack.calls) == sorted(
+        [(f"{i}.com", "eu-west-1", None, True) for i in range(10)]
+        + [("a.com", "eu-west-2", "blog", True)]
+    )
+
+
+def test_deploy_reports_failures_without_stopping(stack):
+    results = fleet.deploy(
+        [
+            {"type": "staticsite", "domain": "broken.com"},
+            {"type": "staticsite", "domain": "a.com"},
+        ]
+    )
+
+    assert [status for _, status, _ in results] == ["failed", "updated"]
@@ -0,0 +1,147 @@
+import email
+import io
+import json
+import logging
+
+import pytest
+
+from exosphere.stacks import forwarder
+
+MESSAGE = (
+    b"From: sender@example.org\r\n"
+    b"Return-Path: <bounces@example.org>\r\n"
+    b"To: hello@example.com\r\n"
+    b"Subject: Hello\r\n"
+    b"\r\n"
+    b"Secret body\r\n"
+)
+
+LATIN = b"From: Ren\xe9 <r@example.org>\r\n\r\nCaf\xe9 \xff\r\n"
+
+
+class S3:
+    def __init__(self, objects):
+        self.objects = objects
+
+    def get_object(self, Bucket, Key):
+        body = self.objects[Key]
+        return {"Body": io.BytesIO(body), "ContentLength": len(body)}
+
+
+class SES:
+    def __init__(self):
+        self.sent = []
+
+    def send_raw_email(self, Destinations, RawMessage):
+        self.sent.append((Destinations, RawMessage["Data"]))
+
+
+def event(*keys):
+    return {
+        "Records": [
+            {"s3": {"bucket": {"name": "mail"}, "object": {"key": key}}}
+            for key in keys
+        ]
+    }
+
+
+@pytest.fixture
+def ses(monkeypatch):
+    ses = SES()
+    monkeypatch.setenv("FromAddress", "forwarder@example.com")
+    monkeypatch.setenv("ForwardingAddresses", "a@example.net, b@example.net")
+    monkeypatch.setattr(
+        forwarder,
+        "clients",
+        {
+            "s3": S3({"one": MESSAGE, "two": MESSAGE, "latin": LATIN}),
+            "ses": ses,
+        },
+    )
+    return ses
+
+
+def test_forwards_every_record_with_rewritten_sender(ses):
+    assert forwarder.handler(event("one", "two"), None) == "CONTINUE"
+
+    assert len(ses.sent) == 2
+    destinations, raw = ses.sent[0]
+    assert destinations == ["a@example.net", "b@example.net"]
+    message = email.message_from_bytes(raw)
+    assert message["From"] == "forwarder@example.com"
+    assert message["X-Original-From"] == "sender@example.org"
+    assert message["X-Original-Return-Path"] == "<bounces@example.org>"
+    assert "Return-Path" not in message
+
+
+def test_does_not_log_message_contents(ses, caplog):
+    with caplog.at_level(logging.INFO):
+        forwarder.handler(event("one"), None)
+
+    assert "Forwarded mail/one" in caplog.text
+    assert "Secret body" not in caplog.text
+
+
+def test_failed_records_raise_after_the_rest_are_sent(ses):
+    with pytest.raises(RuntimeError, match="missing"):
+        forwarder.handler(event("missing", "one"), None)
+
+    assert len(ses.sent) == 1
+
+
+def test_reuses_clients_between_invocations(ses):
+    s3 = forwarder.client("s3")
+    forwarder.handler(event("one"), None)
+
+    assert forwarder.client("s3") is s3
+
+
+def test_passes_body_through_whatever_its_encoding(ses):
+    forwarder.handler(event("latin"), None)
+
+    _, raw = ses.sent[0]
+    assert raw.endswith(b"\r\n\r\nCaf\xe9 \xff\r\n")
+    assert b"From: forwarder@example.com\r\n" in raw
+
+
+def test_sends_notice_for_messages_too_large_for_ses(ses, monkeypatch):
+    monkeypatch.setattr(forwarder, "MAX_MESSAGE_SIZE", 50)
+    forwarder.handler(event("one"), None)
+
+    _, raw = ses.sent[0]
+    notice = email.message_from_bytes(raw)
+    assert notice["Reply-To"] == "sender@example.org"
+    assert notice["Subject"] == "Too large to forward: Hello"
+    assert "s3://mail/one" in notice.get_payload()
+    assert b"Secret body" not in raw
+
+
+def test_reports_only_failed_queue_messages(ses):
+    records = [
+        {"messageId": "m1", "body": json.dumps(event("one"))},
+        {"messageId": "m2", "body": json.dumps(event("missing"))},
+        {"messageId": "m3", "body": json.dumps({"Event": "s3:TestEvent"})},
+    ]
+    for record in records:
+        record["eventSource"] = "aws:sqs"
+
+    result = forwarder.handler({"Records": records}, None)
+
+    assert result == {"batchItemFailures": [{"itemIdentifier": "m2"}]}
+    assert len(ses.sent) == 1
+
+
+def test_emits_embedded_metrics_per_message(ses, capsys):
+    with pytest.raises(RuntimeError):
+        forwarder.handler(event("one", "missing"), None)
+
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    sent, failed = lines
+    directive = sent["_aws"]["CloudWatchMetrics"][0]
+    assert directive["Namespace"] == forwarder.NAMESPACE
+    assert {metric["Name"] for metric in directive["Metrics"]} == set(
+        forwarder.UNITS
+    )
+    assert sent["MessageSize"] == len(MESSAGE)
+    assert sent["Failures"] == 0
+    assert failed["Failures"] == 1
@@ -0,0 +1,70 @@
+import gzip
+
+from exosphere import publish
+
+
+def test_default_cache_control():
+    assert "immutable" in publish.cache_control("js/app.3f9a1c2e.js")
+    assert "immutable" in publish.cache_control("css/site-0123456789ab.css")
+    assert "max-age=300" in publish.cache_control("index.html")
+    assert "max-age=300" in publish.cache_control("blog/about")
+    assert publish.cache_control("img/logo.png") == "public, max-age=3600"
+
+
+def test_custom_rules_come_first(tmp_path):
+    rules_file = tmp_path / "rules.json"
+    rules_file.write_text('{"^feeds/": "public, max-age=60"}')
+
+    rules = publish.load_rules(str(rules_file))
+
+    assert publish.cache_control("feeds/atom.xml", rules) == (
+        "public, max-age=60"
+    )
+    assert "immutable" in publish.cache_control("app.3f9a1c2e.js", rules)
+
+
+def test_headers():
+    assert publish.headers("index.html", 10) == {
+        "ContentType": "text/html",
+        "CacheControl": "public, max-age=300, must-revalidate",
+    }
+    assert publish.headers("app.js", 5000)["ContentEncoding"] == "gzip"
+    assert "ContentEncoding" not in publish.headers(
+        "app.js", 5000, compress=False
+    )
+    assert "ContentEncoding" not in publish.headers("photo.jpg", 5000)
+
+
+def test_gzip_is_deterministic(tmp_path):
+    source = tmp_path / "site.css"
+    source.write_text("body { margin: 0 }\n" * 100)
+
+    first = publish.gzip_file(source, tmp_path / "first.gz")
+    second = publish.gzip_file(source, tmp_path / "second.gz")
+
+    assert first.read_bytes() == second.read_bytes()
+    assert gzip.decompress(first.read_bytes()) == source.read_bytes()
+
+
+def test_compresses_in_spawned_processes(tmp_path, monkeypatch):
+    contexts = []
+    pool = publish.ProcessPoolExecutor
+
+    def recording(mp_context):
+        contexts.append(mp_context.get_start_method())
+        return pool(mp_context=mp_context)
+
+    monkeypatch.setattr(publish, "ProcessPoolExecutor", recording)
+    source = tmp_path / "app.js"
+    source.write_text("var a = 1;\n" * 200)
+    staging = tmp_path / "staging"
+    staging.mkdir()
+    local = {"app.js": {"size": source.stat().st_size, "source": "abc"}}
+
+    publish.prepare(local, {"app.js": source}, staging, lambda path: path.name)
+
+    assert contexts == ["spawn"]
+    assert (
+        gzip.decompress(publish.staged(staging, local["app.js"]).read_bytes())
+        == source.read_bytes()
+    )
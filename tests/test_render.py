@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from exosphere import render
+from exosphere.stacks import static_site
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("EXOSPHERE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(render, "_memory", {})
+    return tmp_path
+
+
+@pytest.fixture
+def makes(monkeypatch):
+    calls = []
+    make = static_site.make
+
+    def counting_make(**arguments):
+        calls.append(arguments)
+        return make(**arguments)
+
+    monkeypatch.setattr(static_site, "make", counting_make)
+    return calls
+
+
+def test_renders_canonical_json():
+    body = render.template("staticsite", {"subdomain": "blog"})
+
+    assert json.loads(body) == static_site.make(subdomain="blog").to_dict()
+    assert body == render.template("staticsite", {"subdomain": "blog"})
+
+
+def test_reuses_templates_from_disk(makes, cache_dir, monkeypatch):
+    render.template("staticsite", {"subdomain": "blog"})
+    monkeypatch.setattr(render, "_memory", {})
+    render.template("staticsite", {"subdomain": "blog"})
+
+    assert makes == [{"subdomain": "blog"}]
+    assert len(list((cache_dir / "templates").iterdir())) == 1
+
+
+def test_keys_on_arguments_and_format(makes):
+    render.template("staticsite")
+    render.template("staticsite", {"subdomain": None})
+    render.template("staticsite", {"subdomain": "blog"})
+    render.template("staticsite", format="yaml")
+
+    assert makes == [{}, {"subdomain": "blog"}, {}]
+
+
+def test_no_cache_always_rebuilds(makes):
+    render.template("staticsite", use_cache=False)
+    render.template("staticsite", use_cache=False)
+
+    assert len(makes) == 2
+
+
+def test_rejects_unknown_stack_types(capsys):
+    with pytest.raises(ValueError):
+        render.template("nope")
+    with pytest.raises(SystemExit):
+        render.render("nope")
+
+    assert "staticsite" in capsys.readouterr().err
+
+
+def test_reports_template_errors(capsys):
+    with pytest.raises(SystemExit):
+        render.render("staticsitewithemail", "component=nope")
+
+    assert "expected dns, site or mail" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize(
+    "arguments, message",
+    [(["foo"], "name=value"), (["foo=bar"], "Bad template arguments")],
+)
+def test_reports_bad_template_arguments(arguments, message, capsys):
+    with pytest.raises(SystemExit):
+        render.render("staticsite", *arguments)
+
+    assert message in capsys.readouterr().err
@@ -5,6 +5,8 @@ import httpretty
 import pytest
 import testypie
 
+from exosphere.stacks import static_site
+
 
 @pytest.fixture(autouse=True, scope="function")
 def mock_responses(request):
@@ -72,6 +74,14 @@ def mock_responses(request):
     request.addfinalizer(httpretty.disable)
 
 
-def test_create_stack():
-    # stacks.static_site.update('example.com')
-    pass
+def test_create_stack(cloudformation):
+    cloudformation.install("eu-west-1")
+
+    deployment = static_site.update("example.com", region="eu-west-1")
+
+    assert deployment.status == "created"
+    stack = cloudformation.stacks["eu-west-1", "examplecom"]
+    assert stack["StackStatus"] == "CREATE_COMPLETE"
+    assert stack["Parameters"] == [
+        {"ParameterKey": "HostedZoneName", "ParameterValue": "example.com"}
+    ]
@@ -0,0 +1,109 @@
+import json
+
+import standin
+
+from exosphere import validate
+from exosphere.stacks import deploy, static_site
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_deploys_then_finds_nothing_to_change(cloudformation):
+
+    created = static_site.update("example.com")
+    create_calls = sum(cloudformation.calls.values())
+    unchanged = static_site.update("example.com")
+
+    assert created.status == "created"
+    assert cloudformation.stacks["eu-west-2", "examplecom"]["StackStatus"] == (
+        "CREATE_COMPLETE"
+    )
+    assert unchanged.status == "unchanged"
+    assert sum(cloudformation.calls.values()) - create_calls == 1
+
+
+def test_forced_deploy_without_changes_leaves_no_change_set(cloudformation):
+    static_site.update("example.com")
+
+    assert static_site.update("example.com", force=True).status == (
+        "unchanged"
+    )
+    assert (
+        cloudformation.stacks["eu-west-2", "examplecom"]["change_sets"] == {}
+    )
+    assert cloudformation.calls["DeleteChangeSet"] == 1
+
+
+def test_operations_take_time(isolated):
+    clock = Clock()
+    cloudformation = standin.CloudFormation(operation_time=30, clock=clock)
+    client = cloudformation.client("eu-west-2")
+    client.create_change_set(
+        StackName="a",
+        ChangeSetName="c",
+        ChangeSetType="CREATE",
+        TemplateBody='{"Resources": {"Bucket": {"Type": "AWS::S3::Bucket"}}}',
+    )
+    client.execute_change_set(StackName="a", ChangeSetName="c")
+
+    assert deploy.describe(client, "a")["StackStatus"] == (
+        "CREATE_IN_PROGRESS"
+    )
+    clock.now = 30
+    assert deploy.describe(client, "a")["StackStatus"] == "CREATE_COMPLETE"
+    assert deploy.describe(client, "b") is None
+
+
+def test_regions_hold_their_own_stacks(cloudformation):
+    cloudformation.install("eu-west-1")
+
+    static_site.update("example.com", region="eu-west-1")
+    west2 = cloudformation.client("eu-west-2")
+
+    assert deploy.describe(west2, "examplecom") is None
+    assert static_site.update("example.com").status == "created"
+    assert sorted(cloudformation.stacks) == [
+        ("eu-west-1", "examplecom"),
+        ("eu-west-2", "examplecom"),
+    ]
+
+
+def test_takes_templates_published_to_s3(cloudformation, monkeypatch):
+    monkeypatch.setattr(validate, "MAX_TEMPLATE_BODY", 100)
+    monkeypatch.setattr(
+        deploy.artifacts, "publish_template", cloudformation.publish_template
+    )
+
+    assert static_site.update("example.com").status == "created"
+    assert len(cloudformation.templates) == 1
+
+
+def test_emptied_shards_are_deleted(cloudformation, monkeypatch):
+    # Three subdomains and their record set group fill a shard.
+    monkeypatch.setattr(static_site, "MAX_RESOURCES", 4)
+
+    static_site.update("example.com", subdomain="a,b,c,d,e,f")
+    static_site.update("example.com", subdomain="b,c,g")
+
+    stacks = cloudformation.stacks
+    first = json.loads(
+        stacks["eu-west-2", "examplecomsubdomains1"]["template"]
+    )
+    assert first["Metadata"] == {"Subdomains": ["b", "c", "g"]}
+    assert stacks["eu-west-2", "examplecomsubdomains2"]["StackStatus"] == (
+        "DELETE_COMPLETE"
+    )
+
+
+def test_throttled_calls_are_retried(isolated):
+    cloudformation = standin.CloudFormation(throttle_rate=0.2, seed=1)
+    cloudformation.install("eu-west-2")
+
+    assert static_site.update("example.com").status == "created"
+    assert cloudformation.throttled > 0
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+
+from exosphere import stacks
+from exosphere.stacks import deploy, static_site
+
+
+def test_subdomain_list_shares_record_set_groups(monkeypatch):
+    monkeypatch.setattr(static_site, "RECORDS_PER_GROUP", 2)
+
+    resources = static_site.make(["blog", "docs", "my-shop"]).to_dict()[
+        "Resources"
+    ]
+
+    buckets = sorted(name for name in resources if name.startswith("Bucket"))
+    assert buckets == [
+        "BucketBlog",
+        "BucketDocs",
+        static_site.bucket_id("my-shop"),
+    ]
+    assert [
+        len(resources[group]["Properties"]["RecordSets"])
+        for group in ("RecordSetGroup", "RecordSetGroup2")
+    ] == [2, 1]
+
+
+def test_comma_separated_subdomains_are_a_list():
+    assert static_site.make("blog,docs").to_dict() == (
+        static_site.make(["blog", "docs"]).to_dict()
+    )
+
+
+def test_shards_stay_within_limits_and_are_stable():
+    names = [f"site-{i}" for i in range(600)]
+
+    shards = static_site.shards(names)
+
+    assert len(shards) > 1
+    assert [name for shard in shards for name in shard] == names
+    for shard in shards:
+        t = static_site.make(shard)
+        assert static_site.template_size(shard) <= (
+            static_site.MAX_TEMPLATE_SIZE
+        )
+        assert len(t.resources) <= static_site.MAX_RESOURCES
+    # Shards are filled to the resource limit, not cut short by size.
+    assert static_site.resource_count(len(shards[0]) + 1) > (
+        static_site.MAX_RESOURCES
+    )
+    assert static_site.shards(names + ["new"])[:-1] == shards[:-1]
+
+
+def test_deployed_subdomains_stay_in_their_shard():
+    names = [f"site-{i}" for i in range(600)]
+    shards = static_site.shards(names)
+
+    fewer = static_site.shards(names[1:] + ["new"], shards)
+
+    assert fewer == [shards[0][1:] + ["new"], shards[1]]
+    assert static_site.shards([], fewer) == [[], []]
+
+
+def test_update_deploys_one_stack_per_shard(monkeypatch):
+    deployed = {}
+    lock = threading.Lock()
+
+    def fake_deploy(client, stack_name, template, parameters, force=False):
+        with lock:
+            deployed[stack_name] = template
+        return deploy.Deployment(stack_name, "created", {})
+
+    monkeypatch.setattr(deploy, "deploy", fake_deploy)
+    monkeypatch.setattr(static_site.clients, "client", lambda *args: None)
+    monkeypatch.setattr(
+        static_site.render,
+        "template",
+        lambda stack_type, arguments: arguments["subdomain"],
+    )
+    monkeypatch.setattr(
+        static_site, "deployed_shards", lambda client, stack_name: {}
+    )
+    monkeypatch.setattr(
+        static_site, "shards", lambda names, deployed: [names[:2], names[2:]]
+    )
+
+    deployment = static_site.update("a.com", subdomain="a,b,c")
+
+    assert deployment == deploy.Deployment("acom", "created", {})
+    assert deployed == {
+        "acomsubdomains1": ["a", "b"],
+        "acomsubdomains2": ["c"],
+    }
+
+
+def test_update_async_deploys_shards_on_one_event_loop(monkeypatch):
+    deployed = {}
+
+    async def fake_deploy(client, stack_name, template, parameters, force):
+        deployed[stack_name] = (template, threading.current_thread())
+        await asyncio.sleep(0)
+        return deploy.Deployment(stack_name, "created", {})
+
+    monkeypatch.setattr(deploy, "deploy_async", fake_deploy)
+    monkeypatch.setattr(static_site.clients, "client", lambda *args: None)
+    monkeypatch.setattr(
+        static_site.render,
+        "template",
+        lambda stack_type, arguments: arguments["subdomain"],
+    )
+    monkeypatch.setattr(
+        static_site, "deployed_shards", lambda client, stack_name: {}
+    )
+    monkeypatch.setattr(
+        static_site, "shards", lambda names, deployed: [names[:2], names[2:]]
+    )
+
+    deployment = asyncio.run(
+        stacks.staticsite_async("a.com", subdomain="a,b,c")
+    )
+
+    assert deployment == deploy.Deployment("acom", "created", {})
+    assert deployed == {
+        "acomsubdomains1": (["a", "b"], threading.main_thread()),
+        "acomsubdomains2": (["c"], threading.main_thread()),
+    }
@@ -0,0 +1,42 @@
+import pytest
+
+from exosphere.stacks import static_site, static_site_cdn
+
+
+def test_keeps_static_site_buckets():
+    site = static_site.make().to_dict()["Resources"]
+    cdn = static_site_cdn.make().to_dict()["Resources"]
+
+    for bucket in ("RootBucket", "WWWBucket", "HostedZone"):
+        assert cdn[bucket] == site[bucket]
+
+
+def test_records_alias_the_distributions():
+    resources = static_site_cdn.make().to_dict()["Resources"]
+    records = resources["RecordSetGroup"]["Properties"]["RecordSets"]
+
+    assert [record["Type"] for record in records] == ["A", "AAAA"] * 2
+    assert {
+        record["AliasTarget"]["DNSName"]["Fn::GetAtt"][0] for record in records
+    } == {"Distribution", "WWWDistribution"}
+
+
+def test_subdomain_distribution_compresses_and_uses_https():
+    resources = static_site_cdn.make(subdomain="blog").to_dict()["Resources"]
+    config = resources["Distribution"]["Properties"]["DistributionConfig"]
+
+    assert set(resources) == {"Bucket", "Distribution", "RecordSetGroup"}
+    assert config["DefaultCacheBehavior"]["Compress"] is True
+    assert config["DefaultCacheBehavior"]["ViewerProtocolPolicy"] == (
+        "redirect-to-https"
+    )
+    assert config["Origins"][0]["DomainName"]["Fn::Select"][1] == {
+        "Fn::Split": ["://", {"Fn::GetAtt": ["Bucket", "WebsiteURL"]}]
+    }
+
+
+def test_rejects_lists_of_subdomains():
+    with pytest.raises(ValueError, match="single subdomain"):
+        static_site_cdn.make(subdomain="a,b")
+    with pytest.raises(ValueError, match="single subdomain"):
+        static_site_cdn.update("example.com", "arn", subdomain=["a", "b"])
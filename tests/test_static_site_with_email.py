@@ -0,0 +1,236 @@
+import json
+import threading
+
+import pytest
+
+from exosphere.stacks import deploy, static_site, static_site_with_email
+
+
+def test_components_cover_site_and_mail_resources():
+    resources = [
+        name
+        for component in static_site_with_email.COMPONENTS
+        for name in static_site_with_email.make(component).resources
+    ]
+
+    assert sorted(resources) == sorted(
+        list(static_site.make().resources)
+        + [
+            "SESACMForwarderLambda",
+            "SESACMS3Bucket",
+            "InvokePermission",
+            "SESS3BucketPolicy",
+            "LambdaSESACMForwarderRole",
+            "ForwarderDurationAlarm",
+            "ForwarderThrottlesAlarm",
+            "ForwarderErrorRateAlarm",
+            "ForwarderDashboard",
+        ]
+    )
+
+
+def test_update_deploys_components_with_dns_outputs(monkeypatch):
+    calls = {}
+    lock = threading.Lock()
+
+    def fake_deploy(client, stack_name, template, parameters, force=False):
+        with lock:
+            calls[stack_name] = {
+                p["ParameterKey"]: p["ParameterValue"] for p in parameters
+            }
+        status = "updated" if stack_name.endswith("mail") else "unchanged"
+        return deploy.Deployment(
+            stack_name, status, {"HostedZoneName": "a.com"}
+        )
+
+    monkeypatch.setattr(deploy, "deploy", fake_deploy)
+    monkeypatch.setattr(deploy, "describe", lambda client, name: None)
+    monkeypatch.setattr(
+        static_site_with_email.clients, "client", lambda *args: None
+    )
+    monkeypatch.setattr(
+        static_site_with_email.artifacts,
+        "publish",
+        lambda name, sources, region: ("code", f"{name}/abc.zip"),
+    )
+    monkeypatch.setattr(
+        static_site_with_email.render,
+        "template",
+        lambda stack_type, arguments: arguments["component"],
+    )
+
+    deployment = static_site_with_email.update(
+        "a.com", "me@a.com", "you@b.com"
+    )
+
+    assert deployment.stack_name == "acom"
+    assert deployment.status == "updated"
+    assert calls == {
+        "acomdns": {"HostedZoneName": "a.com"},
+        "acomsite": {"HostedZoneName": "a.com"},
+        "acommail": {
+            "HostedZoneName": "a.com",
+            "FromAddress": "me@a.com",
+            "ForwardingAddresses": "you@b.com",
+            "ForwarderCodeBucket": "code",
+            "ForwarderCodeKey": "forwarder/abc.zip",
+        },
+    }
+
+
+def test_updates_a_site_still_in_one_stack(monkeypatch):
+    calls = {}
+
+    def fake_deploy(client, stack_name, template, parameters, force=False):
+        calls[stack_name] = {
+            p["ParameterKey"]: p["ParameterValue"] for p in parameters
+        }
+        return deploy.Deployment(stack_name, "updated", {})
+
+    monkeypatch.setattr(deploy, "deploy", fake_deploy)
+    monkeypatch.setattr(
+        deploy,
+        "describe",
+        lambda client, name: {
+            "StackName": name,
+            "StackStatus": "UPDATE_COMPLETE",
+        },
+    )
+    monkeypatch.setattr(
+        static_site_with_email.clients, "client", lambda *args: None
+    )
+    monkeypatch.setattr(
+        static_site_with_email.artifacts,
+        "publish",
+        lambda name, sources, region: ("code", f"{name}/abc.zip"),
+    )
+    monkeypatch.setattr(
+        static_site_with_email.render,
+        "template",
+        lambda stack_type, arguments: arguments,
+    )
+
+    deployment = static_site_with_email.update(
+        "a.com", "me@a.com", "you@b.com"
+    )
+
+    assert deployment.stack_name == "acom"
+    assert calls == {
+        "acom": {
+            "HostedZoneName": "a.com",
+            "FromAddress": "me@a.com",
+            "ForwardingAddresses": "you@b.com",
+            "ForwarderCodeBucket": "code",
+            "ForwarderCodeKey": "forwarder/abc.zip",
+        }
+    }
+
+
+def test_whole_site_template_has_every_component():
+    resources = [
+        name
+        for component in static_site_with_email.COMPONENTS
+        for name in static_site_with_email.make(component).resources
+    ]
+
+    assert sorted(static_site_with_email.make().resources) == sorted(resources)
+
+
+def test_forwarder_runtime_settings_are_parameters():
+    t = static_site_with_email.make("mail").to_dict()
+    function = t["Resources"]["SESACMForwarderLambda"]["Properties"]
+
+    assert function["MemorySize"] == {"Ref": "ForwarderMemorySize"}
+    assert function["Timeout"] == {"Ref": "ForwarderTimeout"}
+    assert t["Parameters"]["ForwarderMemorySize"]["Default"] == 256
+    assert function["Architectures"] == [{"Ref": "ForwarderArchitecture"}]
+    assert function["EphemeralStorage"] == {
+        "Size": {"Ref": "ForwarderEphemeralStorage"}
+    }
+
+
+def test_mail_stack_alarms_and_dashboard_on_the_forwarder():
+    t = static_site_with_email.make("mail").to_dict()
+    resources = t["Resources"]
+
+    alarm = resources["ForwarderErrorRateAlarm"]["Properties"]
+    assert alarm["Namespace"] == static_site_with_email.METRICS_NAMESPACE
+    assert alarm["Dimensions"] == [
+        {"Name": "FunctionName", "Value": {"Ref": "SESACMForwarderLambda"}}
+    ]
+    assert resources["ForwarderDurationAlarm"]["Properties"]["Threshold"] == {
+        "Ref": "ForwarderDurationThreshold"
+    }
+    body = resources["ForwarderDashboard"]["Properties"]["DashboardBody"]
+    widgets = json.loads(body["Fn::Sub"])["widgets"]
+    assert {
+        metric[1]
+        for widget in widgets
+        for metric in widget["properties"]["metrics"]
+    } >= {"Duration", "Throttles", "Errors", "FetchTime", "SendTime"}
+    assert static_site_with_email.forwarder_parameters(timeout=30) == {
+        "ForwarderTimeout": "30",
+        "ForwarderDurationThreshold": "24000",
+    }
+
+
+def test_queue_delivery_notifies_queue_instead_of_function():
+    t = static_site_with_email.make("mail", delivery="queue").to_dict()
+    resources = t["Resources"]
+    notifications = resources["SESACMS3Bucket"]["Properties"][
+        "NotificationConfiguration"
+    ]
+
+    assert "InvokePermission" not in resources
+    assert "LambdaConfigurations" not in notifications
+    assert notifications["QueueConfigurations"][0]["Queue"] == {
+        "Fn::GetAtt": ["ForwarderQueue", "Arn"]
+    }
+    mapping = resources["ForwarderQueueMapping"]["Properties"]
+    assert mapping["FunctionResponseTypes"] == ["ReportBatchItemFailures"]
+
+
+def test_buffered_update_deploys_queue_delivery(monkeypatch):
+    calls = {}
+
+    def fake_deploy(client, stack_name, template, parameters, force=False):
+        calls[stack_name] = (
+            template,
+            {p["ParameterKey"]: p["ParameterValue"] for p in parameters},
+        )
+        return deploy.Deployment(
+            stack_name, "created", {"HostedZoneName": "a.com"}
+        )
+
+    monkeypatch.setattr(deploy, "deploy", fake_deploy)
+    monkeypatch.setattr(deploy, "describe", lambda client, name: None)
+    monkeypatch.setattr(
+        static_site_with_email.clients, "client", lambda *args: None
+    )
+    monkeypatch.setattr(
+        static_site_with_email.artifacts,
+        "publish",
+        lambda name, sources, region: ("code", f"{name}/abc.zip"),
+    )
+    monkeypatch.setattr(
+        static_site_with_email.render,
+        "template",
+        lambda stack_type, arguments: arguments,
+    )
+
+    static_site_with_email.update(
+        "a.com", "me@a.com", "you@b.com", timeout=30, buffered=True
+    )
+
+    template, parameters = calls["acommail"]
+    assert template == {"component": "mail", "delivery": "queue"}
+    assert parameters["ForwarderTimeout"] == "30"
+    assert parameters["ForwarderVisibilityTimeout"] == "180"
+    assert "ForwarderBatchSize" not in parameters
+
+
+def test_queue_settings_need_buffered_mail():
+    with pytest.raises(ValueError, match="batch_size, concurrency"):
+        static_site_with_email.forwarder_parameters(
+            batch_size=50, concurrency=2
+        )
@@ -0,0 +1,88 @@
+from exosphere import clients, status
+from exosphere.stacks import static_site
+
+TEMPLATE = '{"Resources": {"Bucket": {"Type": "AWS::S3::Bucket"}}}'
+
+
+def calls(cloudformation, deploy):
+    before = dict(cloudformation.calls)
+    deploy()
+    return {
+        action: count - before.get(action, 0)
+        for action, count in cloudformation.calls.items()
+        if count != before.get(action, 0)
+    }
+
+
+def test_lists_only_stacks_deployed_by_exosphere(cloudformation):
+    static_site.update("example.com")
+    static_site.update("example.com", subdomain="blog")
+    client = clients.client("cloudformation", "eu-west-2")
+    client.create_change_set(
+        StackName="other",
+        ChangeSetName="c",
+        ChangeSetType="CREATE",
+        TemplateBody=TEMPLATE,
+    )
+    client.execute_change_set(StackName="other", ChangeSetName="c")
+
+    stacks = status.managed(["eu-west-2"])
+
+    assert sorted(stacks) == [
+        ("eu-west-2", "blogexamplecom"),
+        ("eu-west-2", "examplecom"),
+    ]
+    assert status.matching(stacks, "blog.example.com") == {
+        ("eu-west-2", "blogexamplecom"): stacks[
+            ("eu-west-2", "blogexamplecom")
+        ]
+    }
+
+
+def test_named_sites_include_stacks_without_a_tag(cloudformation):
+    client = clients.client("cloudformation", "eu-west-2")
+    client.create_change_set(
+        StackName="examplecom",
+        ChangeSetName="c",
+        ChangeSetType="CREATE",
+        TemplateBody=TEMPLATE,
+    )
+    client.execute_change_set(StackName="examplecom", ChangeSetName="c")
+
+    assert status.managed(["eu-west-2"]) == {}
+    assert list(status.find(["eu-west-2"], sites=["example.com"])) == [
+        ("eu-west-2", "examplecom")
+    ]
+
+
+def test_cached_listing_is_used_until_it_expires(cloudformation):
+    static_site.update("example.com")
+    status.managed(["eu-west-2"])
+
+    assert calls(cloudformation, lambda: status.managed(["eu-west-2"])) == {}
+
+
+def test_only_changed_stacks_are_described_again(cloudformation):
+    static_site.update("example.com")
+    static_site.update("example.org")
+    status.managed(["eu-west-2"])
+
+    static_site.update("example.org", subdomain="blog")
+    refreshed = calls(
+        cloudformation, lambda: status.managed(["eu-west-2"], max_age=0)
+    )
+
+    assert refreshed == {"ListStacks": 1, "DescribeStacks": 1}
+    assert ("eu-west-2", "blogexampleorg") in status.managed(["eu-west-2"])
+
+
+def test_prints_one_output_for_scripts(cloudformation, capsys):
+    static_site.update("example.com")
+    stack = cloudformation.stacks["eu-west-2", "examplecom"]
+    stack["template"] = stack["template"].replace(
+        '"Resources"', '"Outputs": {"Zone": {"Value": "Z1"}}, "Resources"', 1
+    )
+
+    status.outputs("example.com", "Zone", regions="eu-west-2")
+
+    assert capsys.readouterr().out == "Z1\n"
@@ -0,0 +1,162 @@
+import hashlib
+
+import pytest
+
+from exosphere import sync
+
+
+class Client:
+    def __init__(self, objects=None):
+        self.objects = dict(objects or {})
+        self.uploads = []
+        self.headers = {}
+        self.deletes = []
+        self.listings = 0
+
+    def get_paginator(self, operation):
+        assert operation == "list_objects_v2"
+        return self
+
+    def paginate(self, Bucket):
+        self.listings += 1
+        yield {
+            "Contents": [
+                {"Key": key, "ETag": f'"{etag}"', "Size": 0}
+                for key, etag in self.objects.items()
+            ]
+        }
+
+    def delete_objects(self, Bucket, Delete):
+        keys = [obj["Key"] for obj in Delete["Objects"]]
+        self.deletes.append(keys)
+        for key in keys:
+            self.objects.pop(key)
+        return {}
+
+
+def uploader(client, bucket, path, key, headers, config):
+    client.uploads.append(key)
+    client.objects[key] = sync.etag(path)
+    client.headers[key] = headers
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("EXOSPHERE_CACHE_DIR", str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def site(tmp_path):
+    site = tmp_path / "site"
+    (site / "css").mkdir(parents=True)
+    (site / "index.html").write_text("<h1>hi</h1>")
+    (site / "css" / "site.css").write_text("h1 {}")
+    return site
+
+
+def run(client, site, **kwargs):
+    return sync.run(client, str(site), "a.com", uploader=uploader, **kwargs)
+
+
+def test_etag_matches_s3_multipart_scheme(tmp_path):
+    path = tmp_path / "big"
+    path.write_bytes(b"a" * 10 + b"b" * 5)
+
+    parts = [hashlib.md5(b"a" * 10).digest(), hashlib.md5(b"b" * 5).digest()]
+    assert sync.etag(path, part_size=10) == (
+        hashlib.md5(b"".join(parts)).hexdigest() + "-2"
+    )
+    assert sync.etag(path) == hashlib.md5(b"a" * 10 + b"b" * 5).hexdigest()
+
+
+def test_file_of_exactly_one_part_has_a_multipart_etag(tmp_path):
+    path = tmp_path / "part"
+    path.write_bytes(b"a" * 10)
+
+    part = hashlib.md5(b"a" * 10).digest()
+    assert sync.etag(path, part_size=10) == (
+        hashlib.md5(part).hexdigest() + "-1"
+    )
+    assert sync.etag(path, part_size=11) == hashlib.md5(b"a" * 10).hexdigest()
+
+
+def test_uploads_only_changed_files_and_deletes_stale(site):
+    client = Client(
+        {
+            "index.html": hashlib.md5(b"<h1>hi</h1>").hexdigest(),
+            "old.html": "stale",
+        }
+    )
+
+    result = run(client, site)
+
+    assert client.uploads == ["css/site.css"]
+    assert client.deletes == [["old.html"]]
+    assert result == {"uploaded": 1, "deleted": 1, "unchanged": 1, "failed": 0}
+
+
+def test_manifest_avoids_listing_bucket(site):
+    client = Client()
+    run(client, site)
+    (site / "index.html").write_text("<h1>changed</h1>")
+    (site / "css" / "site.css").unlink()
+
+    result = run(client, site)
+
+    assert client.listings == 1
+    assert client.uploads == ["css/site.css", "index.html", "index.html"]
+    assert client.deletes == [["css/site.css"]]
+    assert result["unchanged"] == 0
+
+
+def test_no_delete_keeps_stale_objects(site):
+    client = Client({"old.html": "stale"})
+
+    run(client, site, delete_stale=False)
+
+    assert client.deletes == []
+    assert "old.html" in client.objects
+
+
+def test_compresses_large_text_assets(site):
+    client = Client()
+    (site / "app.js").write_text("var x = 1;\n" * 1000)
+    (site / "logo.png").write_bytes(b"\x89PNG" * 1000)
+
+    run(client, site)
+
+    assert client.headers["app.js"]["ContentEncoding"] == "gzip"
+    assert "ContentEncoding" not in client.headers["logo.png"]
+    assert "ContentEncoding" not in client.headers["index.html"]
+
+
+def test_changed_cache_rules_reupload(site):
+    client = Client()
+    run(client, site)
+
+    run(client, site, rules=[(r".*", "no-store")])
+
+    assert client.uploads.count("index.html") == 2
+    assert client.headers["index.html"]["CacheControl"] == "no-store"
+
+
+def test_refuses_to_sync_a_missing_directory(tmp_path):
+    client = Client({"index.html": "abc"})
+
+    with pytest.raises(ValueError):
+        run(client, tmp_path / "missing", full=True)
+
+    assert client.objects == {"index.html": "abc"}
+    assert client.listings == 0
+
+
+def test_empty_directory_only_empties_the_bucket_when_allowed(tmp_path):
+    client = Client({"index.html": "abc"})
+
+    with pytest.raises(ValueError):
+        run(client, tmp_path, full=True)
+    assert client.objects == {"index.html": "abc"}
+
+    result = run(client, tmp_path, full=True, allow_empty=True)
+    assert result["deleted"] == 1
+    assert client.objects == {}
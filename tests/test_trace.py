@@ -0,0 +1,62 @@
+import json
+
+import boto3
+from botocore.stub import Stubber
+
+from exosphere import cli, trace
+
+
+def test_spans_are_only_recorded_while_recording(tmp_path):
+    path = tmp_path / "trace.json"
+
+    with trace.span("before"):
+        pass
+    with trace.recording(str(path), command=["render"]):
+        with trace.span("outer", stack="acom") as span:
+            with trace.span("inner"):
+                pass
+            span["status"] = "updated"
+
+    data = json.loads(path.read_text())
+    events = {event["name"]: event for event in data["traceEvents"]}
+
+    assert set(events) == {"outer", "inner"}
+    assert events["outer"]["args"] == {"stack": "acom", "status": "updated"}
+    assert events["outer"]["ph"] == "X"
+    assert events["inner"]["ts"] >= events["outer"]["ts"]
+    assert data["otherData"]["command"] == ["render"]
+    assert not trace.enabled()
+
+
+def test_instrumented_clients_record_api_calls(tmp_path):
+    path = tmp_path / "trace.json"
+    client = trace.instrument(
+        boto3.client(
+            "cloudformation",
+            region_name="eu-west-1",
+            aws_access_key_id="test",
+            aws_secret_access_key="test",
+        )
+    )
+
+    with Stubber(client) as stubber, trace.recording(str(path)):
+        stubber.add_response("describe_stacks", {"Stacks": []})
+        client.describe_stacks(StackName="acom")
+
+    (event,) = json.loads(path.read_text())["traceEvents"]
+    assert event["name"] == "DescribeStacks"
+    assert event["cat"] == "api"
+    assert event["args"]["service"] == "cloudformation"
+
+
+def test_profile_option_is_taken_before_the_command():
+    args = ["--profile", "t.json", "render", "staticsite"]
+    assert cli.profile_option(args) == "t.json"
+    assert args == ["render", "staticsite"]
+
+    args = ["--profile=t.json", "fleet", "m.json"]
+    assert cli.profile_option(args) == "t.json"
+    assert args == ["fleet", "m.json"]
+
+    args = ["render", "--profile", "x"]
+    assert cli.profile_option(args) is None
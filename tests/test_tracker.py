@@ -0,0 +1,89 @@
+import datetime
+import io
+
+import pytest
+
+from exosphere import tracker
+
+STACK_ID = "arn:aws:cloudformation:eu-west-2:123:stack/acom/1"
+
+
+def event(n, logical_id, status, token="ours", reason=None):
+    e = {
+        "EventId": str(n),
+        "StackId": STACK_ID,
+        "StackName": "acom",
+        "LogicalResourceId": logical_id,
+        "PhysicalResourceId": STACK_ID if logical_id == "acom" else "x",
+        "ResourceStatus": status,
+        "Timestamp": datetime.datetime(2020, 1, 1),
+        "ClientRequestToken": token,
+    }
+    if reason:
+        e["ResourceStatusReason"] = reason
+    return e
+
+
+class Client:
+    def __init__(self, polls):
+        # Each poll is the full event history at that point, oldest first.
+        self.polls = polls
+        self.calls = 0
+
+    def describe_stack_events(self, StackName):
+        history = self.polls[min(self.calls, len(self.polls) - 1)]
+        self.calls += 1
+        return {"StackEvents": list(reversed(history))}
+
+
+def run(client):
+    delays = []
+    out = io.StringIO()
+    status = tracker.wait(client, "acom", "ours", out=out, sleep=delays.append)
+    return status, delays, out.getvalue()
+
+
+def test_returns_as_soon_as_stack_completes():
+    old = [event(0, "acom", "UPDATE_COMPLETE", token="previous")]
+    started = old + [event(1, "acom", "UPDATE_IN_PROGRESS")]
+    client = Client(
+        [
+            old,
+            started,
+            started,
+            started,
+            started + [event(2, "Bucket", "UPDATE_COMPLETE")],
+            started
+            + [
+                event(2, "Bucket", "UPDATE_COMPLETE"),
+                event(3, "acom", "UPDATE_COMPLETE"),
+            ],
+        ]
+    )
+
+    status, delays, out = run(client)
+
+    assert status == "UPDATE_COMPLETE"
+    assert client.calls == 6
+    assert delays == [1.5, 1, 1.5, 2.25, 1]
+    assert "Bucket UPDATE_COMPLETE" in out
+    assert "previous" not in out
+
+
+def test_fails_fast_with_first_resource_failure():
+    client = Client(
+        [
+            [
+                event(1, "acom", "UPDATE_IN_PROGRESS"),
+                event(2, "Bucket", "UPDATE_FAILED", reason="Access denied"),
+                event(3, "Lambda", "UPDATE_FAILED", reason="cancelled"),
+                event(4, "acom", "UPDATE_ROLLBACK_IN_PROGRESS"),
+            ]
+        ]
+    )
+
+    with pytest.raises(tracker.StackFailed) as e:
+        run(client)
+
+    assert e.value.reason == "Access denied"
+    assert e.value.status == "UPDATE_ROLLBACK_IN_PROGRESS"
@@ -0,0 +1,140 @@
+import json
+import os
+import time
+
+import pytest
+
+from exosphere import validate
+from exosphere.stacks import (
+    static_site,
+    static_site_cdn,
+    static_site_with_email,
+)
+
+SPEC = {
+    "AWS::S3::Bucket": {
+        "properties": {"BucketName": False, "AccessControl": False},
+        "attributes": ["Arn", "WebsiteURL"],
+    },
+    "AWS::SQS::Queue": {
+        "properties": {"VisibilityTimeout": False},
+        "attributes": ["Arn"],
+    },
+    "AWS::SNS::Subscription": {
+        "properties": {"Protocol": True, "TopicArn": True},
+        "attributes": [],
+    },
+}
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("EXOSPHERE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(validate, "_spec", None)
+    monkeypatch.setattr(validate, "_valid", set())
+    return tmp_path
+
+
+def template(**resources):
+    return {"Resources": resources}
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        static_site.make().to_json(),
+        static_site.make(subdomain="a,b,c").to_json(),
+        static_site_cdn.make().to_json(),
+        static_site_with_email.make("mail", delivery="queue").to_json(),
+    ],
+    ids=["staticsite", "subdomains", "staticsitecdn", "mail"],
+)
+def test_stack_templates_are_well_formed(body):
+    assert validate.check(body, resource_spec={}) == len(body)
+
+
+def test_reports_unknown_references():
+    found = validate.problems(
+        template(
+            Bucket={
+                "Type": "AWS::S3::Bucket",
+                "DependsOn": "Queue",
+                "Properties": {"BucketName": {"Ref": "Name"}},
+            }
+        ),
+        SPEC,
+    )
+
+    assert found == ["Bucket depends on unknown Queue", "Ref to unknown Name"]
+
+
+def test_checks_resources_against_specification():
+    found = validate.problems(
+        template(
+            Bucket={"Type": "AWS::S3::Bucket", "Properties": {"Name": "a"}},
+            Queue={
+                "Type": "AWS::SQS::Queue",
+                "Properties": {
+                    "VisibilityTimeout": {"Fn::GetAtt": ["Bucket", "Url"]}
+                },
+            },
+            Subscription={
+                "Type": "AWS::SNS::Subscription",
+                "Properties": {"Protocol": "sqs"},
+            },
+            Table={"Type": "AWS::DynamoDB::Table"},
+            Custom={"Type": "Custom::Thing", "Properties": {"Any": 1}},
+        ),
+        SPEC,
+    )
+
+    assert found == [
+        "Bucket has unknown property Name",
+        "Subscription is missing property TopicArn",
+        "Table has unknown type AWS::DynamoDB::Table",
+        "GetAtt of unknown Bucket.Url",
+    ]
+
+
+def test_rejects_templates_over_the_s3_limit(monkeypatch):
+    monkeypatch.setattr(validate, "MAX_TEMPLATE_URL_BODY", 10)
+
+    with pytest.raises(validate.InvalidTemplate, match="over the limit"):
+        validate.check(json.dumps(template(Bucket={"Type": "x"})), {})
+
+
+def test_falls_back_to_stale_specification_when_offline(cache_dir):
+    path = cache_dir / "spec" / "resources.json"
+    path.parent.mkdir()
+    path.write_text(json.dumps(SPEC))
+    os.utime(path, (0, 0))
+
+    def offline():
+        raise OSError("offline")
+
+    assert validate.spec(fetcher=offline) == SPEC
+
+
+def test_backs_off_after_a_failed_fetch(cache_dir):
+    fetches = []
+
+    def offline():
+        fetches.append(1)
+        raise OSError("offline")
+
+    validate.spec(fetcher=offline)
+    validate._spec = None
+    validate.spec(fetcher=offline)
+    assert len(fetches) == 1
+
+    later = time.time() + validate.SPEC_RETRY_AFTER + 1
+    validate._spec = None
+    assert validate.spec(fetcher=lambda: SPEC, clock=lambda: later) == SPEC
+    assert not (cache_dir / "spec" / "failed").exists()
+
+
+def test_caches_fetched_specification(cache_dir):
+    assert validate.spec(fetcher=lambda: SPEC) == SPEC
+
+    validate._spec = None
+    assert validate.spec(fetcher=pytest.fail) == SPEC